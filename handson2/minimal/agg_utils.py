@@ -0,0 +1,218 @@
+# =========================================================
+# Snowflake Cortex Handson シナリオ#2
+# 集約ユーティリティ - AI_AGG / AI_SUMMARIZE_AGG の階層的な集約
+# =========================================================
+# 概要: レビューを (グループ, 月) に分けて部分集約（map）を計算してテーブルに保存し、
+#       グループごとに部分集約を統合（reduce）する。部分集約は
+#       (種類, プロンプトのハッシュ, グループ, 月) 単位でレビューの指紋とともに保持するため、
+#       新しいレビューが追加されても変化した月の部分集約だけを再計算する
+# =========================================================
+
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+
+from snowflake.snowpark.context import get_active_session
+
+# 部分集約を保存するテーブル
+PARTIAL_TABLE = "AGG_PARTIALS"
+
+PARTIAL_TABLE_DDL = f"""
+CREATE TABLE IF NOT EXISTS {PARTIAL_TABLE} (
+    kind VARCHAR(50),
+    prompt_hash VARCHAR(64),
+    group_key VARCHAR(1000),
+    period VARCHAR(10),
+    review_count NUMBER,
+    fingerprint NUMBER(19, 0),
+    partial TEXT,
+    created_at TIMESTAMP_NTZ DEFAULT CURRENT_TIMESTAMP()
+)
+CLUSTER BY (kind, prompt_hash)
+"""
+
+# 集約の種類
+AI_AGG_KIND = "ai_agg"
+SUMMARIZE_KIND = "summarize_agg"
+
+# グループ列を連結する区切り文字
+GROUP_SEPARATOR = "|"
+
+# 統合（reduce）時のAI_AGGへの指示（部分集約は月ごとの集約結果）
+REDUCE_INSTRUCTION = (
+    "The following texts are partial analyses of customer reviews, one per month. "
+    "Combine them into a single answer to this question: "
+)
+
+# 統合結果の上限件数（プロセス内で共有）
+MAX_FINAL_ENTRIES = 256
+
+_lock = threading.Lock()
+_final_cache = OrderedDict()     # (種類, プロンプトのハッシュ, 部分集約の指紋) -> 統合結果
+
+
+def _get_session():
+    """Snowflakeセッションを取得"""
+    return get_active_session()
+
+
+def prompt_hash(kind: str, prompt: str = "") -> str:
+    """集約の種類とプロンプトのハッシュ"""
+    return hashlib.sha256(f"{kind}:{prompt}".encode("utf-8")).hexdigest()[:32]
+
+
+def _group_key_expr(group_columns: list) -> str:
+    """グループ列を1つの文字列に連結する式"""
+    parts = [f"COALESCE({column}::string, '')" for column in group_columns]
+    return f" || '{GROUP_SEPARATOR}' || ".join(parts)
+
+
+def _source_query(source: str, group_columns: list) -> str:
+    """グループ・月・レビューを列挙するクエリ（sourceは別名rを含む派生表と結合句）"""
+    return f"""
+        SELECT
+            {_group_key_expr(group_columns)} AS group_key,
+            COALESCE(TO_CHAR(DATE_TRUNC('month', r.review_date), 'YYYY-MM'), 'unknown') AS period,
+            r.review_id,
+            r.review_text,
+            r.rating
+        FROM {source}
+        WHERE r.review_text IS NOT NULL
+    """
+
+
+def hierarchical_aggregate(kind: str, source: str, group_columns: list, prompt: str = "",
+                           session=None, translate_to: str = "ja") -> dict:
+    """
+    レビューをグループごとに階層的に集約する
+
+    1. (グループ, 月) ごとの件数とレビューの指紋（HASH_AGG）を取得
+    2. 指紋が保存済みの部分集約と異なる (グループ, 月) のみ部分集約を計算して保存（map）
+    3. グループごとに部分集約を統合し、翻訳する（reduce。部分集約が変わらなければ再利用）
+
+    Args:
+        kind: AI_AGG_KIND または SUMMARIZE_KIND
+        source: 集約対象のレビュー（別名rの派生表。review_id, review_text, review_date, ratingが必要。結合句を含んでよい）
+        group_columns: グループ列の式（例: ["r.purchase_channel"]）
+        prompt: AI_AGGの分析観点（SUMMARIZE_KINDでは不要）
+        session: Snowflakeセッション（省略可）
+        translate_to: 統合結果の翻訳先言語（Noneの場合は翻訳しない）
+
+    Returns:
+        dict: {"groups": [{"group": グループ列の値のリスト, "review_count", "avg_rating", "partials", "result"}],
+               "partials_total", "partials_computed", "reduce_cached"}
+    """
+    if kind not in (AI_AGG_KIND, SUMMARIZE_KIND):
+        raise ValueError(f"未知の集約の種類です: {kind}")
+    if session is None:
+        session = _get_session()
+    session.sql(PARTIAL_TABLE_DDL).collect()
+    key_hash = prompt_hash(kind, prompt)
+    source_query = _source_query(source, group_columns)
+
+    # 1. (グループ, 月) ごとの指紋
+    current = session.sql(f"""
+        SELECT group_key, period, COUNT(*) AS review_count, SUM(rating) AS rating_sum,
+               COUNT(rating) AS rating_count, HASH_AGG(review_id, review_text) AS fingerprint
+        FROM ({source_query})
+        GROUP BY group_key, period
+    """).collect()
+    stored = session.sql(f"""
+        SELECT group_key, period, fingerprint FROM {PARTIAL_TABLE}
+        WHERE kind = ? AND prompt_hash = ?
+    """, params=[kind, key_hash]).collect()
+    stored_fingerprints = {(row['GROUP_KEY'], row['PERIOD']): row['FINGERPRINT'] for row in stored}
+    stale = [
+        {"group_key": row['GROUP_KEY'], "period": row['PERIOD']}
+        for row in current
+        if stored_fingerprints.get((row['GROUP_KEY'], row['PERIOD'])) != row['FINGERPRINT']
+    ]
+
+    # 2. 変化した (グループ, 月) のみ部分集約を計算（map）
+    if stale:
+        if kind == AI_AGG_KIND:
+            map_expr, map_params = "AI_AGG(s.review_text, ?)", [prompt]
+        else:
+            map_expr, map_params = "AI_SUMMARIZE_AGG(s.review_text)", []
+        session.sql(f"""
+            MERGE INTO {PARTIAL_TABLE} t
+            USING (
+                SELECT
+                    s.group_key,
+                    s.period,
+                    COUNT(*) AS review_count,
+                    HASH_AGG(s.review_id, s.review_text) AS fingerprint,
+                    {map_expr} AS partial
+                FROM ({source_query}) s
+                JOIN (
+                    SELECT value:group_key::string AS group_key, value:period::string AS period
+                    FROM TABLE(FLATTEN(input => PARSE_JSON(?)))
+                ) st ON s.group_key = st.group_key AND s.period = st.period
+                GROUP BY s.group_key, s.period
+            ) n
+            ON t.kind = ? AND t.prompt_hash = ? AND t.group_key = n.group_key AND t.period = n.period
+            WHEN MATCHED THEN UPDATE SET
+                review_count = n.review_count, fingerprint = n.fingerprint,
+                partial = n.partial, created_at = CURRENT_TIMESTAMP()
+            WHEN NOT MATCHED THEN INSERT (kind, prompt_hash, group_key, period, review_count, fingerprint, partial)
+                VALUES (?, ?, n.group_key, n.period, n.review_count, n.fingerprint, n.partial)
+        """, params=[*map_params, json.dumps(stale, ensure_ascii=False), kind, key_hash, kind, key_hash]).collect()
+
+    # グループごとの件数・平均評価
+    groups = {}
+    for row in current:
+        group = groups.setdefault(row['GROUP_KEY'], {"review_count": 0, "rating_sum": 0.0, "rating_count": 0, "partials": 0})
+        group["review_count"] += row['REVIEW_COUNT']
+        group["rating_sum"] += float(row['RATING_SUM'] or 0)
+        group["rating_count"] += row['RATING_COUNT']
+        group["partials"] += 1
+
+    # 3. グループごとに部分集約を統合（reduce）
+    fingerprints = tuple(sorted((row['GROUP_KEY'], row['PERIOD'], row['FINGERPRINT']) for row in current))
+    final_key = (kind, key_hash, translate_to, fingerprints)
+    with _lock:
+        results = _final_cache.get(final_key)
+        if results is not None:
+            _final_cache.move_to_end(final_key)
+    reduce_cached = results is not None
+    if results is None and current:
+        if kind == AI_AGG_KIND:
+            reduce_expr, reduce_params = "AI_AGG(p.partial, ?)", [REDUCE_INSTRUCTION + prompt]
+        else:
+            reduce_expr, reduce_params = "AI_SUMMARIZE_AGG(p.partial)", []
+        if translate_to:
+            reduce_expr = f"SNOWFLAKE.CORTEX.TRANSLATE({reduce_expr}, '', '{translate_to}')"
+        current_partitions = [{"group_key": row['GROUP_KEY'], "period": row['PERIOD']} for row in current]
+        rows = session.sql(f"""
+            SELECT p.group_key, {reduce_expr} AS result
+            FROM {PARTIAL_TABLE} p
+            JOIN (
+                SELECT value:group_key::string AS group_key, value:period::string AS period
+                FROM TABLE(FLATTEN(input => PARSE_JSON(?)))
+            ) c ON p.group_key = c.group_key AND p.period = c.period
+            WHERE p.kind = ? AND p.prompt_hash = ?
+            GROUP BY p.group_key
+            ORDER BY p.group_key
+        """, params=[*reduce_params, json.dumps(current_partitions, ensure_ascii=False), kind, key_hash]).collect()
+        results = {row['GROUP_KEY']: row['RESULT'] for row in rows}
+        with _lock:
+            _final_cache[final_key] = results
+            while len(_final_cache) > MAX_FINAL_ENTRIES:
+                _final_cache.popitem(last=False)
+
+    return {
+        "groups": [
+            {
+                "group": group_key.split(GROUP_SEPARATOR),
+                "review_count": info["review_count"],
+                "avg_rating": info["rating_sum"] / info["rating_count"] if info["rating_count"] else None,
+                "partials": info["partials"],
+                "result": (results or {}).get(group_key),
+            }
+            for group_key, info in sorted(groups.items())
+        ],
+        "partials_total": len(current),
+        "partials_computed": len(stale),
+        "reduce_cached": reduce_cached,
+    }
@@ -0,0 +1,282 @@
+# =========================================================
+# Snowflake Cortex Handson シナリオ#2
+# Analystユーティリティ - 質問→SQL→結果のキャッシュ
+# =========================================================
+# 概要: Cortex Analystへの質問を正規化し、生成SQLをセマンティックモデルの
+#       バージョンごとに、SQLの実行結果を参照テーブルのバージョンごとに
+#       キャッシュする。同じ質問・表記だけが異なる質問はキャッシュから回答する
+# =========================================================
+
+import json
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+from snowflake.snowpark.context import get_active_session
+
+# セマンティックモデル（setup.sqlでステージに配置）
+SEMANTIC_MODEL_STAGE = "@SNOWRETAIL_DB.SNOWRETAIL_SCHEMA.SEMANTIC_MODEL_STAGE"
+SEMANTIC_MODEL_FILE = f"{SEMANTIC_MODEL_STAGE}/sales_analysis_model.yaml"
+ANALYST_ENDPOINT = "/api/v2/cortex/analyst/message"
+ANALYST_TIMEOUT_MS = 50000
+
+# セマンティックモデルが参照するテーブル（結果キャッシュのバージョン判定に使用）
+SOURCE_TABLES = [
+    "RETAIL_DATA_WITH_PRODUCT_MASTER",
+    "EC_DATA_WITH_PRODUCT_MASTER",
+    "SALES_DAILY_ROLLUP",
+    "SALES_MONTHLY_ROLLUP",
+]
+
+# キャッシュの上限件数（古いものから破棄）
+MAX_SQL_ENTRIES = 256
+MAX_RESULT_ENTRIES = 64
+
+# セマンティックモデルのバージョン確認間隔（秒）
+MODEL_VERSION_TTL_SEC = 60
+
+# 正規化で取り除く文末表現（長いものから順に照合）
+POLITE_SUFFIXES = ["を教えてください", "教えてください", "を教えて", "教えて", "してください", "ください"]
+
+# プロセス内で共有するキャッシュ（Streamlitの再実行・ユーザー間で共有される）
+_lock = threading.Lock()
+_sql_cache = OrderedDict()       # (モデルバージョン, 正規化した質問) -> {"sql", "text", "cost_sec"}
+_result_cache = OrderedDict()    # (SQL, テーブルバージョン) -> {"df", "cost_sec"}
+_model_version = {"value": None, "checked_at": 0.0}
+_stats = {
+    "questions": 0,
+    "sql_hits": 0,
+    "result_hits": 0,
+    "saved_sec": 0.0,
+}
+
+
+def _get_session():
+    """Snowflakeセッションを取得"""
+    return get_active_session()
+
+
+def normalize_question(question: str) -> str:
+    """
+    質問文を正規化する（全角半角・大文字小文字・空白・句読点・文末表現の違いを吸収）
+
+    数字の間の「.」「,」は残すため、「1.5」と「15」、「1,000」と「1000」は別の質問として扱う。
+
+    Args:
+        question: ユーザーの質問
+
+    Returns:
+        str: キャッシュキーに使う正規化済みの質問
+    """
+    text = unicodedata.normalize("NFKC", question).lower()
+    text = re.sub(r"[\s、。!?！？「」『』]", "", text)
+    # 数字に挟まれた「.」「,」（小数点・桁区切り）は質問の意味を変えるため残す
+    text = re.sub(r"(?<!\d)[,.]|[,.](?!\d)", "", text)
+    for suffix in POLITE_SUFFIXES:
+        if text.endswith(suffix):
+            text = text[: -len(suffix)]
+            break
+    return text
+
+
+def get_semantic_model_version(session=None) -> str:
+    """
+    ステージ上のセマンティックモデルのバージョン（MD5）を取得する
+
+    LISTはMODEL_VERSION_TTL_SEC秒ごとにのみ実行する。
+
+    Args:
+        session: Snowflakeセッション（省略可）
+
+    Returns:
+        str: ファイルのMD5（取得できない場合は空文字）
+    """
+    if session is None:
+        session = _get_session()
+    now = time.time()
+    with _lock:
+        if _model_version["value"] is not None and now - _model_version["checked_at"] < MODEL_VERSION_TTL_SEC:
+            return _model_version["value"]
+    try:
+        rows = session.sql(f"LIST {SEMANTIC_MODEL_FILE}").collect()
+        version = rows[0]["md5"] if rows else ""
+    except:
+        version = ""
+    with _lock:
+        _model_version.update(value=version, checked_at=now)
+    return version
+
+
+def get_source_version(sql: str, session=None) -> tuple:
+    """
+    SQLが参照するテーブルの最終更新コミット時刻を取得する
+
+    Args:
+        sql: 実行するSQL
+        session: Snowflakeセッション（省略可）
+
+    Returns:
+        tuple: ((テーブル名, 最終更新時刻), ...)
+    """
+    if session is None:
+        session = _get_session()
+    upper_sql = sql.upper()
+    tables = [table for table in SOURCE_TABLES if re.search(rf"\b{table}\b", upper_sql)]
+    if not tables:
+        return ()
+    columns = ", ".join(f"SYSTEM$LAST_CHANGE_COMMIT_TIME('{table}') AS v{i}" for i, table in enumerate(tables))
+    row = session.sql(f"SELECT {columns}").collect()[0]
+    return tuple((table, row[i]) for i, table in enumerate(tables))
+
+
+def generate_sql(question: str) -> dict:
+    """
+    Cortex AnalystでSQLを生成する（Streamlit in Snowflakeの内部APIを使用）
+
+    Args:
+        question: ユーザーの質問
+
+    Returns:
+        dict: {"sql": str or None, "text": str}
+    """
+    import _snowflake
+
+    body = {
+        "messages": [{"role": "user", "content": [{"type": "text", "text": question}]}],
+        "semantic_model_file": SEMANTIC_MODEL_FILE,
+    }
+    resp = _snowflake.send_snow_api_request("POST", ANALYST_ENDPOINT, {}, {}, body, None, ANALYST_TIMEOUT_MS)
+    content = json.loads(resp["content"])
+    if resp["status"] >= 400:
+        raise RuntimeError(f"Cortex Analystの呼び出しに失敗しました: {content.get('message', content)}")
+
+    result = {"sql": None, "text": ""}
+    for item in content["message"]["content"]:
+        if item["type"] == "sql":
+            result["sql"] = item["statement"]
+        elif item["type"] == "text":
+            result["text"] += item["text"]
+    return result
+
+
+def _put(cache: OrderedDict, key, value, max_entries: int):
+    """LRUキャッシュに追加する（ロック取得済みで呼び出す）"""
+    cache[key] = value
+    cache.move_to_end(key)
+    while len(cache) > max_entries:
+        cache.popitem(last=False)
+
+
+def ask_analyst(question: str, session=None) -> dict:
+    """
+    質問に回答する（SQLキャッシュ・結果キャッシュを経由）
+
+    Args:
+        question: ユーザーの質問
+        session: Snowflakeセッション（省略可）
+
+    Returns:
+        dict: {
+            "question": str, "sql": str or None, "text": str, "df": DataFrame or None,
+            "sql_cache_hit": bool, "result_cache_hit": bool, "elapsed_sec": float
+        }
+    """
+    if session is None:
+        session = _get_session()
+    start = time.perf_counter()
+
+    # SQL生成（セマンティックモデルのバージョンごとにキャッシュ）
+    sql_key = (get_semantic_model_version(session), normalize_question(question))
+    with _lock:
+        _stats["questions"] += 1
+        sql_entry = _sql_cache.get(sql_key)
+        if sql_entry is not None:
+            _sql_cache.move_to_end(sql_key)
+            _stats["sql_hits"] += 1
+            _stats["saved_sec"] += sql_entry["cost_sec"]
+    sql_cache_hit = sql_entry is not None
+
+    if not sql_cache_hit:
+        generate_start = time.perf_counter()
+        sql_entry = dict(generate_sql(question), cost_sec=time.perf_counter() - generate_start)
+        # SQLが生成されなかった回答（質問の聞き返し等）はキャッシュしない
+        if sql_entry["sql"]:
+            with _lock:
+                _put(_sql_cache, sql_key, sql_entry, MAX_SQL_ENTRIES)
+
+    response = {
+        "question": question,
+        "sql": sql_entry["sql"],
+        "text": sql_entry["text"],
+        "df": None,
+        "sql_cache_hit": sql_cache_hit,
+        "result_cache_hit": False,
+    }
+
+    # SQL実行（参照テーブルのバージョンごとにキャッシュ）
+    if sql_entry["sql"]:
+        result_key = (sql_entry["sql"], get_source_version(sql_entry["sql"], session))
+        with _lock:
+            result_entry = _result_cache.get(result_key)
+            if result_entry is not None:
+                _result_cache.move_to_end(result_key)
+                _stats["result_hits"] += 1
+                _stats["saved_sec"] += result_entry["cost_sec"]
+        response["result_cache_hit"] = result_entry is not None
+
+        if result_entry is None:
+            execute_start = time.perf_counter()
+            df = session.sql(sql_entry["sql"]).to_pandas()
+            result_entry = {"df": df, "cost_sec": time.perf_counter() - execute_start}
+            with _lock:
+                _put(_result_cache, result_key, result_entry, MAX_RESULT_ENTRIES)
+        response["df"] = result_entry["df"].copy()
+
+    response["elapsed_sec"] = time.perf_counter() - start
+    return response
+
+
+def get_cache_stats() -> dict:
+    """
+    キャッシュのヒット率と削減できた時間を取得する
+
+    Returns:
+        dict: {
+            "questions": int, "sql_hits": int, "result_hits": int,
+            "sql_hit_rate": float, "result_hit_rate": float,
+            "saved_sec": float, "sql_entries": int, "result_entries": int
+        }
+    """
+    with _lock:
+        stats = dict(_stats)
+        stats["sql_entries"] = len(_sql_cache)
+        stats["result_entries"] = len(_result_cache)
+    questions = stats["questions"]
+    stats["sql_hit_rate"] = stats["sql_hits"] / questions if questions else 0.0
+    stats["result_hit_rate"] = stats["result_hits"] / questions if questions else 0.0
+    return stats
+
+
+def clear_cache(model_version: str = None):
+    """
+    キャッシュを破棄する
+
+    キャッシュはプロセス内で全ユーザーが共有するため、画面からは現在のセマンティックモデルの
+    バージョンを指定して、そのバージョンで生成したSQLと実行結果のみを破棄する。
+
+    Args:
+        model_version: 破棄するセマンティックモデルのバージョン（省略時はキャッシュと統計をすべて破棄）
+    """
+    with _lock:
+        _model_version.update(value=None, checked_at=0.0)
+        if model_version is None:
+            _sql_cache.clear()
+            _result_cache.clear()
+            _stats.update(questions=0, sql_hits=0, result_hits=0, saved_sec=0.0)
+            return
+        sql_keys = [key for key in _sql_cache if key[0] == model_version]
+        sqls = {_sql_cache.pop(key)["sql"] for key in sql_keys}
+        for key in [key for key in _result_cache if key[0] in sqls]:
+            del _result_cache[key]
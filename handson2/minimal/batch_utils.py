@@ -0,0 +1,61 @@
+# =========================================================
+# Snowflake Cortex Handson シナリオ#2
+# バッチユーティリティ - AI関数のバッチ逐次実行
+# =========================================================
+# 概要: review_id順のキーセットページングでレビューをバッチに分け、
+#       バッチ完了ごとに結果を返すことで画面を段階的に更新できるようにする
+# =========================================================
+
+# 既定のバッチサイズ
+DEFAULT_BATCH_SIZE = 50
+
+# キーセットページングの初期カーソル（全てのreview_idより小さい値）
+INITIAL_CURSOR = ""
+
+
+def keyset_batch_clause(batch_size: int, key_column: str = "review_id") -> str:
+    """
+    キーセットページング用の条件句を生成する
+
+    生成した句はAI関数を適用する前のサブクエリ内に置くこと。
+    外側に置くとバッチ外の行にもAI関数が評価される可能性がある。
+    行を落とす結合・絞り込みもこの句より前（同じサブクエリ内）に置くこと。
+    外側で行が落ちるとバッチの件数が減り、iter_keyset_batches()が途中で終了する。
+    バインド変数（?）には直前のバッチの最大キーを渡す。
+
+    Args:
+        batch_size: 1バッチあたりの件数
+        key_column: ページングに使用する列（一意であること）
+
+    Returns:
+        str: "AND key > ? ORDER BY key LIMIT n" 形式の句
+    """
+    return f"AND {key_column} > ? ORDER BY {key_column} LIMIT {int(batch_size)}"
+
+
+def iter_keyset_batches(session, query: str, batch_size: int, key_column: str = "REVIEW_ID"):
+    """
+    キーセットページングでクエリをバッチ実行し、バッチごとに結果を返す
+
+    Args:
+        session: Snowflakeセッション
+        query: keyset_batch_clause()の句を含むクエリ（バインド変数1つ。
+               1バッチの結果行がサブクエリで選んだ行と1対1になること）
+        batch_size: keyset_batch_clause()に渡したバッチサイズ
+        key_column: 結果行のキー列名（大文字）
+
+    Yields:
+        list: 1バッチ分のRowのリスト
+    """
+    cursor = INITIAL_CURSOR
+    while True:
+        rows = session.sql(query, params=[cursor]).collect()
+        if not rows:
+            return
+
+        yield rows
+
+        # AI関数適用後の行順は保証されないため最大キーをカーソルにする
+        cursor = max(row[key_column] for row in rows)
+        if len(rows) < batch_size:
+            return
@@ -0,0 +1,123 @@
+# =========================================================
+# Snowflake Cortex Handson シナリオ#2
+# チャートユーティリティ - 件数に依存しないチャートの描画
+# =========================================================
+# 概要: 行数が閾値を超える場合、ヒストグラムはPython側で集計済みのビンを、
+#       散布図は間引いた点をWebGL（scattergl）で描画する。
+#       ブラウザに送るチャートのJSONサイズはレビュー件数によらず上限内に収まる
+# =========================================================
+
+import numpy as np
+import pandas as pd
+import plotly.express as px
+import plotly.graph_objects as go
+
+# この行数を超えたら集計済み・間引いたデータを送る
+ROW_THRESHOLD = 5000
+
+# 散布図に描画する点の上限
+MAX_POINTS = 5000
+
+# 間引きの乱数シード（再実行しても同じ点を描画する）
+SAMPLE_SEED = 42
+
+
+def payload_bytes(fig: go.Figure) -> int:
+    """
+    チャートをブラウザへ送る際のJSONサイズを取得する
+
+    Args:
+        fig: Plotlyのチャート
+
+    Returns:
+        int: JSONのバイト数
+    """
+    return len(fig.to_json().encode("utf-8"))
+
+
+def histogram(df: pd.DataFrame, x: str, nbins: int = 20, title: str = None, labels: dict = None,
+              threshold: int = ROW_THRESHOLD) -> go.Figure:
+    """
+    ヒストグラムを作成する（閾値を超える場合は集計済みのビンを描画）
+
+    Args:
+        df: データ
+        x: 集計する列
+        nbins: ビン数
+        title: タイトル
+        labels: 軸ラベル（px.histogramと同じ形式）
+        threshold: 集計済みのビンに切り替える行数
+
+    Returns:
+        go.Figure: ヒストグラム
+    """
+    if len(df) <= threshold:
+        return px.histogram(df, x=x, nbins=nbins, title=title, labels=labels)
+
+    values = pd.to_numeric(df[x], errors="coerce").dropna().to_numpy()
+    counts, edges = np.histogram(values, bins=nbins)
+    fig = go.Figure(go.Bar(
+        x=(edges[:-1] + edges[1:]) / 2,
+        y=counts,
+        width=np.diff(edges),
+        hovertemplate="%{x:.3f}: %{y}件<extra></extra>"
+    ))
+    labels = labels or {}
+    fig.update_layout(
+        title=title,
+        bargap=0,
+        xaxis_title=labels.get(x, x),
+        yaxis_title=labels.get("y", "count")
+    )
+    return fig
+
+
+def scatter(df: pd.DataFrame, x: str, y: str, title: str = None, labels: dict = None,
+            max_points: int = MAX_POINTS, threshold: int = ROW_THRESHOLD, **kwargs) -> go.Figure:
+    """
+    散布図を作成する（閾値を超える場合は点を間引いてWebGLで描画）
+
+    Args:
+        df: データ
+        x: x軸の列
+        y: y軸の列
+        title: タイトル
+        labels: 軸ラベル
+        max_points: 描画する点の上限
+        threshold: WebGLに切り替える行数
+        **kwargs: px.scatterに渡すその他の引数（color, size, hover_nameなどは列名で指定）
+
+    Returns:
+        go.Figure: 散布図
+    """
+    if len(df) <= threshold:
+        return px.scatter(df, x=x, y=y, title=title, labels=labels, **kwargs)
+
+    df_points = df.sample(n=max_points, random_state=SAMPLE_SEED) if len(df) > max_points else df
+    fig = px.scatter(df_points, x=x, y=y, title=title, labels=labels, render_mode="webgl", **kwargs)
+    if len(df_points) < len(df):
+        fig.add_annotation(
+            text=f"{len(df):,}件中{len(df_points):,}件を表示",
+            xref="paper", yref="paper", x=1, y=1.08, showarrow=False
+        )
+    return fig
+
+
+def compare_payload(naive_fig: go.Figure, fig: go.Figure) -> dict:
+    """
+    全行を送るチャートと集計・間引き後のチャートのJSONサイズを比較する
+
+    Args:
+        naive_fig: 全行を送るチャート
+        fig: 集計・間引き後のチャート
+
+    Returns:
+        dict: {"naive_bytes", "bytes", "reduction"}（reductionは削減率）
+    """
+    naive_bytes = payload_bytes(naive_fig)
+    reduced_bytes = payload_bytes(fig)
+    return {
+        "naive_bytes": naive_bytes,
+        "bytes": reduced_bytes,
+        "reduction": 1 - reduced_bytes / naive_bytes if naive_bytes else 0.0,
+    }
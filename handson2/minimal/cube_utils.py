@@ -0,0 +1,229 @@
+# =========================================================
+# Snowflake Cortex Handson シナリオ#2
+# キューブユーティリティ - 事前集計テーブルからの絞り込み・集計
+# =========================================================
+# 概要: setup_review_cube.sql で作成したREVIEW_CUBE（日付×チャネル×カテゴリ×評価×
+#       感情帯×商品の件数・合計）から、任意の絞り込みと軸の組み合わせの集計を算出する。
+#       集計結果はキューブのバージョンごとにプロセス内でキャッシュし、
+#       同じ絞り込みはウェアハウスに問い合わせずに回答する
+# =========================================================
+
+import json
+import threading
+import time
+from collections import OrderedDict
+
+import pandas as pd
+from snowflake.snowpark.context import get_active_session
+
+# キューブ（Dynamic Table）
+CUBE_TABLE = "REVIEW_CUBE"
+
+# 集計軸（列名 -> キューブ上の式）
+DIMENSIONS = {
+    "review_date": "review_date",
+    "review_month": "DATE_TRUNC('month', review_date)",
+    "purchase_channel": "purchase_channel",
+    "category": "category",
+    "rating_bucket": "rating_bucket",
+    "sentiment_band": "sentiment_band",
+    "product_id": "product_id",
+}
+
+# 集計値（合計と件数から平均を算出する）
+MEASURES = """
+    SUM(review_count) AS review_count,
+    SUM(rating_sum) / NULLIF(SUM(rating_count), 0) AS avg_rating,
+    SUM(sentiment_sum) / NULLIF(SUM(sentiment_count), 0) AS avg_sentiment,
+    SUM(helpful_votes) AS helpful_votes
+"""
+
+# 集計結果キャッシュの上限件数（古いものから破棄）
+MAX_SLICE_ENTRIES = 512
+
+# キューブのバージョン確認間隔（秒）
+VERSION_TTL_SEC = 30
+
+# プロセス内で共有するキャッシュ（Streamlitの再実行・ユーザー間で共有される）
+_lock = threading.Lock()
+_slices = OrderedDict()          # (集計軸, 絞り込み, 期間, 件数上限, キューブのバージョン) -> DataFrame
+_version = {"value": None, "checked_at": 0.0}
+_stats = {"lookups": 0, "hits": 0}
+
+
+def _get_session():
+    """Snowflakeセッションを取得"""
+    return get_active_session()
+
+
+def get_cube_status(session=None):
+    """
+    キューブのDynamic Tableの状態を取得する
+
+    Args:
+        session: Snowflakeセッション（省略可）
+
+    Returns:
+        dict または None: {"target_lag", "scheduling_state", "data_timestamp", "rows"}（未作成の場合はNone）
+    """
+    if session is None:
+        session = _get_session()
+    try:
+        rows = session.sql(f"SHOW DYNAMIC TABLES LIKE '{CUBE_TABLE}'").collect()
+    except:
+        return None
+    for row in rows:
+        data = row.as_dict()
+        if str(data.get("name", "")).upper() == CUBE_TABLE:
+            return {
+                "target_lag": data.get("target_lag"),
+                "scheduling_state": data.get("scheduling_state"),
+                "data_timestamp": data.get("data_timestamp"),
+                "rows": data.get("rows") or 0,
+            }
+    return None
+
+
+def is_cube_ready(session=None, status: dict = None) -> bool:
+    """
+    キューブが利用可能か（初回リフレッシュ済みか）
+
+    Args:
+        session: Snowflakeセッション（省略可）
+        status: get_cube_status()の結果（省略時は取得する）
+
+    Returns:
+        bool: 利用可能な場合True
+    """
+    if status is None:
+        status = get_cube_status(session)
+    return bool(status) and status.get("data_timestamp") is not None
+
+
+def _get_version(session):
+    """キューブの最終更新コミット時刻（一定間隔でのみ確認・内部用）"""
+    with _lock:
+        if _version["value"] is not None and time.time() - _version["checked_at"] < VERSION_TTL_SEC:
+            return _version["value"]
+    value = session.sql(f"SELECT SYSTEM$LAST_CHANGE_COMMIT_TIME('{CUBE_TABLE}')").collect()[0][0]
+    with _lock:
+        _version.update(value=value, checked_at=time.time())
+    return value
+
+
+def _build_query(group_by: list, filters: dict, date_range, limit: int) -> tuple:
+    """集計クエリとバインド変数を作成する（内部用）"""
+    for dimension in list(group_by) + list(filters):
+        if dimension not in DIMENSIONS:
+            raise ValueError(f"未知の集計軸です: {dimension}")
+
+    conditions, params = [], []
+    for dimension, values in filters.items():
+        if not isinstance(values, (list, tuple, set)):
+            values = [values]
+        values = list(values)
+        if not values:
+            continue
+        conditions.append(f"{DIMENSIONS[dimension]} IN ({', '.join('?' for _ in values)})")
+        params.extend(values)
+    if date_range:
+        conditions.append("review_date BETWEEN ? AND ?")
+        params.extend([str(date_range[0]), str(date_range[1])])
+
+    select_dims = "".join(f"{DIMENSIONS[dimension]} AS {dimension}, " for dimension in group_by)
+    query = f"SELECT {select_dims}{MEASURES} FROM {CUBE_TABLE}"
+    if conditions:
+        query += " WHERE " + " AND ".join(conditions)
+    if group_by:
+        query += f" GROUP BY {', '.join(DIMENSIONS[dimension] for dimension in group_by)}"
+        query += f" ORDER BY {', '.join(DIMENSIONS[dimension] for dimension in group_by)}"
+    if limit:
+        query += f" LIMIT {int(limit)}"
+    return query, params
+
+
+def slice_cube(group_by: list = None, filters: dict = None, date_range: tuple = None,
+               limit: int = None, session=None) -> pd.DataFrame:
+    """
+    キューブを絞り込んで集計する
+
+    Args:
+        group_by: 集計軸のリスト（DIMENSIONSのキー。空の場合は全体の1行）
+        filters: {集計軸: 値または値のリスト}（空のリストは絞り込まない）
+        date_range: (開始日, 終了日)（review_dateで絞り込む。省略可）
+        limit: 返す行数の上限（商品別など軸の値が多い場合。省略可）
+        session: Snowflakeセッション（省略可）
+
+    Returns:
+        DataFrame: 集計軸の列（大文字）と REVIEW_COUNT, AVG_RATING, AVG_SENTIMENT, HELPFUL_VOTES
+                   （キャッシュと共有するため読み取り専用として扱う）
+    """
+    if session is None:
+        session = _get_session()
+    group_by = list(group_by or [])
+    filters = {dimension: values for dimension, values in (filters or {}).items() if values not in (None, [], ())}
+    query, params = _build_query(group_by, filters, date_range, limit)
+
+    key = (
+        tuple(group_by),
+        json.dumps(filters, sort_keys=True, ensure_ascii=False, default=str),
+        tuple(str(value) for value in date_range) if date_range else None,
+        limit,
+        _get_version(session),
+    )
+    with _lock:
+        _stats["lookups"] += 1
+        df = _slices.get(key)
+        if df is not None:
+            _slices.move_to_end(key)
+            _stats["hits"] += 1
+            return df
+
+    rows = session.sql(query, params=params or None).collect()
+    columns = [dimension.upper() for dimension in group_by] + ["REVIEW_COUNT", "AVG_RATING", "AVG_SENTIMENT", "HELPFUL_VOTES"]
+    df = pd.DataFrame([list(row) for row in rows], columns=columns)
+    for column in ["REVIEW_COUNT", "AVG_RATING", "AVG_SENTIMENT", "HELPFUL_VOTES"]:
+        df[column] = pd.to_numeric(df[column], errors="coerce")
+
+    with _lock:
+        _slices[key] = df
+        while len(_slices) > MAX_SLICE_ENTRIES:
+            _slices.popitem(last=False)
+    return df
+
+
+def get_dimension_values(dimension: str, filters: dict = None, session=None) -> list:
+    """
+    集計軸の値の一覧を取得する（絞り込み条件の選択肢用）
+
+    Args:
+        dimension: 集計軸（DIMENSIONSのキー）
+        filters: 他の集計軸での絞り込み（省略可）
+        session: Snowflakeセッション（省略可）
+
+    Returns:
+        list: 値のリスト（昇順）
+    """
+    df = slice_cube([dimension], filters, session=session)
+    return [value for value in df[dimension.upper()].tolist() if value is not None]
+
+
+def get_cube_cache_stats() -> dict:
+    """
+    集計結果キャッシュの使用状況を取得する
+
+    Returns:
+        dict: {"entries", "lookups", "hits", "hit_rate"}
+    """
+    with _lock:
+        stats = dict(_stats, entries=len(_slices))
+    stats["hit_rate"] = stats["hits"] / stats["lookups"] if stats["lookups"] else 0.0
+    return stats
+
+
+def clear_cube_cache():
+    """集計結果キャッシュと統計を破棄する"""
+    with _lock:
+        _slices.clear()
+        _version.update(value=None, checked_at=0.0)
+        _stats.update(lookups=0, hits=0)
@@ -0,0 +1,182 @@
+# =========================================================
+# Snowflake Cortex Handson シナリオ#2
+# 埋め込みユーティリティ - モデル別の埋め込みストア
+# =========================================================
+# 概要: チャンクの埋め込みを (チャンク, モデル) 単位で保持し、
+#       モデルを切り替えても既存の埋め込みを上書き・混在させない。
+#       新しいモデルは一括でバックフィルし、類似度計算は常に
+#       クエリとチャンクで同じモデルの埋め込みを使用する
+# =========================================================
+
+from snowflake.snowpark.context import get_active_session
+
+from storage_utils import COMPAT_VIEW
+
+# 埋め込みストア（chunk_id は CUSTOMER_ANALYSIS.analysis_id）
+EMBEDDING_TABLE = "REVIEW_CHUNK_EMBEDDINGS"
+
+# 生成モデルが記録されていない既存の埋め込みのモデル名（類似度計算には使用しない）
+LEGACY_MODEL = "unknown"
+
+EMBEDDING_TABLE_DDL = f"""
+CREATE TABLE IF NOT EXISTS {EMBEDDING_TABLE} (
+    chunk_id NUMBER,
+    model VARCHAR(100),
+    embedding VECTOR(FLOAT, 1024),
+    created_at TIMESTAMP_NTZ DEFAULT CURRENT_TIMESTAMP()
+)
+CLUSTER BY (model)
+"""
+
+
+def _get_session():
+    """Snowflakeセッションを取得"""
+    return get_active_session()
+
+
+def is_embedding_store_ready(session=None, tables: set = None) -> bool:
+    """
+    埋め込みストアが利用可能か
+
+    Args:
+        session: Snowflakeセッション（省略可）
+        tables: スキーマ内のテーブル名の一覧（table_utils.get_table_names()の結果・省略時は存在確認クエリを発行する）
+
+    Returns:
+        bool: 埋め込みストアのテーブルが存在する場合True
+    """
+    if tables is not None:
+        return EMBEDDING_TABLE in tables
+    if session is None:
+        session = _get_session()
+    try:
+        session.sql(f"SELECT 1 FROM {EMBEDDING_TABLE} LIMIT 1").collect()
+        return True
+    except:
+        return False
+
+
+def create_embedding_store(session=None) -> int:
+    """
+    埋め込みストアを作成し、CUSTOMER_ANALYSISの既存の埋め込みを取り込む
+
+    既存の埋め込みは生成モデルが不明なため、LEGACY_MODELとして保持する。
+
+    Args:
+        session: Snowflakeセッション（省略可）
+
+    Returns:
+        int: 取り込んだ既存の埋め込みの件数
+    """
+    if session is None:
+        session = _get_session()
+    session.sql(EMBEDDING_TABLE_DDL).collect()
+    try:
+        result = session.sql(f"""
+            INSERT INTO {EMBEDDING_TABLE} (chunk_id, model, embedding)
+            SELECT c.analysis_id, '{LEGACY_MODEL}', c.embedding
+            FROM {COMPAT_VIEW} c
+            WHERE c.embedding IS NOT NULL
+              AND NOT EXISTS (
+                  SELECT 1 FROM {EMBEDDING_TABLE} e
+                  WHERE e.chunk_id = c.analysis_id AND e.model = '{LEGACY_MODEL}'
+              )
+        """).collect()
+        return result[0][0] if result else 0
+    except:
+        # CUSTOMER_ANALYSISが未作成の場合は取り込むものがない
+        return 0
+
+
+def get_embedding_coverage(session=None) -> dict:
+    """
+    モデルごとの埋め込み済みチャンク数を取得する
+
+    Args:
+        session: Snowflakeセッション（省略可）
+
+    Returns:
+        dict: {"total_chunks": int, "models": {モデル名: 埋め込み済みチャンク数}}
+    """
+    if session is None:
+        session = _get_session()
+    total = session.sql(f"SELECT COUNT(*) AS cnt FROM {COMPAT_VIEW}").collect()[0]['CNT']
+    rows = session.sql(f"""
+        SELECT e.model, COUNT(*) AS cnt
+        FROM {EMBEDDING_TABLE} e
+        JOIN {COMPAT_VIEW} c ON c.analysis_id = e.chunk_id
+        GROUP BY e.model
+        ORDER BY e.model
+    """).collect()
+    return {"total_chunks": total, "models": {row['MODEL']: row['CNT'] for row in rows}}
+
+
+def backfill_embeddings(model: str, session=None, review_id: str = None) -> int:
+    """
+    指定モデルの埋め込みがないチャンクを一括で埋め込む
+
+    Args:
+        model: 埋め込みモデル
+        session: Snowflakeセッション（省略可）
+        review_id: 指定した場合はそのレビューのチャンクのみ（前処理時に使用）
+
+    Returns:
+        int: 埋め込んだチャンク数
+    """
+    if session is None:
+        session = _get_session()
+    params = [model, model, model]
+    review_clause = ""
+    if review_id is not None:
+        review_clause = "AND c.review_id = ?"
+        params.append(review_id)
+    result = session.sql(f"""
+        INSERT INTO {EMBEDDING_TABLE} (chunk_id, model, embedding)
+        SELECT c.analysis_id, ?, SNOWFLAKE.CORTEX.EMBED_TEXT_1024(?, c.chunked_text)
+        FROM {COMPAT_VIEW} c
+        WHERE c.chunked_text IS NOT NULL
+          AND NOT EXISTS (
+              SELECT 1 FROM {EMBEDDING_TABLE} e
+              WHERE e.chunk_id = c.analysis_id AND e.model = ?
+          )
+          {review_clause}
+    """, params=params).collect()
+    return result[0][0] if result else 0
+
+
+def find_similar_chunks(text: str, model: str, session=None, limit: int = 20):
+    """
+    テキストに類似するレビューチャンクを検索する
+
+    クエリテキストもチャンクと同じモデルで埋め込むため、
+    異なるモデルのベクトル同士を比較することはない。
+
+    Args:
+        text: 基準となるテキスト
+        model: 埋め込みモデル（ストアにこのモデルの埋め込みが必要）
+        session: Snowflakeセッション（省略可）
+        limit: 取得件数
+
+    Returns:
+        list: REVIEW_ID, CHUNKED_TEXT, REVIEW_TEXT, RATING, PURCHASE_CHANNEL, SIMILARITY_SCORE のRowのリスト
+    """
+    if session is None:
+        session = _get_session()
+    return session.sql(f"""
+        WITH q AS (
+            SELECT SNOWFLAKE.CORTEX.EMBED_TEXT_1024(?, ?) AS embedding
+        )
+        SELECT
+            c.review_id,
+            c.chunked_text,
+            c.review_text,
+            c.rating,
+            c.purchase_channel,
+            VECTOR_COSINE_SIMILARITY(e.embedding, q.embedding) AS similarity_score
+        FROM {EMBEDDING_TABLE} e
+        JOIN {COMPAT_VIEW} c ON c.analysis_id = e.chunk_id
+        CROSS JOIN q
+        WHERE e.model = ?
+        ORDER BY similarity_score DESC
+        LIMIT {int(limit)}
+    """, params=[model, text, model]).collect()
@@ -0,0 +1,310 @@
+# =========================================================
+# Snowflake Cortex Handson シナリオ#2
+# ローカル分析エンジン - 分析結果のArrowスナップショットとDuckDB
+# =========================================================
+# 概要: AI関数による分析が終わった後の絞り込み・集計・ページ送りを、
+#       分析結果のArrowスナップショットに対する組み込みDuckDBのクエリで処理する。
+#       スナップショットは共有結果キャッシュと同じキー（参照テーブルのバージョンを含む）
+#       ごとに作成するため、データが更新されると新しいスナップショットに切り替わる
+#       （同じキーの結果が置き換えられた場合も作り直す）。
+#       操作ごとの所要時間を記録し、pandasで処理した場合と比較できる。
+#       duckdb / pyarrow がない環境ではpandasで処理する
+# =========================================================
+
+import importlib.util
+import threading
+import time
+import weakref
+from collections import OrderedDict, deque
+
+import pandas as pd
+
+# スナップショットのテーブル名（クエリ内で参照する名前）
+SNAPSHOT_VIEW = "reviews"
+
+# 元の行順を保持する列（ページ送りの既定の並び順）
+ROW_NUMBER_COLUMN = "_ROW_NO"
+
+# スナップショットの上限件数（古いものから破棄）
+MAX_SNAPSHOTS = 8
+
+# 操作ごとに保持する所要時間の件数
+MAX_TIMINGS = 200
+
+# 集計関数（名前 -> (DuckDBの関数, pandasの関数)）
+# countは対象列のNULL以外の件数（対象列がNoneの場合は行数: COUNT(*) / size）
+AGGREGATES = {
+    "count": ("COUNT", "count"),
+    "avg": ("AVG", "mean"),
+    "sum": ("SUM", "sum"),
+    "min": ("MIN", "min"),
+    "max": ("MAX", "max"),
+}
+
+# エンジンの種類
+DUCKDB_ENGINE = "duckdb"
+PANDAS_ENGINE = "pandas"
+
+# プロセス内で共有するスナップショット（Streamlitの再実行・ユーザー間で共有される）
+_lock = threading.Lock()
+_snapshots = OrderedDict()       # 共有結果キャッシュのキー -> (変換元の分析結果への弱参照, Arrowテーブル)
+_state = {"connection": None}
+_timings = {}                    # 操作名 -> {"duckdb": deque, "pandas": deque}
+
+
+def is_engine_available() -> bool:
+    """
+    DuckDBとpyarrowが利用可能か
+
+    Returns:
+        bool: 利用可能な場合True
+    """
+    return all(importlib.util.find_spec(name) is not None for name in ("duckdb", "pyarrow"))
+
+
+def _get_connection():
+    """プロセス内で共有するDuckDBのインメモリデータベース（内部用）"""
+    import duckdb
+    with _lock:
+        if _state["connection"] is None:
+            _state["connection"] = duckdb.connect(database=":memory:")
+        return _state["connection"]
+
+
+def get_snapshot(key: tuple, df: pd.DataFrame):
+    """
+    分析結果のArrowスナップショットを取得する（キーと分析結果ごとに1回だけ変換）
+
+    同じキーの分析結果が共有結果キャッシュで置き換えられた場合は、新しい分析結果から作り直す。
+
+    Args:
+        key: 共有結果キャッシュのキー（参照テーブルのバージョンを含む）
+        df: 分析結果（共有結果キャッシュの省メモリ形式）
+
+    Returns:
+        pyarrow.Table: 行番号列を付与したスナップショット
+    """
+    import pyarrow as pa
+    with _lock:
+        entry = _snapshots.get(key)
+        if entry is not None and entry[0]() is df:
+            _snapshots.move_to_end(key)
+            return entry[1]
+    snapshot = pa.Table.from_pandas(df, preserve_index=False)
+    snapshot = snapshot.append_column(ROW_NUMBER_COLUMN, pa.array(range(len(df)), type=pa.int64()))
+    with _lock:
+        _snapshots[key] = (weakref.ref(df), snapshot)
+        _snapshots.move_to_end(key)
+        while len(_snapshots) > MAX_SNAPSHOTS:
+            _snapshots.popitem(last=False)
+    return snapshot
+
+
+def _query(key: tuple, df: pd.DataFrame, sql: str, params: list = None) -> pd.DataFrame:
+    """スナップショットに対してクエリを実行する（内部用）"""
+    snapshot = get_snapshot(key, df)
+    # 接続はスレッド間で共有できないため、操作ごとにカーソルを作成してスナップショットを登録する
+    cursor = _get_connection().cursor()
+    try:
+        cursor.register(SNAPSHOT_VIEW, snapshot)
+        return cursor.execute(sql, params or []).fetchdf()
+    finally:
+        cursor.close()
+
+
+def _quote(column: str) -> str:
+    """列名を識別子として引用する（内部用）"""
+    return '"' + str(column).replace('"', '""') + '"'
+
+
+def _where(filters: dict) -> tuple:
+    """絞り込み条件のWHERE句とバインド変数を作成する（内部用）"""
+    conditions, params = [], []
+    for column, values in (filters or {}).items():
+        if not isinstance(values, (list, tuple, set)):
+            values = [values]
+        values = list(values)
+        if not values:
+            continue
+        conditions.append(f"{_quote(column)} IN ({', '.join('?' for _ in values)})")
+        params.extend(values)
+    return (" WHERE " + " AND ".join(conditions) if conditions else ""), params
+
+
+def _filter_pandas(df: pd.DataFrame, filters: dict) -> pd.DataFrame:
+    """絞り込み（pandas）"""
+    mask = pd.Series(True, index=df.index)
+    for column, values in (filters or {}).items():
+        if not isinstance(values, (list, tuple, set)):
+            values = [values]
+        values = list(values)
+        if values:
+            mask &= df[column].isin(values)
+    return df[mask]
+
+
+def _record(operation: str, engine: str, sec: float):
+    """操作の所要時間を記録する（内部用）"""
+    with _lock:
+        timings = _timings.setdefault(operation, {
+            DUCKDB_ENGINE: deque(maxlen=MAX_TIMINGS),
+            PANDAS_ENGINE: deque(maxlen=MAX_TIMINGS),
+        })
+        timings[engine].append(sec)
+
+
+def _run(operation: str, use_engine: bool, compare: bool, run_engine, run_pandas):
+    """DuckDBまたはpandasで操作を実行し、所要時間を記録する（内部用）"""
+    engine = DUCKDB_ENGINE if use_engine and is_engine_available() else PANDAS_ENGINE
+    start = time.perf_counter()
+    result = run_engine() if engine == DUCKDB_ENGINE else run_pandas()
+    _record(operation, engine, time.perf_counter() - start)
+    if compare and engine == DUCKDB_ENGINE:
+        # 比較用にpandasでも実行する（結果は使わない）
+        start = time.perf_counter()
+        run_pandas()
+        _record(operation, PANDAS_ENGINE, time.perf_counter() - start)
+    return result
+
+
+def aggregate(key: tuple, df: pd.DataFrame, measures: dict, group_by: list = None, filters: dict = None,
+              order_by: str = None, descending: bool = False, operation: str = "aggregate",
+              use_engine: bool = True, compare: bool = False) -> pd.DataFrame:
+    """
+    分析結果を絞り込んで集計する
+
+    Args:
+        key: 共有結果キャッシュのキー
+        df: 分析結果
+        measures: {出力列名: (集計関数, 対象列)}（集計関数はAGGREGATESのキー。countの対象列はNone可）
+        group_by: 集計軸の列のリスト（省略時は全体の1行）
+        filters: {列名: 値または値のリスト}
+        order_by: 並び替える列（省略時は集計軸の順）
+        descending: 降順にするか
+        operation: 所要時間を記録する操作名
+        use_engine: DuckDBを使用するか（Falseの場合はpandas）
+        compare: DuckDB使用時にpandasでも実行して所要時間を比較するか
+
+    Returns:
+        DataFrame: 集計軸の列と集計値の列
+    """
+    group_by = list(group_by or [])
+    for name, (func, _) in measures.items():
+        if func not in AGGREGATES:
+            raise ValueError(f"未知の集計関数です: {func}")
+
+    def run_engine():
+        select = [_quote(column) for column in group_by]
+        for name, (func, column) in measures.items():
+            target = "*" if func == "count" and column is None else _quote(column)
+            select.append(f"{AGGREGATES[func][0]}({target}) AS {_quote(name)}")
+        where, params = _where(filters)
+        sql = f"SELECT {', '.join(select)} FROM {SNAPSHOT_VIEW}{where}"
+        if group_by:
+            sql += f" GROUP BY {', '.join(_quote(column) for column in group_by)}"
+        if order_by or group_by:
+            direction = " DESC" if descending else ""
+            sql += f" ORDER BY {_quote(order_by) + direction if order_by else ', '.join(_quote(c) for c in group_by)}"
+        return _query(key, df, sql, params)
+
+    def run_pandas():
+        df_filtered = _filter_pandas(df, filters)
+        named = {
+            name: (column, AGGREGATES[func][1]) if column is not None else (df_filtered.columns[0], "size")
+            for name, (func, column) in measures.items()
+        }
+        if group_by:
+            # DuckDBと同様に集計軸がNULLの行も1つのグループとして残す
+            result = df_filtered.groupby(group_by, observed=True, dropna=False).agg(**named).reset_index()
+        else:
+            result = pd.DataFrame([{
+                name: (len(df_filtered) if func == "size" else getattr(df_filtered[column], func)())
+                for name, (column, func) in named.items()
+            }])
+        if order_by:
+            result = result.sort_values(order_by, ascending=not descending)
+        return result.reset_index(drop=True)
+
+    return _run(operation, use_engine, compare, run_engine, run_pandas)
+
+
+def paginate(key: tuple, df: pd.DataFrame, page: int, page_size: int, filters: dict = None,
+             order_by: str = None, descending: bool = False, operation: str = "paginate",
+             use_engine: bool = True, compare: bool = False) -> tuple:
+    """
+    分析結果を絞り込んで指定ページの行を取得する
+
+    Args:
+        key: 共有結果キャッシュのキー
+        df: 分析結果
+        page: ページ番号（1始まり）
+        page_size: 1ページの行数
+        filters: {列名: 値または値のリスト}
+        order_by: 並び替える列（省略時は元の行順）
+        descending: 降順にするか
+        operation: 所要時間を記録する操作名
+        use_engine: DuckDBを使用するか（Falseの場合はpandas）
+        compare: DuckDB使用時にpandasでも実行して所要時間を比較するか
+
+    Returns:
+        tuple: (ページの行のDataFrame, 絞り込み後の全行数)
+    """
+    offset = max(0, (page - 1) * page_size)
+
+    def run_engine():
+        where, params = _where(filters)
+        order = f"{_quote(order_by)}{' DESC' if descending else ''}, " if order_by else ""
+        df_page = _query(key, df, f"""
+            SELECT *, COUNT(*) OVER () AS "_TOTAL"
+            FROM {SNAPSHOT_VIEW}{where}
+            ORDER BY {order}{_quote(ROW_NUMBER_COLUMN)}
+            LIMIT {int(page_size)} OFFSET {int(offset)}
+        """, params)
+        if df_page.empty:
+            total = int(_query(key, df, f"SELECT COUNT(*) FROM {SNAPSHOT_VIEW}{where}", params).iloc[0, 0])
+        else:
+            total = int(df_page["_TOTAL"].iloc[0])
+        return df_page.drop(columns=["_TOTAL", ROW_NUMBER_COLUMN]), total
+
+    def run_pandas():
+        df_filtered = _filter_pandas(df, filters)
+        if order_by:
+            df_filtered = df_filtered.sort_values(order_by, ascending=not descending, kind="stable")
+        return df_filtered.iloc[offset:offset + page_size].reset_index(drop=True), len(df_filtered)
+
+    return _run(operation, use_engine, compare, run_engine, run_pandas)
+
+
+def get_engine_stats() -> list:
+    """
+    操作ごとの所要時間の統計を取得する
+
+    Returns:
+        list: [{"operation", "duckdb_count", "duckdb_p50_ms", "pandas_count", "pandas_p50_ms", "speedup"}]
+    """
+    def p50(values):
+        values = sorted(values)
+        return values[len(values) // 2] * 1000 if values else None
+
+    with _lock:
+        timings = {operation: {engine: list(values) for engine, values in t.items()}
+                   for operation, t in _timings.items()}
+    stats = []
+    for operation, t in sorted(timings.items()):
+        duckdb_ms, pandas_ms = p50(t[DUCKDB_ENGINE]), p50(t[PANDAS_ENGINE])
+        stats.append({
+            "operation": operation,
+            "duckdb_count": len(t[DUCKDB_ENGINE]),
+            "duckdb_p50_ms": duckdb_ms,
+            "pandas_count": len(t[PANDAS_ENGINE]),
+            "pandas_p50_ms": pandas_ms,
+            "speedup": pandas_ms / duckdb_ms if duckdb_ms and pandas_ms else None,
+        })
+    return stats
+
+
+def clear_engine():
+    """スナップショットと所要時間の記録を破棄する"""
+    with _lock:
+        _snapshots.clear()
+        _timings.clear()
@@ -0,0 +1,187 @@
+# =========================================================
+# Snowflake Cortex Handson シナリオ#2
+# エクスポートユーティリティ - 分析結果のステージへのアンロード
+# =========================================================
+# 概要: CUSTOMER_ANALYSISに感情スコア・カテゴリを結合した分析結果を、
+#       COPY INTO @ステージ で購入チャネル・月ごとに分割した圧縮Parquetとして出力する。
+#       データはウェアハウスからステージへ直接書き出されるため、
+#       件数が多くてもStreamlitアプリのメモリを経由しない
+# =========================================================
+
+from datetime import datetime
+
+from snowflake.snowpark.context import get_active_session
+
+# エクスポート先のステージ（ディレクトリテーブルでファイル一覧とダウンロードURLを取得する）
+EXPORT_STAGE = "ANALYSIS_EXPORT_STAGE"
+
+EXPORT_STAGE_DDL = f"""
+CREATE STAGE IF NOT EXISTS {EXPORT_STAGE}
+    encryption = (type = 'snowflake_sse')
+    DIRECTORY = (ENABLE = TRUE)
+"""
+
+# 出力ファイルの最大サイズ（バイト）
+DEFAULT_MAX_FILE_SIZE = 256 * 1024 * 1024
+
+# ダウンロードURLの有効期間（秒）
+DEFAULT_URL_EXPIRY_SEC = 3600
+
+# パーティションのパス（例: purchase_channel=EC/month=2025-06）
+PARTITION_EXPR = """
+    'purchase_channel=' || COALESCE(purchase_channel, 'unknown')
+    || '/month=' || COALESCE(TO_CHAR(review_date, 'YYYY-MM'), 'unknown')
+"""
+
+
+def _get_session():
+    """Snowflakeセッションを取得"""
+    return get_active_session()
+
+
+def build_export_query(categories: list, use_features: bool = False, feature_table: str = None) -> str:
+    """
+    エクスポートする分析結果（チャンク単位）のクエリを生成する
+
+    カテゴリは特徴量テーブルがあれば事前計算済みの値を参照し、
+    なければレビュー単位でAI_CLASSIFYを1回ずつ実行してチャンクに結合する。
+    埋め込み（VECTOR型）はParquetに出力できないため含めない。
+
+    Args:
+        categories: AI_CLASSIFYの分類カテゴリ
+        use_features: 特徴量テーブルを参照するか
+        feature_table: 特徴量テーブル名（use_features=Trueの場合）
+
+    Returns:
+        str: エクスポート対象のクエリ
+    """
+    if use_features:
+        category_source = f"SELECT review_id, category FROM {feature_table}"
+    else:
+        labels = ", ".join("'" + category.replace("'", "''") + "'" for category in categories)
+        category_source = f"""
+            SELECT
+                review_id,
+                AI_CLASSIFY(review_text, ARRAY_CONSTRUCT({labels})):labels[0]::string AS category
+            FROM (SELECT DISTINCT review_id, review_text FROM CUSTOMER_ANALYSIS)
+        """
+    return f"""
+        SELECT
+            a.analysis_id,
+            a.review_id,
+            a.product_id,
+            a.customer_id,
+            a.rating,
+            a.review_date,
+            a.purchase_channel,
+            a.helpful_votes,
+            a.chunked_text,
+            a.sentiment_score,
+            cat.category
+        FROM CUSTOMER_ANALYSIS a
+        LEFT JOIN ({category_source}) cat ON a.review_id = cat.review_id
+    """
+
+
+def export_analysis(categories: list, session=None, use_features: bool = False, feature_table: str = None,
+                    prefix: str = None, max_file_size: int = DEFAULT_MAX_FILE_SIZE) -> dict:
+    """
+    分析結果を購入チャネル・月ごとに分割した圧縮Parquetとしてステージへ出力する
+
+    Args:
+        categories: AI_CLASSIFYの分類カテゴリ
+        session: Snowflakeセッション（省略可）
+        use_features: 特徴量テーブルを参照するか
+        feature_table: 特徴量テーブル名（use_features=Trueの場合）
+        prefix: 出力先のパス（省略時は customer_analysis/実行日時）
+        max_file_size: 出力ファイルの最大サイズ（バイト）
+
+    Returns:
+        dict: {"prefix", "rows_unloaded", "input_bytes", "output_bytes"}
+    """
+    if session is None:
+        session = _get_session()
+    if prefix is None:
+        prefix = f"customer_analysis/{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+    prefix = prefix.strip("/")
+
+    session.sql(EXPORT_STAGE_DDL).collect()
+    result = session.sql(f"""
+        COPY INTO @{EXPORT_STAGE}/{prefix}/
+        FROM ({build_export_query(categories, use_features, feature_table)})
+        PARTITION BY ({PARTITION_EXPR})
+        FILE_FORMAT = (TYPE = PARQUET COMPRESSION = SNAPPY)
+        HEADER = TRUE
+        MAX_FILE_SIZE = {int(max_file_size)}
+    """).collect()
+    # 出力したファイルをディレクトリテーブルに反映
+    session.sql(f"ALTER STAGE {EXPORT_STAGE} REFRESH").collect()
+
+    row = result[0].as_dict() if result else {}
+    return {
+        "prefix": prefix,
+        "rows_unloaded": row.get("rows_unloaded", 0),
+        "input_bytes": row.get("input_bytes", 0),
+        "output_bytes": row.get("output_bytes", 0),
+    }
+
+
+def list_export_files(prefix: str = "", session=None, url_expiry_sec: int = DEFAULT_URL_EXPIRY_SEC) -> list:
+    """
+    エクスポート済みのファイルとサイズを取得する
+
+    Args:
+        prefix: 対象のパス（省略時はすべて）
+        session: Snowflakeセッション（省略可）
+        url_expiry_sec: ダウンロードURLの有効期間（秒）
+
+    Returns:
+        list: [{"path", "partition", "size", "last_modified", "url"}]（パス順）
+    """
+    if session is None:
+        session = _get_session()
+    prefix = prefix.strip("/")
+    try:
+        rows = session.sql(f"""
+            SELECT
+                relative_path,
+                size,
+                last_modified,
+                GET_PRESIGNED_URL(@{EXPORT_STAGE}, relative_path, {int(url_expiry_sec)}) AS url
+            FROM DIRECTORY(@{EXPORT_STAGE})
+            WHERE STARTSWITH(relative_path, ?)
+            ORDER BY relative_path
+        """, params=[f"{prefix}/" if prefix else ""]).collect()
+    except:
+        # ステージが未作成の場合
+        return []
+
+    files = []
+    for row in rows:
+        path = row['RELATIVE_PATH']
+        relative = path[len(prefix) + 1:] if prefix else path
+        files.append({
+            "path": path,
+            "partition": relative.rsplit("/", 1)[0] if "/" in relative else "",
+            "size": row['SIZE'],
+            "last_modified": row['LAST_MODIFIED'],
+            "url": row['URL'],
+        })
+    return files
+
+
+def remove_export(prefix: str, session=None):
+    """
+    エクスポート済みのファイルを削除する
+
+    Args:
+        prefix: 削除するパス
+        session: Snowflakeセッション（省略可）
+    """
+    if session is None:
+        session = _get_session()
+    prefix = prefix.strip("/")
+    if not prefix:
+        raise ValueError("削除するパスを指定してください")
+    session.sql(f"REMOVE @{EXPORT_STAGE}/{prefix}/").collect()
+    session.sql(f"ALTER STAGE {EXPORT_STAGE} REFRESH").collect()
@@ -0,0 +1,75 @@
+# =========================================================
+# Snowflake Cortex Handson シナリオ#2
+# 特徴量ユーティリティ - 事前計算済み特徴量テーブルの参照
+# =========================================================
+# 概要: setup_feature_pipeline.sql で作成したDynamic Tableが存在する場合、
+#       画面描画中にCortex関数を呼ばずに事前計算済みの特徴量を参照する
+# =========================================================
+
+from snowflake.snowpark.context import get_active_session
+
+# 特徴量テーブル（Dynamic Table）
+FEATURE_TABLE = "REVIEW_FEATURES"
+CHUNK_FEATURE_TABLE = "REVIEW_CHUNK_FEATURES"
+SUMMARY_FEATURE_TABLE = "REVIEW_CATEGORY_SUMMARIES"
+
+FEATURE_TABLES = [FEATURE_TABLE, CHUNK_FEATURE_TABLE, SUMMARY_FEATURE_TABLE]
+
+# Dynamic Tableの状態の取得クエリ（ページ描画用のクエリとまとめて発行できるよう公開）
+FEATURE_STATUS_QUERY = "SHOW DYNAMIC TABLES LIKE 'REVIEW_%'"
+
+
+def _get_session():
+    """Snowflakeセッションを取得"""
+    return get_active_session()
+
+
+def get_feature_pipeline_status(session=None, job=None) -> dict:
+    """
+    特徴量パイプラインのDynamic Tableの状態を取得する
+
+    Args:
+        session: Snowflakeセッション（省略可）
+        job: FEATURE_STATUS_QUERYを発行済みのジョブ（query_utils.submit_query()の戻り値・省略時は発行する）
+
+    Returns:
+        dict: {テーブル名: {"target_lag", "scheduling_state", "data_timestamp", "rows"}}
+              作成されていないテーブルは含まれない
+    """
+    status = {}
+    try:
+        if job is None:
+            rows = (session or _get_session()).sql(FEATURE_STATUS_QUERY).collect()
+        else:
+            rows = job.result()
+    except:
+        return status
+
+    for row in rows:
+        data = row.as_dict()
+        name = str(data.get("name", "")).upper()
+        if name in FEATURE_TABLES:
+            status[name] = {
+                "target_lag": data.get("target_lag"),
+                "scheduling_state": data.get("scheduling_state"),
+                "data_timestamp": data.get("data_timestamp"),
+                "rows": data.get("rows") or 0,
+            }
+    return status
+
+
+def is_feature_pipeline_ready(session=None, status: dict = None) -> bool:
+    """
+    レビュー単位の特徴量テーブルが利用可能か（初回リフレッシュ済みか）
+
+    Args:
+        session: Snowflakeセッション（省略可）
+        status: get_feature_pipeline_status()の結果（省略時は取得する）
+
+    Returns:
+        bool: 利用可能な場合True
+    """
+    if status is None:
+        status = get_feature_pipeline_status(session)
+    info = status.get(FEATURE_TABLE)
+    return bool(info) and info.get("data_timestamp") is not None
@@ -24,11 +24,35 @@ import os
 
 # table_utilsをインポートするためのパス設定
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from table_utils import resolve_table_name, check_table_with_fallback, get_table_count_with_fallback
+from table_utils import (
+    resolve_table_name, check_table_with_fallback, get_table_count_with_fallback, refresh_table_resolution, get_table_names
+)
+from feature_utils import (
+    FEATURE_TABLE, CHUNK_FEATURE_TABLE, FEATURE_STATUS_QUERY, get_feature_pipeline_status, is_feature_pipeline_ready
+)
+from storage_utils import (
+    REVIEW_TABLE, CHUNK_TABLE, is_normalized_layout, create_normalized_layout, migrate_to_normalized_layout
+)
+from queue_utils import (
+    BACKLOG_COUNT_QUERY, is_processing_queue_ready, sync_new_reviews, fetch_next_batch, mark_processed,
+    benchmark_backlog_queries
+)
+from embedding_utils import (
+    LEGACY_MODEL, is_embedding_store_ready, create_embedding_store, get_embedding_coverage, backfill_embeddings
+)
+from query_utils import submit_query, submit_queries, get_scalar
+from planner_utils import CHUNK_SIZE, CHUNK_OVERLAP, plan_reviews, single_chunk
+from workload_utils import METADATA, DASHBOARD, PREPROCESSING, RoutedSession, use_workload, route
+from profile_utils import (
+    profile_rerun, profiled, is_profiling_mode, render_profile_sidebar
+)
 
 # ページ設定
 st.set_page_config(layout="wide")
 
+# 再実行ごとのプロファイル（サイドバーの設定または環境変数で有効化、スクリプト終了時にファイルを出力）
+rerun_profiler = profile_rerun("データ準備", is_profiling_mode())
+
 # Snowflakeセッション取得
 @st.cache_resource
 def get_snowflake_session():
@@ -36,6 +60,9 @@ def get_snowflake_session():
 
 session = get_snowflake_session()
 
+# クエリの実行先ウェアハウスとクエリタグ（setup_workload_routing.sql の対応表に従う）
+use_workload(session, METADATA, "データ準備: 状態確認")
+
 # =========================================================
 # 定数設定
 # =========================================================
@@ -64,30 +91,8 @@ SWAP_TARGET_TABLES = [
 ]
 
 def check_table_exists(table_name: str) -> bool:
-    """テーブルの存在確認（複数の方法で確認）"""
-    try:
-        # 方法1: SHOW TABLESを使用してテーブルの存在を確認
-        result = session.sql(f"SHOW TABLES LIKE '{table_name}'").collect()
-        if len(result) > 0:
-            return True
-    except:
-        pass
-    
-    try:
-        # 方法2: 簡単なSELECTクエリを試行
-        session.sql(f"SELECT 1 FROM {table_name} LIMIT 1").collect()
-        return True
-    except:
-        pass
-    
-    try:
-        # 方法3: DESCRIBE TABLEを試行
-        session.sql(f"DESCRIBE TABLE {table_name}").collect()
-        return True
-    except:
-        pass
-    
-    return False
+    """テーブルの存在確認（プロセス内で共有するテーブル一覧から判定し、存在確認クエリは発行しない）"""
+    return check_table_with_fallback(table_name, session)["original_exists"]
 
 def auto_swap_prebuilt_tables():
     """
@@ -126,6 +131,24 @@ if 'auto_swap_executed' not in st.session_state:
     st.session_state.auto_swap_executed = True
     if swapped_tables:
         st.session_state.swapped_tables = swapped_tables
+        # SWAP後のテーブルで参照先を判定し直す
+        refresh_table_resolution(session)
+
+# 以下のテーブルの有無はプロセス内で共有するテーブル一覧から判定する（存在確認クエリは発行しない）
+page_tables = get_table_names(session)
+
+# 正規化レイアウト（REVIEW_ANALYSIS / REVIEW_CHUNKS）を使用しているか
+normalized_layout = is_normalized_layout(tables=page_tables)
+
+# 処理済み判定に使用するテーブル（正規化レイアウトではレビュー単位のテーブル）
+PROCESSED_TABLE = REVIEW_TABLE if normalized_layout else "CUSTOMER_ANALYSIS"
+
+# 未処理キュー（setup_processing_state.sql）があればアンチ結合の代わりに使用
+processing_queue = is_processing_queue_ready(tables=page_tables)
+
+# モデル別の埋め込みストアがあれば、埋め込みはモデル名と一緒にストアにのみ書き込む
+# （CUSTOMER_ANALYSISの埋め込み列は生成モデルを持たないため、ストア作成後は書き込まない）
+embedding_store = is_embedding_store_ready(tables=page_tables)
 
 def get_table_count(table_name: str) -> int:
     """テーブルのレコード数を取得"""
@@ -137,67 +160,117 @@ def get_table_count(table_name: str) -> int:
 
 def process_reviews(embedding_model: str, limit: int = 10):
     """レビューデータの前処理を実行"""
+    # 前処理のクエリはすべて前処理用のウェアハウスで実行する
+    prep_session = RoutedSession(session, PREPROCESSING, "データ準備: 前処理")
+    
     # 未処理のレビューを取得
-    limit_clause = f"LIMIT {limit}" if limit else ""
-    reviews = session.sql(f"""
-        SELECT r.*
-        FROM CUSTOMER_REVIEWS r
-        LEFT JOIN CUSTOMER_ANALYSIS a ON r.review_id = a.review_id
-        WHERE a.review_id IS NULL
-        {limit_clause}
-    """).collect()
+    if processing_queue:
+        # 未処理キューから取得（新着分はタスクを待たずに取り込む）
+        sync_new_reviews(prep_session)
+        reviews = fetch_next_batch(prep_session, limit)
+    else:
+        limit_clause = f"LIMIT {limit}" if limit else ""
+        reviews = prep_session.sql(f"""
+            SELECT r.*
+            FROM CUSTOMER_REVIEWS r
+            LEFT JOIN {PROCESSED_TABLE} a ON r.review_id = a.review_id
+            WHERE a.review_id IS NULL
+            {limit_clause}
+        """).collect()
     
     if not reviews:
         st.info("処理が必要なレビューはありません。")
         return
     
+    # 言語と長さを事前に判定し、翻訳・分割が不要なレビューはCortex関数を呼ばない
+    plans, elision_report = plan_reviews([review['REVIEW_TEXT'] for review in reviews])
+    st.session_state.elision_report = elision_report
+    
     progress_bar = st.progress(0)
     progress_text = st.empty()
     
-    for i, review in enumerate(reviews):
+    for i, (review, plan) in enumerate(zip(reviews, plans)):
         # 進捗表示
         progress = (i + 1) / len(reviews)
         progress_bar.progress(progress)
         progress_text.text(f"処理中: {i + 1}/{len(reviews)} 件")
         
-        # レビュー全体の感情分析（英語翻訳してから実行）
-        translated_text = session.sql("""
-            SELECT SNOWFLAKE.CORTEX.TRANSLATE(?, '', 'en') as translated
-        """, params=[review['REVIEW_TEXT']]).collect()[0]['TRANSLATED']
+        # レビュー全体の感情分析（英語以外は英語翻訳してから実行）
+        if plan["translate"]:
+            translated_text = prep_session.sql("""
+                SELECT SNOWFLAKE.CORTEX.TRANSLATE(?, '', 'en') as translated
+            """, params=[review['REVIEW_TEXT']]).collect()[0]['TRANSLATED']
+        else:
+            translated_text = review['REVIEW_TEXT']
         
-        sentiment_score = session.sql("""
+        sentiment_score = prep_session.sql("""
             SELECT SNOWFLAKE.CORTEX.SENTIMENT(?) as score
         """, params=[translated_text]).collect()[0]['SCORE']
         
-        # テキストをチャンクに分割
-        chunks = session.sql("""
-            SELECT t.value as chunk
-            FROM (
-                SELECT SNOWFLAKE.CORTEX.SPLIT_TEXT_RECURSIVE_CHARACTER(
-                    ?, 'none', 300, 30
-                ) as split_result
-            ),
-            LATERAL FLATTEN(input => split_result) t
-        """, params=[review['REVIEW_TEXT']]).collect()
+        # テキストをチャンクに分割（1チャンクに収まる場合は本文をそのまま使用）
+        if plan["split"]:
+            chunks = prep_session.sql(f"""
+                SELECT t.value as chunk
+                FROM (
+                    SELECT SNOWFLAKE.CORTEX.SPLIT_TEXT_RECURSIVE_CHARACTER(
+                        ?, 'none', {CHUNK_SIZE}, {CHUNK_OVERLAP}
+                    ) as split_result
+                ),
+                LATERAL FLATTEN(input => split_result) t
+            """, params=[review['REVIEW_TEXT']]).collect()
+        else:
+            chunks = single_chunk(review['REVIEW_TEXT'])
+        
+        # 埋め込みストアがある場合、埋め込み列は空のまま挿入し、後でストアにのみ埋め込む
+        embedding_expr = "NULL" if embedding_store else "SNOWFLAKE.CORTEX.EMBED_TEXT_1024(?, ?)"
         
-        # 各チャンクを処理してCUSTOMER_ANALYSISに挿入
-        for chunk in chunks:
-            session.sql("""
-                INSERT INTO CUSTOMER_ANALYSIS (
+        if normalized_layout:
+            # 正規化レイアウト: レビュー属性は1回だけ、チャンクはテキストと埋め込みのみ挿入
+            prep_session.sql(f"""
+                INSERT INTO {REVIEW_TABLE} (
                     review_id, product_id, customer_id, rating, review_text,
-                    review_date, purchase_channel, helpful_votes,
-                    chunked_text, embedding, sentiment_score
+                    review_date, purchase_channel, helpful_votes, sentiment_score
                 )
-                SELECT 
-                    ?, ?, ?, ?, ?, ?, ?, ?, ?,
-                    SNOWFLAKE.CORTEX.EMBED_TEXT_1024(?, ?),
-                    ?
+                SELECT ?, ?, ?, ?, ?, ?, ?, ?, ?
             """, params=[
                 review['REVIEW_ID'], review['PRODUCT_ID'], review['CUSTOMER_ID'],
                 review['RATING'], review['REVIEW_TEXT'], review['REVIEW_DATE'],
-                review['PURCHASE_CHANNEL'], review['HELPFUL_VOTES'],
-                chunk['CHUNK'], embedding_model, chunk['CHUNK'], sentiment_score
+                review['PURCHASE_CHANNEL'], review['HELPFUL_VOTES'], sentiment_score
             ]).collect()
+            
+            for chunk_index, chunk in enumerate(chunks):
+                embedding_params = [] if embedding_store else [embedding_model, chunk['CHUNK']]
+                prep_session.sql(f"""
+                    INSERT INTO {CHUNK_TABLE} (review_id, chunk_index, chunked_text, embedding)
+                    SELECT ?, ?, ?, {embedding_expr}
+                """, params=[review['REVIEW_ID'], chunk_index, chunk['CHUNK']] + embedding_params).collect()
+        else:
+            # 各チャンクを処理してCUSTOMER_ANALYSISに挿入
+            for chunk in chunks:
+                embedding_params = [] if embedding_store else [embedding_model, chunk['CHUNK']]
+                prep_session.sql(f"""
+                    INSERT INTO CUSTOMER_ANALYSIS (
+                        review_id, product_id, customer_id, rating, review_text,
+                        review_date, purchase_channel, helpful_votes,
+                        chunked_text, embedding, sentiment_score
+                    )
+                    SELECT 
+                        ?, ?, ?, ?, ?, ?, ?, ?, ?,
+                        {embedding_expr},
+                        ?
+                """, params=[
+                    review['REVIEW_ID'], review['PRODUCT_ID'], review['CUSTOMER_ID'],
+                    review['RATING'], review['REVIEW_TEXT'], review['REVIEW_DATE'],
+                    review['PURCHASE_CHANNEL'], review['HELPFUL_VOTES'], chunk['CHUNK']
+                ] + embedding_params + [sentiment_score]).collect()
+        
+        # 挿入したチャンクを選択中のモデルで埋め込み、モデル名と一緒にストアへ書き込む
+        if embedding_store:
+            backfill_embeddings(embedding_model, prep_session, review_id=review['REVIEW_ID'])
+        
+        # 処理済みのレビューをキューから削除
+        if processing_queue:
+            mark_processed(review['REVIEW_ID'], prep_session)
     
     progress_text.text(f"完了: {len(reviews)} 件のレビューを処理しました")
 
@@ -232,6 +305,51 @@ st.sidebar.info(f"""
 このモデルがテキストのベクトル化に使用されます。
 """)
 
+render_profile_sidebar()
+
+# =========================================================
+# 埋め込みストア（サイドバー）
+# =========================================================
+if check_table_exists("CUSTOMER_ANALYSIS"):
+    st.sidebar.markdown("---")
+    st.sidebar.header("🧬 埋め込みストア")
+    
+    if not embedding_store:
+        st.sidebar.markdown("""
+        埋め込みをモデルごとに保存し、モデルを切り替えても
+        既存の埋め込みを再計算・混在させないようにします。
+        """)
+        if st.sidebar.button("🧬 埋め込みストアを作成"):
+            with st.sidebar:
+                with st.spinner("作成中..."):
+                    try:
+                        imported = create_embedding_store(session)
+                        refresh_table_resolution(session)
+                        st.success(f"✅ 作成しました（既存の埋め込み{imported:,}件をモデル「{LEGACY_MODEL}」として保持）")
+                        st.rerun()
+                    except Exception as e:
+                        st.error(f"❌ 作成エラー: {str(e)}")
+    else:
+        try:
+            coverage = get_embedding_coverage(session)
+            other_models = [model for model in coverage["models"] if model not in EMBEDDING_MODELS]
+            for model in EMBEDDING_MODELS + other_models:
+                st.sidebar.write(f"- `{model}`: {coverage['models'].get(model, 0):,} / {coverage['total_chunks']:,}チャンク")
+            
+            missing = coverage["total_chunks"] - coverage["models"].get(st.session_state.selected_embedding_model, 0)
+            if missing > 0 and st.sidebar.button(f"⬇️ 選択中のモデルで{missing:,}チャンクを一括埋め込み"):
+                with st.sidebar:
+                    with st.spinner("一括埋め込み中..."):
+                        try:
+                            with route(session, PREPROCESSING, "データ準備: 埋め込みストア") as prep_session:
+                                added = backfill_embeddings(st.session_state.selected_embedding_model, prep_session)
+                            st.success(f"✅ {added:,}チャンクを埋め込みました")
+                            st.rerun()
+                        except Exception as e:
+                            st.error(f"❌ 埋め込みエラー: {str(e)}")
+        except Exception:
+            st.sidebar.info("埋め込みストアの状況を取得できませんでした。")
+
 # =========================================================
 # データ修復機能（サイドバー）
 # =========================================================
@@ -263,6 +381,7 @@ if st.sidebar.button("🔄 完成データに置換", help="Part1の成果物テ
             swapped, errors = manual_swap_prebuilt_tables()
         
         if swapped:
+            refresh_table_resolution(session)
             st.success(f"✅ {len(swapped)}個のテーブルを置換しました")
             for t in swapped:
                 st.write(f"  - {t}")
@@ -274,6 +393,45 @@ if st.sidebar.button("🔄 完成データに置換", help="Part1の成果物テ
         else:
             st.info("置換対象のテーブルがありません")
 
+# =========================================================
+# ストレージ最適化（サイドバー）
+# =========================================================
+if not normalized_layout and check_table_exists("CUSTOMER_ANALYSIS"):
+    st.sidebar.markdown("---")
+    st.sidebar.header("🗜️ ストレージ最適化")
+    st.sidebar.markdown("""
+    CUSTOMER_ANALYSISをレビュー単位（REVIEW_ANALYSIS）と
+    チャンク単位（REVIEW_CHUNKS）のテーブルに分割します。
+    既存のクエリは互換ビューでそのまま動作します。
+    """)
+    
+    if st.sidebar.button("🗜️ 正規化レイアウトへ移行"):
+        with st.sidebar:
+            with st.spinner("移行中..."):
+                try:
+                    with route(session, PREPROCESSING, "データ準備: レイアウト移行") as prep_session:
+                        report = migrate_to_normalized_layout(prep_session)
+                    refresh_table_resolution(session)
+                    st.session_state.migration_report = report
+                    st.rerun()
+                except Exception as e:
+                    st.error(f"❌ 移行エラー: {str(e)}")
+
+if 'migration_report' in st.session_state:
+    report = st.session_state.migration_report
+    with st.sidebar:
+        st.success(f"✅ {report['reviews']:,}レビュー / {report['chunks']:,}チャンクを移行しました")
+        st.metric(
+            "ストレージ削減量",
+            f"{report['bytes_saved'] / 1024 / 1024:,.2f} MB",
+            help=f"移行前: {report['bytes_before']:,} bytes / 移行後: {report['bytes_after']:,} bytes"
+        )
+        if report['benchmark']:
+            df_bench = pd.DataFrame(report['benchmark']).rename(columns={
+                "query": "クエリ", "wide_sec": "移行前(秒)", "normalized_sec": "移行後(秒)", "speedup": "高速化倍率"
+            })
+            st.dataframe(df_bench, use_container_width=True, hide_index=True)
+
 st.markdown("---")
 
 # =========================================================
@@ -290,6 +448,103 @@ existing_tables = {
     "SNOW_RETAIL_DOCUMENTS": "社内ドキュメント"
 }
 
+# =========================================================
+# ページ描画用クエリの一括発行
+# =========================================================
+# セクション1〜3の件数・統計クエリは互いに独立しているため、描画前にまとめて
+# 非同期ジョブとして発行し、各セクションでは結果を受け取るだけにする
+use_workload(session, DASHBOARD, "データ準備: セクション1-3")
+
+# 特徴量パイプライン（setup_feature_pipeline.sql）の状態は件数クエリと同時に発行する
+feature_status_job = submit_query(session, FEATURE_STATUS_QUERY)
+table_info = {
+    table_name: check_table_with_fallback(table_name, session)
+    for table_name in existing_tables
+}
+table_count_jobs = submit_queries(session, {
+    table_name: f"SELECT COUNT(*) as count FROM {info['actual_table']}"
+    for table_name, info in table_info.items() if info["exists"]
+})
+
+# 特徴量パイプラインの確認（以降の統計クエリの参照先を決めるため、ここで結果を受け取る）
+feature_status = get_feature_pipeline_status(job=feature_status_job)
+use_features = is_feature_pipeline_ready(status=feature_status)
+
+analysis_table_exists = check_table_exists("CUSTOMER_ANALYSIS")
+
+# 特徴量パイプラインがあれば事前計算済みの特徴量を参照する
+if use_features:
+    sentiment_stats_query = f"""
+        SELECT 
+            sentiment_score,
+            COUNT(*) as review_count
+        FROM {FEATURE_TABLE}
+        GROUP BY sentiment_score
+        ORDER BY sentiment_score
+    """
+    processing_stats_query = f"""
+        SELECT 
+            COUNT(*) as unique_reviews,
+            (SELECT COUNT(*) FROM {CHUNK_FEATURE_TABLE}) as total_chunks,
+            AVG(sentiment_score) as avg_sentiment,
+            MIN(sentiment_score) as min_sentiment,
+            MAX(sentiment_score) as max_sentiment
+        FROM {FEATURE_TABLE}
+    """
+elif normalized_layout:
+    sentiment_stats_query = f"""
+        SELECT 
+            sentiment_score,
+            COUNT(*) as review_count
+        FROM {REVIEW_TABLE}
+        GROUP BY sentiment_score
+        ORDER BY sentiment_score
+    """
+    processing_stats_query = f"""
+        SELECT 
+            COUNT(*) as unique_reviews,
+            (SELECT COUNT(*) FROM {CHUNK_TABLE}) as total_chunks,
+            AVG(sentiment_score) as avg_sentiment,
+            MIN(sentiment_score) as min_sentiment,
+            MAX(sentiment_score) as max_sentiment
+        FROM {REVIEW_TABLE}
+    """
+else:
+    sentiment_stats_query = """
+        SELECT 
+            sentiment_score,
+            COUNT(DISTINCT review_id) as review_count
+        FROM CUSTOMER_ANALYSIS
+        GROUP BY sentiment_score
+        ORDER BY sentiment_score
+    """
+    processing_stats_query = """
+        SELECT 
+            COUNT(DISTINCT review_id) as unique_reviews,
+            COUNT(*) as total_chunks,
+            AVG(sentiment_score) as avg_sentiment,
+            MIN(sentiment_score) as min_sentiment,
+            MAX(sentiment_score) as max_sentiment
+        FROM CUSTOMER_ANALYSIS
+    """
+
+page_queries = {}
+if analysis_table_exists:
+    page_queries["processed_count"] = f"SELECT COUNT(*) as count FROM {CHUNK_TABLE if normalized_layout else 'CUSTOMER_ANALYSIS'}"
+    if processing_queue:
+        page_queries["unprocessed_count"] = BACKLOG_COUNT_QUERY
+    else:
+        page_queries["unprocessed_count"] = f"""
+            SELECT COUNT(*) as count
+            FROM CUSTOMER_REVIEWS r
+            LEFT JOIN {PROCESSED_TABLE} a ON r.review_id = a.review_id
+            WHERE a.review_id IS NULL
+        """
+if use_features or analysis_table_exists:
+    page_queries["sentiment_stats"] = sentiment_stats_query
+    page_queries["processing_stats"] = processing_stats_query
+page_jobs = submit_queries(session, page_queries)
+
 tab1, tab2 = st.tabs(["📋 テーブル確認", "🔍 データサンプル"])
 
 with tab1:
@@ -298,15 +553,9 @@ with tab1:
     # テーブル存在確認（フォールバック機能対応）
     table_status = {}
     for table_name, description in existing_tables.items():
-        # フォールバック対応のテーブルチェック
-        info = check_table_with_fallback(table_name, session)
-        count = 0
-        if info["exists"]:
-            try:
-                result = session.sql(f"SELECT COUNT(*) as count FROM {info['actual_table']}").collect()
-                count = result[0]['COUNT']
-            except:
-                pass
+        # フォールバック対応のテーブルチェック（件数は発行済みのジョブから受け取る）
+        info = table_info[table_name]
+        count = get_scalar(table_count_jobs.get(table_name), 0)
         
         table_status[table_name] = {
             "exists": info["exists"], 
@@ -341,6 +590,7 @@ with tab2:
         )
         
         @st.fragment
+        @profiled("データ準備: サンプルデータ", is_profiling_mode)
         def show_sample_data():
             """サンプルデータ表示のフラグメント"""
             if st.button("📄 サンプルデータ表示"):
@@ -367,6 +617,15 @@ st.markdown("---")
 st.subheader("🔄 セクション2: レビューデータの前処理")
 st.markdown("顧客レビューデータに対してCortex AI機能を使用した前処理を実行します。")
 
+if feature_status:
+    st.markdown("#### ⚡ 特徴量パイプライン（Dynamic Table）")
+    st.markdown("CUSTOMER_REVIEWSの増加に合わせて、翻訳・感情スコア・カテゴリ・チャンク埋め込みが自動で更新されます。")
+    feature_cols = st.columns(len(feature_status))
+    for feature_col, (name, info) in zip(feature_cols, feature_status.items()):
+        with feature_col:
+            st.metric(name, f"{int(info['rows']):,}件", help=f"目標遅延: {info['target_lag']}")
+            st.caption(f"状態: {info['scheduling_state']} | データ時点: {info['data_timestamp'] or '未リフレッシュ'}")
+
 if not check_table_exists("CUSTOMER_REVIEWS"):
     st.error("CUSTOMER_REVIEWSテーブルが見つかりません。前準備を確認してください。")
 else:
@@ -378,31 +637,18 @@ else:
     3. **ベクトル化**: 分割されたチャンクテキストを1024次元のベクトルに変換（EMBED_TEXT_1024）
     """)
     
-    # 前処理テーブルの存在確認
-    analysis_table_exists = check_table_exists("CUSTOMER_ANALYSIS")
+    if use_features:
+        st.success("⚡ 特徴量パイプラインが有効なため、以下の手動前処理は任意です（ハンズオン体験用）。")
     
     if not analysis_table_exists:
         st.warning("前処理用テーブル（CUSTOMER_ANALYSIS）が存在しません。")
         if st.button("🔧 前処理用テーブルを作成", type="primary"):
             with st.spinner("前処理用テーブルを作成中..."):
                 try:
-                    session.sql("""
-                    CREATE TABLE IF NOT EXISTS CUSTOMER_ANALYSIS (
-                        analysis_id NUMBER AUTOINCREMENT,
-                        review_id VARCHAR(20),
-                        product_id VARCHAR(10),
-                        customer_id VARCHAR(10),
-                        rating NUMBER(2,1),
-                        review_text TEXT,
-                        review_date TIMESTAMP_NTZ,
-                        purchase_channel VARCHAR(20),
-                        helpful_votes NUMBER(5),
-                        chunked_text TEXT,
-                        embedding VECTOR(FLOAT, 1024),
-                        sentiment_score FLOAT,
-                        updated_at TIMESTAMP_NTZ DEFAULT CURRENT_TIMESTAMP()
-                    )
-                    """).collect()
+                    # レビュー単位・チャンク単位のテーブルと互換ビューCUSTOMER_ANALYSISを作成
+                    create_normalized_layout(session)
+                    create_embedding_store(session)
+                    refresh_table_resolution(session)
                     st.success("✅ 前処理用テーブルを作成しました！")
                     st.rerun()
                         
@@ -415,22 +661,43 @@ else:
         col1, col2 = st.columns(2)
         
         with col1:
-            processed_count = get_table_count("CUSTOMER_ANALYSIS")
+            processed_count = get_scalar(page_jobs.get("processed_count"), 0)
             st.metric("処理済みチャンク数", f"{processed_count:,}件")
+            
+            # 直前の前処理で省略したCortex関数の呼び出し
+            if "elision_report" in st.session_state:
+                report = st.session_state.elision_report
+                with st.expander("✂️ 直前の前処理で省略した呼び出し"):
+                    st.dataframe(pd.DataFrame([
+                        {"関数": "TRANSLATE", "実行": report["translate_calls"], "省略": report["translate_skipped"]},
+                        {"関数": "SPLIT_TEXT_RECURSIVE_CHARACTER", "実行": report["split_calls"], "省略": report["split_skipped"]},
+                    ]), use_container_width=True, hide_index=True)
+                    st.caption(
+                        f"対象{report['reviews']:,}件の言語判定: "
+                        + ", ".join(f"{language}: {count:,}件" for language, count in report["languages"].items())
+                    )
         
         with col2:
             # 前処理実行ボタン
             # 未処理レビュー数の確認
             try:
-                unprocessed_count = session.sql("""
-                    SELECT COUNT(*) as count
-                    FROM CUSTOMER_REVIEWS r
-                    LEFT JOIN CUSTOMER_ANALYSIS a ON r.review_id = a.review_id
-                    WHERE a.review_id IS NULL
-                """).collect()[0]['COUNT']
+                unprocessed_count = page_jobs["unprocessed_count"].result()[0]['COUNT']
                 
                 st.metric("未処理レビュー数", f"{unprocessed_count:,}件")
                 
+                if processing_queue:
+                    with st.expander("⏱️ 未処理判定のベンチマーク（アンチ結合 vs 未処理キュー）"):
+                        if st.button("計測する", key="benchmark_backlog"):
+                            with st.spinner("計測中..."):
+                                try:
+                                    df_bench = pd.DataFrame(benchmark_backlog_queries(PROCESSED_TABLE, session=session))
+                                    st.dataframe(df_bench.rename(columns={
+                                        "query": "クエリ", "anti_join_sec": "アンチ結合(秒)",
+                                        "queue_sec": "未処理キュー(秒)", "speedup": "高速化倍率"
+                                    }), use_container_width=True, hide_index=True)
+                                except Exception as e:
+                                    st.error(f"❌ 計測エラー: {str(e)}")
+                
                 if unprocessed_count > 0:
                     # 10件処理ボタン
                     if st.button("🧪 10件ずつ処理", type="secondary", use_container_width=True):
@@ -460,23 +727,18 @@ else:
 # =========================================================
 # セクション3: 前処理結果の確認
 # =========================================================
-if check_table_exists("CUSTOMER_ANALYSIS"):
+if use_features or analysis_table_exists:
     st.markdown("---")
     st.subheader("📈 セクション3: 前処理結果の確認")
+    if use_features:
+        st.caption(f"⚡ 特徴量パイプライン（{FEATURE_TABLE} / {CHUNK_FEATURE_TABLE}）の値を表示しています。")
     
     col1, col2 = st.columns(2)
     
     with col1:
         # 感情スコア分布（レビュー単位で表示）
         try:
-            sentiment_stats = session.sql("""
-                SELECT 
-                    sentiment_score,
-                    COUNT(DISTINCT review_id) as review_count
-                FROM CUSTOMER_ANALYSIS
-                GROUP BY sentiment_score
-                ORDER BY sentiment_score
-            """).collect()
+            sentiment_stats = page_jobs["sentiment_stats"].result()
             
             if sentiment_stats:
                 sentiment_df = pd.DataFrame([row.as_dict() for row in sentiment_stats])
@@ -490,15 +752,7 @@ if check_table_exists("CUSTOMER_ANALYSIS"):
     with col2:
         # 処理統計
         try:
-            stats = session.sql("""
-                SELECT 
-                    COUNT(DISTINCT review_id) as unique_reviews,
-                    COUNT(*) as total_chunks,
-                    AVG(sentiment_score) as avg_sentiment,
-                    MIN(sentiment_score) as min_sentiment,
-                    MAX(sentiment_score) as max_sentiment
-                FROM CUSTOMER_ANALYSIS
-            """).collect()[0]
+            stats = page_jobs["processing_stats"].result()[0]
             
             st.metric("処理済みレビュー数", f"{stats['UNIQUE_REVIEWS']:,}件")
             st.metric("総チャンク数", f"{stats['TOTAL_CHUNKS']:,}件")
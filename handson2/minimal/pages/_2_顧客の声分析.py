@@ -12,6 +12,7 @@
 
 import streamlit as st
 import pandas as pd
+import numpy as np
 import json
 import plotly.express as px
 import plotly.graph_objects as go
@@ -19,10 +20,40 @@ from snowflake.snowpark.context import get_active_session
 from snowflake.snowpark.functions import col, lit
 from datetime import datetime
 import time
+import sys
+import os
+
+# sampling_utils等をインポートするためのパス設定
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from sampling_utils import (
+    DEFAULT_SAMPLE_SIZE, DEFAULT_SEED, MIN_PER_STRATUM,
+    build_sample_source, build_sample_size_query, build_remaining_filter, remaining_params,
+    estimate_shares, estimate_match_rate
+)
+from batch_utils import DEFAULT_BATCH_SIZE, keyset_batch_clause, iter_keyset_batches
+from feature_utils import (
+    FEATURE_TABLE, SUMMARY_FEATURE_TABLE, get_feature_pipeline_status, is_feature_pipeline_ready
+)
+from embedding_utils import LEGACY_MODEL, is_embedding_store_ready, get_embedding_coverage, find_similar_chunks
+from export_utils import EXPORT_STAGE, export_analysis, list_export_files
+from workload_utils import DASHBOARD, AI_BATCH, use_workload, routed, route, run_query
+from agg_utils import AI_AGG_KIND, SUMMARIZE_KIND, hierarchical_aggregate
+from cube_utils import CUBE_TABLE, get_cube_status, is_cube_ready, slice_cube, get_dimension_values
+from engine_utils import is_engine_available, aggregate, paginate, get_engine_stats
+from profile_utils import (
+    profile_rerun, profiled, is_profiling_mode, render_profile_sidebar
+)
+from chart_utils import ROW_THRESHOLD, histogram, scatter, payload_bytes, compare_payload
+from result_cache_utils import (
+    make_key, get_data_version, put_result, get_result, with_review_text, get_result_cache_stats
+)
 
 # ページ設定
 st.set_page_config(layout="wide")
 
+# 再実行ごとのプロファイル（サイドバーの設定または環境変数で有効化、スクリプト終了時にファイルを出力）
+rerun_profiler = profile_rerun("顧客の声分析", is_profiling_mode())
+
 # Snowflakeセッション取得
 @st.cache_resource
 def get_snowflake_session():
@@ -30,6 +61,9 @@ def get_snowflake_session():
 
 session = get_snowflake_session()
 
+# クエリの実行先ウェアハウスとクエリタグ（setup_workload_routing.sql の対応表に従う）
+use_workload(session, DASHBOARD, "顧客の声分析: データ状況確認")
+
 # =========================================================
 # 定数設定
 # =========================================================
@@ -72,6 +106,186 @@ def get_table_count(table_name: str) -> int:
     except:
         return 0
 
+def is_quick_mode() -> bool:
+    """クイックモード（層化サンプル）が選択されているか"""
+    return st.session_state.get("analysis_mode", "全件") != "全件"
+
+def get_sample_params() -> dict:
+    """現在のサンプル設定を取得"""
+    return {
+        "sample_size": int(st.session_state.get("sample_size", DEFAULT_SAMPLE_SIZE)),
+        "seed": int(st.session_state.get("sample_seed", DEFAULT_SEED)),
+    }
+
+def review_source(sample_params: dict = None, remaining: bool = False, batch_size: int = None,
+                  with_features: bool = False) -> str:
+    """
+    分析対象レビューの派生テーブル（別名r）を返す
+
+    sample_paramsが指定された場合は層化サンプルに限定し（層情報の列を付与）、
+    remaining=Trueの場合は分析済みのレビューを除外する（全件への昇格用。
+    除外するreview_idはremaining_params()のバインド変数で渡す）。
+    batch_sizeが指定された場合はreview_id順のバッチに限定する（バインド変数1つ）。
+    with_features=Trueの場合は特徴量テーブルにあるレビューに限定する（feature_join()と併用。
+    結合で落ちる行をバッチの件数に含めないよう、LIMITより前で絞り込む）。
+    """
+    batch_clause = keyset_batch_clause(batch_size, "c.review_id") if batch_size else ""
+    if with_features and USE_FEATURES:
+        batch_clause = f"AND EXISTS (SELECT 1 FROM {FEATURE_TABLE} fe WHERE fe.review_id = c.review_id) {batch_clause}"
+    if sample_params is None:
+        return f"""(
+        SELECT c.* FROM CUSTOMER_REVIEWS c
+        WHERE c.review_text IS NOT NULL {batch_clause}
+    ) r"""
+    if remaining:
+        return f"""(
+        SELECT c.* FROM CUSTOMER_REVIEWS c
+        WHERE c.review_text IS NOT NULL
+          AND {build_remaining_filter(alias="c")}
+          {batch_clause}
+    ) r"""
+    return f"""(
+        SELECT c.*, s.stratum_key, s.stratum_size
+        FROM CUSTOMER_REVIEWS c
+        JOIN ({build_sample_source(sample_params["sample_size"], sample_params["seed"])}) s
+          ON c.review_id = s.review_id
+        WHERE c.review_text IS NOT NULL {batch_clause}
+    ) r"""
+
+def sample_columns(sample_params: dict = None) -> str:
+    """サンプル実行時に付与する層情報の列"""
+    return ", r.stratum_key, r.stratum_size" if sample_params else ""
+
+def category_expr(text_col: str = "r.review_text") -> str:
+    """カテゴリ列の式（特徴量テーブルがあれば事前計算済みの値を参照）"""
+    if USE_FEATURES:
+        return "f.category"
+    return f"""AI_CLASSIFY(
+            {text_col}, 
+            ARRAY_CONSTRUCT('商品品質', '配送サービス', '価格', 'カスタマーサービス', '店舗環境', 'その他')
+        ):labels[0]::string"""
+
+def sentiment_expr(text_col: str = "r.review_text") -> str:
+    """感情スコア列の式（特徴量テーブルがあれば事前計算済みの値を参照）"""
+    return "f.sentiment_score" if USE_FEATURES else f"SNOWFLAKE.CORTEX.SENTIMENT({text_col})"
+
+def feature_join() -> str:
+    """特徴量テーブルとの結合句"""
+    return f"JOIN {FEATURE_TABLE} f ON r.review_id = f.review_id" if USE_FEATURES else ""
+
+def count_review_source(sample_params: dict = None, with_features: bool = False) -> int:
+    """分析対象レビューの件数を取得（バッチ実行の進捗表示用）"""
+    try:
+        result = session.sql(
+            f"SELECT COUNT(*) as count FROM {review_source(sample_params, with_features=with_features)}"
+        ).collect()
+        return result[0]['COUNT']
+    except:
+        return 0
+
+def get_realized_sample_size(sample_params: dict):
+    """層化サンプルの実際の件数（各層の最低件数の分だけ目標より多くなる。設定ごとに1回だけ取得）"""
+    cache = st.session_state.setdefault('realized_sample_sizes', {})
+    cache_key = (sample_params["sample_size"], sample_params["seed"])
+    if cache_key not in cache:
+        try:
+            result = session.sql(
+                build_sample_size_query(sample_params["sample_size"], sample_params["seed"])
+            ).collect()
+            cache[cache_key] = result[0]['SAMPLE_COUNT']
+        except:
+            return None
+    return cache[cache_key]
+
+def sample_run_label(sample_params: dict = None) -> str:
+    """実行ボタンに表示する対象件数"""
+    if not sample_params:
+        return "全件"
+    realized = get_realized_sample_size(sample_params)
+    if realized is None:
+        return f"サンプル約{sample_params['sample_size']}件"
+    return f"サンプル{realized}件"
+
+def results_key(analysis_type: str, sample_params: dict = None) -> tuple:
+    """共有結果キャッシュのキー（分析の種類・サンプル設定・参照テーブルのバージョン）"""
+    tables = ["CUSTOMER_REVIEWS"] + ([FEATURE_TABLE] if USE_FEATURES else [])
+    try:
+        data_version = get_data_version(tables, session)
+    except:
+        data_version = ()
+    return make_key(analysis_type, {"sample": sample_params, "features": USE_FEATURES}, data_version)
+
+def load_results(analysis_type: str):
+    """session_stateのキーで共有結果キャッシュから分析結果を取得（破棄済みの場合はNone）"""
+    return get_result(st.session_state.get(f"{analysis_type}_results_key"))
+
+def render_payload_caption(fig, build_naive_fig, row_count: int):
+    """チャートのJSONサイズを表示（閾値を超える場合は全行を送るチャートと比較）"""
+    if row_count > ROW_THRESHOLD:
+        payload = compare_payload(build_naive_fig(), fig)
+        st.caption(
+            f"📦 チャートデータ: {payload['bytes'] / 1024:.1f} KB"
+            f"（全{row_count:,}行を送る場合 {payload['naive_bytes'] / 1024:.1f} KB、{payload['reduction']:.0%}削減）"
+        )
+    else:
+        st.caption(f"📦 チャートデータ: {payload_bytes(fig) / 1024:.1f} KB（{row_count:,}行・全行を送信）")
+
+def engine_options() -> dict:
+    """ローカル分析エンジンの設定（aggregate / paginate に渡す引数）"""
+    return {
+        "use_engine": bool(st.session_state.get("use_local_engine", True)),
+        "compare": bool(st.session_state.get("compare_engine", False)),
+    }
+
+def is_progressive_mode() -> bool:
+    """バッチ逐次表示が有効か"""
+    return bool(st.session_state.get("progressive_mode", False))
+
+def collect_progressively(query: str, batch_size: int, total: int, render_partial, section: str) -> pd.DataFrame:
+    """
+    クエリをバッチ単位で実行し、バッチ完了ごとに途中経過を描画する
+
+    最終結果は単一クエリで実行した場合と同じ行集合になる（review_id順に連結）。
+    バッチのクエリはAI分析バッチのウェアハウスで実行する
+    """
+    progress_bar = st.progress(0.0, text=f"0/{total}件 処理済み")
+    placeholder = st.empty()
+    frames = []
+    processed = 0
+    
+    with route(session, AI_BATCH, section) as ai_session:
+        for batch_no, rows in enumerate(iter_keyset_batches(ai_session, query, batch_size), start=1):
+            frames.append(pd.DataFrame([row.as_dict() for row in rows]))
+            processed += len(rows)
+            progress_bar.progress(min(1.0, processed / total) if total else 1.0,
+                                  text=f"{processed}/{total}件 処理済み（バッチ{batch_no}）")
+            with placeholder.container():
+                render_partial(pd.concat(frames, ignore_index=True), batch_no)
+    
+    progress_bar.empty()
+    placeholder.empty()
+    return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+
+def render_share_estimates(df: pd.DataFrame, value_col: str, label: str, categories: list = None):
+    """層化サンプルの推定構成比を信頼区間付きで表示（categoriesはサンプルに現れない値も表示）"""
+    df_est = estimate_shares(df, value_col, categories=categories)
+    fig = go.Figure(go.Bar(
+        x=df_est[value_col],
+        y=df_est["推定構成比"] * 100,
+        error_y=dict(
+            type="data",
+            symmetric=False,
+            array=(df_est["上限"] - df_est["推定構成比"]) * 100,
+            arrayminus=(df_est["推定構成比"] - df_est["下限"]) * 100
+        )
+    ))
+    fig.update_layout(title=f"{label}（推定構成比・95%信頼区間）", yaxis_title="構成比（%）")
+    st.plotly_chart(fig, use_container_width=True)
+    st.dataframe(
+        df_est.style.format({"推定構成比": "{:.1%}", "下限": "{:.1%}", "上限": "{:.1%}"}),
+        use_container_width=True
+    )
+
 # =========================================================
 # メインページタイトル
 # =========================================================
@@ -122,6 +336,111 @@ if not all_tables_exist:
     st.error("⚠️ 必要なテーブルが見つかりません。Step1のデータ準備を完了してください。")
     st.stop()
 
+# 特徴量パイプライン（setup_feature_pipeline.sql）の確認
+feature_status = get_feature_pipeline_status(session)
+USE_FEATURES = is_feature_pipeline_ready(status=feature_status)
+USE_SUMMARY_FEATURES = USE_FEATURES and (feature_status.get(SUMMARY_FEATURE_TABLE) or {}).get("data_timestamp") is not None
+
+# レビューキューブ（setup_review_cube.sql、特徴量パイプラインの事前集計）の確認
+cube_status = get_cube_status(session) if USE_FEATURES else None
+USE_CUBE = is_cube_ready(status=cube_status)
+
+if USE_FEATURES:
+    st.info(f"""
+    ⚡ **事前計算済み特徴量を使用中**（{FEATURE_TABLE}: 
+    {feature_status[FEATURE_TABLE]['data_timestamp']} 時点、目標遅延 {feature_status[FEATURE_TABLE]['target_lag']}）  
+    感情スコアとカテゴリは特徴量パイプラインの値を参照するため、画面描画中にSENTIMENT・AI_CLASSIFYは実行されません。
+    """)
+
+# 埋め込みストアに保存済みのモデル（生成モデル不明の埋め込みは除く）
+EMBEDDING_STORE_MODELS = []
+if is_embedding_store_ready(session):
+    try:
+        EMBEDDING_STORE_MODELS = [
+            model for model in get_embedding_coverage(session)["models"] if model != LEGACY_MODEL
+        ]
+    except:
+        pass
+
+# =========================================================
+# サイドバー設定（分析モード）
+# =========================================================
+st.sidebar.header("⚙️ 分析モード")
+st.sidebar.radio(
+    "実行対象:",
+    ["全件", "クイック（層化サンプル）"],
+    key="analysis_mode",
+    help="クイックモードでは購入チャネル×評価×月で層化したサンプルのみをAI関数で分析し、全体を推定します"
+)
+if is_quick_mode():
+    st.sidebar.number_input(
+        "サンプルサイズ:", min_value=10, max_value=100000,
+        value=DEFAULT_SAMPLE_SIZE, step=10, key="sample_size"
+    )
+    st.sidebar.number_input(
+        "シード:", min_value=0, value=DEFAULT_SEED, step=1, key="sample_seed",
+        help="同じシードでは同じレビューが選ばれます"
+    )
+    realized_sample_size = get_realized_sample_size(get_sample_params())
+    if realized_sample_size is not None:
+        st.sidebar.caption(f"実際のサンプル件数: {realized_sample_size}件（各層最低{MIN_PER_STRATUM}件を抽出するため目標より多くなります）")
+    st.sidebar.info("""
+    **クイックモード:**
+    - セクション2・3・6がサンプルに対して実行されます
+    - 構成比・マッチ率は95%信頼区間付きで全体に外挿されます
+    - 「全件に昇格」でサンプル済みの行を再利用して残りだけを処理します
+    """)
+
+st.sidebar.checkbox(
+    "📶 バッチ逐次表示（セクション2・3）",
+    key="progressive_mode",
+    help="review_id順のバッチごとにAI関数を実行し、完了したバッチからグラフを更新します"
+)
+if is_progressive_mode():
+    st.sidebar.number_input(
+        "バッチサイズ:", min_value=10, max_value=5000,
+        value=DEFAULT_BATCH_SIZE, step=10, key="batch_size"
+    )
+
+st.sidebar.checkbox(
+    "📦 チャートのデータ量を表示",
+    key="show_chart_payload",
+    help="ブラウザに送るチャートのJSONサイズを表示し、全行を送る場合と比較します"
+)
+
+# 共有結果キャッシュ（ユーザー間で共有する分析結果）の使用状況
+result_cache_stats = get_result_cache_stats()
+st.sidebar.caption(
+    f"🗃️ 共有結果キャッシュ: {result_cache_stats['entries']}件 / "
+    f"{result_cache_stats['bytes'] / 1024 / 1024:.1f} MB（上限 {result_cache_stats['budget_bytes'] / 1024 / 1024:.0f} MB）"
+)
+
+# ローカル分析エンジン（分析結果のArrowスナップショットに対するDuckDB）
+st.sidebar.checkbox(
+    "🦆 絞り込み・集計をローカル分析エンジンで実行",
+    value=is_engine_available(),
+    key="use_local_engine",
+    disabled=not is_engine_available(),
+    help="分析結果のArrowスナップショットに対して組み込みDuckDBで絞り込み・集計・ページ送りを行います"
+         "（duckdb・pyarrowがない場合はpandasで処理）"
+)
+st.sidebar.checkbox(
+    "⏱️ pandasと所要時間を比較",
+    key="compare_engine",
+    help="ローカル分析エンジンで処理した操作をpandasでも実行し、所要時間（中央値）を比較します"
+)
+if st.session_state.get("compare_engine"):
+    engine_stats = get_engine_stats()
+    if engine_stats:
+        st.sidebar.dataframe(
+            pd.DataFrame(engine_stats)[["operation", "duckdb_p50_ms", "pandas_p50_ms", "speedup"]].rename(columns={
+                "operation": "操作", "duckdb_p50_ms": "DuckDB(ms)", "pandas_p50_ms": "pandas(ms)", "speedup": "倍率"
+            }).round(2),
+            hide_index=True
+        )
+
+render_profile_sidebar()
+
 st.markdown("---")
 
 # =========================================================
@@ -156,63 +475,121 @@ with col2:
 # =========================================================
 st.markdown("---")
 
+def build_classify_query(sample_params: dict = None, remaining: bool = False, batch_size: int = None) -> str:
+    """AI_CLASSIFYによるカテゴリ分類クエリを生成（batch_size指定時はバッチ単位）"""
+    return f"""
+    SELECT 
+        r.review_id,
+        r.review_text,
+        r.rating,
+        r.purchase_channel,
+        {category_expr()} as category
+        {sample_columns(sample_params if not remaining else None)}
+    FROM {review_source(sample_params, remaining, batch_size, with_features=True)}
+    {feature_join()}
+    """
+
+def render_category_distribution(df_results: pd.DataFrame, key: str = None):
+    """カテゴリ分布の可視化（keyはバッチ逐次表示でのチャート識別用）"""
+    col1, col2 = st.columns(2)
+    
+    with col1:
+        category_counts = df_results['CATEGORY'].value_counts()
+        fig = px.pie(
+            values=category_counts.values,
+            names=category_counts.index,
+            title="カテゴリ分布"
+        )
+        st.plotly_chart(fig, use_container_width=True, key=f"{key}_pie" if key else None)
+    
+    with col2:
+        fig = px.bar(
+            x=category_counts.index,
+            y=category_counts.values,
+            title="カテゴリ別件数",
+            labels={"x": "カテゴリ", "y": "件数"}
+        )
+        st.plotly_chart(fig, use_container_width=True, key=f"{key}_bar" if key else None)
+
 @st.fragment
+@profiled("顧客の声分析: セクション2", is_profiling_mode)
+@routed(DASHBOARD, "顧客の声分析: セクション2", session)
 def section_2_classify():
     st.subheader("🏷️ セクション2: AI_CLASSIFY - マルチラベル分類")
     
-    if st.button("🏷️ AI_CLASSIFY実行（全件）", type="primary"):
+    sample_params = get_sample_params() if is_quick_mode() else None
+    run_label = sample_run_label(sample_params)
+    
+    if st.button(f"🏷️ AI_CLASSIFY実行（{run_label}）", type="primary"):
         with st.spinner("レビューの自動分類中..."):
             try:
+                # 同じ条件・同じデータの分類結果があれば共有キャッシュから再利用
+                key = results_key("classify", sample_params)
+                df_results = get_result(key)
+                if df_results is not None:
+                    st.caption("♻️ 同じ条件の分類結果を共有キャッシュから再利用しました")
                 # AI_CLASSIFY関数でカテゴリ分類（:labelsでJSON抽出）
-                category_query = """
-                SELECT 
-                    review_id,
-                    review_text,
-                    rating,
-                    purchase_channel,
-                    AI_CLASSIFY(
-                        review_text, 
-                        ARRAY_CONSTRUCT('商品品質', '配送サービス', '価格', 'カスタマーサービス', '店舗環境', 'その他')
-                    ):labels[0]::string as category
-                FROM CUSTOMER_REVIEWS 
-                WHERE review_text IS NOT NULL
-                """
-                
-                results = session.sql(category_query).collect()
-                
-                if results:
-                    st.success(f"✅ {len(results)}件のレビューを分類完了")
-                    
+                elif is_progressive_mode():
+                    batch_size = int(st.session_state.get("batch_size", DEFAULT_BATCH_SIZE))
+                    df_results = collect_progressively(
+                        build_classify_query(sample_params, batch_size=batch_size),
+                        batch_size,
+                        count_review_source(sample_params, with_features=True),
+                        lambda df, n: render_category_distribution(df, key=f"classify_batch_{n}"),
+                        "顧客の声分析: セクション2"
+                    )
+                else:
+                    results = run_query(session, build_classify_query(sample_params), "顧客の声分析: セクション2")
                     df_results = pd.DataFrame([row.as_dict() for row in results])
-                    st.session_state['classify_results'] = df_results
-                    
-                    # カテゴリ分布の可視化
-                    col1, col2 = st.columns(2)
-                    
-                    with col1:
-                        category_counts = df_results['CATEGORY'].value_counts()
-                        fig = px.pie(
-                            values=category_counts.values,
-                            names=category_counts.index,
-                            title="カテゴリ分布"
-                        )
-                        st.plotly_chart(fig, use_container_width=True)
+                
+                if not df_results.empty:
+                    # session_stateにはキーのみを保持
+                    df_results = put_result(key, df_results)
+                    st.session_state['classify_results_key'] = key
                     
-                    with col2:
-                        fig = px.bar(
-                            x=category_counts.index,
-                            y=category_counts.values,
-                            title="カテゴリ別件数",
-                            labels={"x": "カテゴリ", "y": "件数"}
-                        )
-                        st.plotly_chart(fig, use_container_width=True)
+                    if sample_params:
+                        st.session_state['classify_sample'] = sample_params
+                        st.success(f"✅ 層化サンプル{len(df_results)}件のレビューを分類完了")
+                        # 推定構成比（信頼区間付き）の可視化
+                        render_share_estimates(df_results, 'CATEGORY', "カテゴリ分布", ANALYSIS_CATEGORIES)
+                    else:
+                        st.session_state.pop('classify_sample', None)
+                        st.success(f"✅ {len(df_results)}件のレビューを分類完了")
+                        # カテゴリ分布の可視化
+                        render_category_distribution(df_results)
                 
             except Exception as e:
                 st.error(f"❌ 分類エラー: {str(e)}")
     
+    # サンプル結果の全件への昇格（サンプル済みの行は再計算しない）
+    df_classified = load_results("classify")
+    if 'classify_sample' in st.session_state and df_classified is not None:
+        st.info(f"ℹ️ 現在の分類結果は層化サンプル（{len(df_classified)}件）に基づく推定です。")
+        if st.button("⏫ 全件に昇格（サンプル済みの行を再利用）", key="promote_classify"):
+            with st.spinner("残りのレビューを分類中..."):
+                try:
+                    sample_params_done = st.session_state['classify_sample']
+                    df_sample = df_classified.drop(
+                        columns=['STRATUM_KEY', 'STRATUM_SIZE'], errors='ignore'
+                    )
+                    remaining = run_query(
+                        session, build_classify_query(sample_params_done, remaining=True), "顧客の声分析: セクション2",
+                        params=remaining_params(df_sample)
+                    )
+                    df_remaining = pd.DataFrame([row.as_dict() for row in remaining])
+                    df_results = pd.concat([df_sample, df_remaining], ignore_index=True)
+                    key = results_key("classify")
+                    df_results = put_result(key, df_results)
+                    st.session_state['classify_results_key'] = key
+                    st.session_state.pop('classify_sample', None)
+                    st.success(f"✅ 全{len(df_results)}件の分類完了（うち{len(df_sample)}件はサンプル結果を再利用）")
+                    render_category_distribution(df_results)
+                except Exception as e:
+                    st.error(f"❌ 分類エラー: {str(e)}")
+    
     # 分類結果の詳細分析機能
-    if 'classify_results' in st.session_state:
-        df_results = st.session_state['classify_results']
+    df_results = load_results("classify")
+    if df_results is not None:
         
         st.markdown("---")
         st.markdown("#### 📊 カテゴリ別詳細分析")
@@ -224,26 +601,35 @@ def section_2_classify():
             key="category_select"
         )
         
-        # フィルタされたデータ
-        if selected_category == "全カテゴリ":
-            filtered_df = df_results
-        else:
-            filtered_df = df_results[df_results['CATEGORY'] == selected_category]
+        # 絞り込み・集計はローカル分析エンジンで処理（分析結果のスナップショットはキーごとに共有）
+        classify_key = st.session_state.get('classify_results_key')
+        filters = {} if selected_category == "全カテゴリ" else {"CATEGORY": selected_category}
+        df_stats = aggregate(
+            classify_key, df_results,
+            {"REVIEW_COUNT": ("count", None), "AVG_RATING": ("avg", "RATING")},
+            filters=filters, operation="セクション2: 件数・平均評価", **engine_options()
+        )
+        df_channels = aggregate(
+            classify_key, df_results, {"REVIEW_COUNT": ("count", None)},
+            group_by=["PURCHASE_CHANNEL"], filters=filters, order_by="REVIEW_COUNT", descending=True,
+            operation="セクション2: 主要チャネル", **engine_options()
+        )
+        filtered_count = int(df_stats['REVIEW_COUNT'].iloc[0])
         
         col1, col2, col3 = st.columns(3)
         with col1:
-            st.metric("対象レビュー数", f"{len(filtered_df)}件")
+            st.metric("対象レビュー数", f"{filtered_count}件")
         with col2:
-            avg_rating = filtered_df['RATING'].mean()
+            avg_rating = df_stats['AVG_RATING'].iloc[0]
             st.metric("平均評価", f"{avg_rating:.2f}")
         with col3:
-            if len(filtered_df) > 0:
-                top_channel = filtered_df['PURCHASE_CHANNEL'].mode()[0]
+            if filtered_count > 0:
+                top_channel = df_channels['PURCHASE_CHANNEL'].iloc[0]
                 st.metric("主要チャネル", top_channel)
         
         # ページネーション機能
         items_per_page = st.slider("1ページあたりの表示件数:", 5, 50, 10, key="items_per_page")
-        total_pages = max(1, (len(filtered_df) - 1) // items_per_page + 1)
+        total_pages = max(1, (filtered_count - 1) // items_per_page + 1)
         
         if total_pages > 1:
             current_page = st.selectbox(
@@ -255,9 +641,12 @@ def section_2_classify():
             current_page = 1
         
         # 現在のページのデータ表示
-        start_idx = (current_page - 1) * items_per_page
-        end_idx = start_idx + items_per_page
-        page_data = filtered_df.iloc[start_idx:end_idx]
+        df_page, _ = paginate(
+            classify_key, df_results, current_page, items_per_page, filters=filters,
+            operation="セクション2: ページ送り", **engine_options()
+        )
+        # レビュー本文は表示するページ分だけ取得
+        page_data = with_review_text(df_page, session)
         
         for _, row in page_data.iterrows():
             with st.expander(f"🏷️ {row['CATEGORY']} | 評価: {row['RATING']} | {row['PURCHASE_CHANNEL']}"):
@@ -271,7 +660,102 @@ section_2_classify()
 # =========================================================
 st.markdown("---")
 
+def build_filter_query(selected_filter: str, sample_params: dict = None, remaining: bool = False,
+                       batch_size: int = None) -> str:
+    """AI_FILTERによる条件マッチングクエリを生成（batch_size指定時はバッチ単位）"""
+    return f"""
+    SELECT 
+        r.review_id,
+        r.review_text,
+        r.rating,
+        r.purchase_channel,
+        AI_FILTER(CONCAT('{selected_filter}: ', r.review_text)) as filter_result
+        {sample_columns(sample_params if not remaining else None)}
+    FROM {review_source(sample_params, remaining, batch_size)}
+    """
+
+def render_filter_results(df_all: pd.DataFrame):
+    """AI_FILTERの結果（マッチ率・チャネル別件数・詳細）を表示"""
+    df_matched = df_all[df_all['FILTER_RESULT'].fillna(False).astype(bool)]
+    
+    st.success(f"✅ {len(df_matched)}件が条件にマッチしました（全{len(df_all)}件中）")
+    
+    if df_matched.empty:
+        st.info("条件にマッチするレビューが見つかりませんでした。")
+        return
+    
+    # マッチ率の可視化
+    match_rate = len(df_matched) / len(df_all) * 100
+    col1, col2 = st.columns(2)
+    
+    with col1:
+        fig = px.pie(
+            values=[len(df_matched), len(df_all) - len(df_matched)],
+            names=['マッチ', '非マッチ'],
+            title=f"フィルタ結果 (マッチ率: {match_rate:.1f}%)"
+        )
+        st.plotly_chart(fig, use_container_width=True)
+    
+    with col2:
+        # チャネル別マッチ分析
+        channel_counts = df_matched['PURCHASE_CHANNEL'].value_counts()
+        fig = px.bar(
+            x=channel_counts.index,
+            y=channel_counts.values,
+            title="チャネル別マッチ件数",
+            labels={"x": "購入チャネル", "y": "件数"}
+        )
+        st.plotly_chart(fig, use_container_width=True)
+    
+    # マッチしたレビューの詳細表示
+    st.markdown("#### 📝 マッチしたレビュー詳細")
+    for _, data in df_matched.head(20).iterrows():  # 最初の20件のみ表示
+        with st.expander(f"📋 レビューID: {data['REVIEW_ID']} | 評価: {data['RATING']} | {data['PURCHASE_CHANNEL']}"):
+            st.write(f"**レビュー内容**: {data['REVIEW_TEXT']}")
+            st.success(f"**フィルタ結果**: 条件にマッチ")
+    
+    if len(df_matched) > 20:
+        st.info(f"さらに{len(df_matched) - 20}件のマッチした結果があります。")
+
+def render_filter_progress(df_partial: pd.DataFrame, batch_no: int):
+    """バッチ逐次表示中のマッチ件数・チャネル別件数を表示"""
+    df_matched = df_partial[df_partial['FILTER_RESULT'].fillna(False).astype(bool)]
+    col1, col2 = st.columns(2)
+    with col1:
+        st.metric("マッチ件数（途中経過）", f"{len(df_matched)}件",
+                  help=f"処理済み{len(df_partial)}件中")
+        st.metric("マッチ率（途中経過）", f"{len(df_matched) / len(df_partial) * 100:.1f}%")
+    with col2:
+        channel_counts = df_matched['PURCHASE_CHANNEL'].value_counts()
+        fig = px.bar(
+            x=channel_counts.index,
+            y=channel_counts.values,
+            title="チャネル別マッチ件数（途中経過）",
+            labels={"x": "購入チャネル", "y": "件数"}
+        )
+        st.plotly_chart(fig, use_container_width=True, key=f"filter_batch_{batch_no}")
+
+def render_filter_estimate(df_sample: pd.DataFrame):
+    """層化サンプルからの推定マッチ率を信頼区間付きで表示"""
+    est = estimate_match_rate(df_sample, 'FILTER_RESULT')
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.metric("推定マッチ率", f"{est['rate'] * 100:.1f}%",
+                  help=f"95%信頼区間: {est['ci_low'] * 100:.1f}% 〜 {est['ci_high'] * 100:.1f}%")
+    with col2:
+        st.metric("推定マッチ件数", f"{est['estimated_matches']:,}件",
+                  help=f"サンプル{est['sample_size']:,}件から全{est['population']:,}件への外挿")
+    with col3:
+        st.metric("95%信頼区間", f"{est['ci_low'] * 100:.1f}〜{est['ci_high'] * 100:.1f}%")
+    
+    # チャネル別のマッチ構成比（非マッチも1つの区分として推定）
+    matched = df_sample['FILTER_RESULT'].fillna(False).astype(bool)
+    df_channel = df_sample.assign(MATCH_CHANNEL=df_sample['PURCHASE_CHANNEL'].where(matched, '（非マッチ）'))
+    render_share_estimates(df_channel, 'MATCH_CHANNEL', "チャネル別マッチ")
+
 @st.fragment
+@profiled("顧客の声分析: セクション3", is_profiling_mode)
+@routed(DASHBOARD, "顧客の声分析: セクション3", session)
 def section_3_filter():
     st.subheader("🔍 セクション3: AI_FILTER - スマートフィルタリング")
     
@@ -298,72 +782,63 @@ def section_3_filter():
             help="レビューから抽出したい条件を自然言語で入力してください"
         )
     
-    if st.button("🔍 AI_FILTER実行（全件）", type="primary"):
+    sample_params = get_sample_params() if is_quick_mode() else None
+    run_label = sample_run_label(sample_params)
+    
+    if st.button(f"🔍 AI_FILTER実行（{run_label}）", type="primary"):
         if not selected_filter or selected_filter.strip() == "":
             st.error("フィルタ条件を入力してください。")
         else:
             with st.spinner("スマートフィルタリング実行中..."):
                 try:
-                    # AI_FILTER関数で条件マッチング（全件対象）
-                    filter_query = f"""
-                    SELECT 
-                        review_id,
-                        review_text,
-                        rating,
-                        purchase_channel,
-                        AI_FILTER(CONCAT('{selected_filter}: ', review_text)) as filter_result
-                    FROM CUSTOMER_REVIEWS 
-                    WHERE review_text IS NOT NULL
-                    """
-                    
-                    results = session.sql(filter_query).collect()
+                    # AI_FILTER関数で条件マッチング
+                    if is_progressive_mode():
+                        batch_size = int(st.session_state.get("batch_size", DEFAULT_BATCH_SIZE))
+                        df_all = collect_progressively(
+                            build_filter_query(selected_filter, sample_params, batch_size=batch_size),
+                            batch_size,
+                            count_review_source(sample_params),
+                            render_filter_progress,
+                            "顧客の声分析: セクション3"
+                        )
+                    else:
+                        results = run_query(session, build_filter_query(selected_filter, sample_params), "顧客の声分析: セクション3")
+                        df_all = pd.DataFrame([r.as_dict() for r in results])
                     
-                    if results:
-                        matched_results = [r for r in results if r['FILTER_RESULT']]
-                        
-                        st.success(f"✅ {len(matched_results)}件が条件にマッチしました（全{len(results)}件中）")
-                        
-                        if matched_results:
-                            # マッチ率の可視化
-                            match_rate = len(matched_results) / len(results) * 100
-                            col1, col2 = st.columns(2)
-                            
-                            with col1:
-                                fig = px.pie(
-                                    values=[len(matched_results), len(results) - len(matched_results)],
-                                    names=['マッチ', '非マッチ'],
-                                    title=f"フィルタ結果 (マッチ率: {match_rate:.1f}%)"
-                                )
-                                st.plotly_chart(fig, use_container_width=True)
-                            
-                            with col2:
-                                # チャネル別マッチ分析
-                                df_matched = pd.DataFrame([r.as_dict() for r in matched_results])
-                                channel_counts = df_matched['PURCHASE_CHANNEL'].value_counts()
-                                fig = px.bar(
-                                    x=channel_counts.index,
-                                    y=channel_counts.values,
-                                    title="チャネル別マッチ件数",
-                                    labels={"x": "購入チャネル", "y": "件数"}
-                                )
-                                st.plotly_chart(fig, use_container_width=True)
-                            
-                            # マッチしたレビューの詳細表示
-                            st.markdown("#### 📝 マッチしたレビュー詳細")
-                            for result in matched_results[:20]:  # 最初の20件のみ表示
-                                data = result.as_dict()
-                                
-                                with st.expander(f"📋 レビューID: {data['REVIEW_ID']} | 評価: {data['RATING']} | {data['PURCHASE_CHANNEL']}"):
-                                    st.write(f"**レビュー内容**: {data['REVIEW_TEXT']}")
-                                    st.success(f"**フィルタ結果**: 条件にマッチ")
-                            
-                            if len(matched_results) > 20:
-                                st.info(f"さらに{len(matched_results) - 20}件のマッチした結果があります。")
+                    if not df_all.empty:
+                        if sample_params:
+                            # 昇格用にサンプル結果を保持
+                            st.session_state['filter_sample'] = {
+                                "filter": selected_filter,
+                                "params": sample_params,
+                                "df": df_all
+                            }
+                            render_filter_estimate(df_all)
                         else:
-                            st.info("条件にマッチするレビューが見つかりませんでした。")
+                            st.session_state.pop('filter_sample', None)
+                        render_filter_results(df_all)
                     
                 except Exception as e:
                     st.error(f"❌ フィルタエラー: {str(e)}")
+    
+    # サンプル結果の全件への昇格（同じフィルタ条件の場合のみ）
+    filter_sample = st.session_state.get('filter_sample')
+    if filter_sample and filter_sample["filter"] == selected_filter:
+        if st.button("⏫ 全件に昇格（サンプル済みの行を再利用）", key="promote_filter"):
+            with st.spinner("残りのレビューをフィルタリング中..."):
+                try:
+                    df_sample = filter_sample["df"].drop(columns=['STRATUM_KEY', 'STRATUM_SIZE'], errors='ignore')
+                    remaining = run_query(
+                        session, build_filter_query(selected_filter, filter_sample["params"], remaining=True), "顧客の声分析: セクション3",
+                        params=remaining_params(df_sample)
+                    )
+                    df_remaining = pd.DataFrame([r.as_dict() for r in remaining])
+                    df_all = pd.concat([df_sample, df_remaining], ignore_index=True)
+                    st.session_state.pop('filter_sample', None)
+                    st.caption(f"うち{len(df_sample)}件はサンプル結果を再利用")
+                    render_filter_results(df_all)
+                except Exception as e:
+                    st.error(f"❌ フィルタエラー: {str(e)}")
 
 section_3_filter()
 
@@ -373,6 +848,8 @@ section_3_filter()
 st.markdown("---")
 
 @st.fragment
+@profiled("顧客の声分析: セクション4", is_profiling_mode)
+@routed(DASHBOARD, "顧客の声分析: セクション4", session)
 def section_4_agg():
     st.subheader("📊 セクション4: AI_AGG - 購入チャネル別集約分析")
     
@@ -399,9 +876,46 @@ def section_4_agg():
             help="各購入チャネルのレビューから分析したい観点を自然言語で入力してください"
         )
     
+    hierarchical_agg = st.checkbox(
+        "🧩 月別の部分集約を再利用する（階層集約）",
+        value=True,
+        key="agg_hierarchical",
+        help="チャネル×月ごとのAI_AGG結果を保存して統合します。新しいレビューがあった月だけを再計算します"
+    )
+    
     if st.button("📊 AI_AGG実行", type="primary"):
         if not selected_agg_prompt or selected_agg_prompt.strip() == "":
             st.error("分析観点を入力してください。")
+        elif hierarchical_agg:
+            with st.spinner("購入チャネル別集約分析実行中（階層集約）..."):
+                try:
+                    with route(session, AI_BATCH, "顧客の声分析: セクション4") as ai_session:
+                        agg_result = hierarchical_aggregate(
+                            AI_AGG_KIND, "CUSTOMER_REVIEWS r", ["r.purchase_channel"],
+                            prompt=selected_agg_prompt, session=ai_session
+                        )
+                    st.success(
+                        f"✅ {len(agg_result['groups'])}つの購入チャネルの分析完了"
+                        f"（部分集約 {agg_result['partials_total']}件中 {agg_result['partials_computed']}件を計算"
+                        f"{'・統合結果を再利用' if agg_result['reduce_cached'] else ''}）"
+                    )
+                    
+                    for group in agg_result['groups']:
+                        with st.expander(f"📈 {group['group'][0]} チャネル"):
+                            col1, col2 = st.columns(2)
+                            
+                            with col1:
+                                st.metric("レビュー数", f"{group['review_count']}件")
+                                if group['avg_rating'] is not None:
+                                    st.metric("平均評価", f"{group['avg_rating']:.2f}")
+                                st.caption(f"月別の部分集約: {group['partials']}件")
+                            
+                            with col2:
+                                st.markdown("**AI集約分析結果:**")
+                                st.write(group['result'])
+                    
+                except Exception as e:
+                    st.error(f"❌ AI_AGG分析エラー: {str(e)}")
         else:
             with st.spinner("購入チャネル別集約分析実行中..."):
                 try:
@@ -424,7 +938,7 @@ def section_4_agg():
                     GROUP BY purchase_channel
                     """
                     
-                    results = session.sql(agg_query).collect()
+                    results = run_query(session, agg_query, "顧客の声分析: セクション4")
                     
                     if results:
                         st.success(f"✅ {len(results)}つの購入チャネルの分析完了")
@@ -454,6 +968,8 @@ section_4_agg()
 st.markdown("---")
 
 @st.fragment
+@profiled("顧客の声分析: セクション5", is_profiling_mode)
+@routed(DASHBOARD, "顧客の声分析: セクション5", session)
 def section_5_similarity():
     st.subheader("🔗 セクション5: AI_SIMILARITY - 類似レビュー検出")
     
@@ -466,23 +982,47 @@ def section_5_similarity():
     
     similarity_threshold = st.slider("類似度閾値:", 0.0, 1.0, 0.7, step=0.1)
     
+    # 埋め込みストアがあれば保存済みの埋め込み（クエリと同じモデル）でも計算できる
+    embedding_model = None
+    if EMBEDDING_STORE_MODELS:
+        method = st.radio(
+            "類似度の計算方法:",
+            ["AI_SIMILARITY（全件）", "保存済み埋め込み（チャンク単位）"],
+            horizontal=True,
+            key="similarity_method"
+        )
+        if method != "AI_SIMILARITY（全件）":
+            selected = st.session_state.get("selected_embedding_model")
+            embedding_model = st.selectbox(
+                "埋め込みモデル:",
+                EMBEDDING_STORE_MODELS,
+                index=EMBEDDING_STORE_MODELS.index(selected) if selected in EMBEDDING_STORE_MODELS else 0,
+                key="similarity_embedding_model",
+                help="基準テキストも同じモデルで埋め込んで比較します"
+            )
+    
     if st.button("🔗 AI_SIMILARITY実行（全件）", type="primary"):
         with st.spinner("類似レビューを検索中..."):
             try:
-                # AI_SIMILARITY関数で類似度計算（全件対象）
-                similarity_query = f"""
-                SELECT 
-                    review_id,
-                    review_text,
-                    rating,
-                    purchase_channel,
-                    AI_SIMILARITY('{base_text}', review_text) as similarity_score
-                FROM CUSTOMER_REVIEWS 
-                WHERE review_text IS NOT NULL
-                ORDER BY similarity_score DESC
-                """
-                
-                results = session.sql(similarity_query).collect()
+                if embedding_model:
+                    # 保存済み埋め込みとのコサイン類似度（同一モデルのみ）
+                    with route(session, AI_BATCH, "顧客の声分析: セクション5") as ai_session:
+                        results = find_similar_chunks(base_text, embedding_model, ai_session, limit=1000)
+                else:
+                    # AI_SIMILARITY関数で類似度計算（全件対象）
+                    similarity_query = f"""
+                    SELECT 
+                        review_id,
+                        review_text,
+                        rating,
+                        purchase_channel,
+                        AI_SIMILARITY('{base_text}', review_text) as similarity_score
+                    FROM CUSTOMER_REVIEWS 
+                    WHERE review_text IS NOT NULL
+                    ORDER BY similarity_score DESC
+                    """
+                    
+                    results = run_query(session, similarity_query, "顧客の声分析: セクション5")
                 
                 if results:
                     # 閾値以上の類似度のレビューをフィルタ
@@ -497,17 +1037,22 @@ def section_5_similarity():
                         col1, col2 = st.columns(2)
                         
                         with col1:
-                            # 類似度ヒストグラム
-                            fig = px.histogram(
+                            # 類似度ヒストグラム（件数が多い場合は集計済みのビンを送る）
+                            similarity_labels = {"SIMILARITY_SCORE": "類似度スコア", "y": "件数"}
+                            fig = histogram(
                                 df_similarity,
-                                x='SIMILARITY_SCORE',
+                                'SIMILARITY_SCORE',
                                 nbins=20,
                                 title="類似度分布",
-                                labels={"x": "類似度スコア", "y": "件数"}
+                                labels=similarity_labels
                             )
                             fig.add_vline(x=similarity_threshold, line_dash="dash", line_color="red", 
                                         annotation_text=f"閾値: {similarity_threshold}")
                             st.plotly_chart(fig, use_container_width=True)
+                            if st.session_state.get("show_chart_payload"):
+                                render_payload_caption(fig, lambda: px.histogram(
+                                    df_similarity, x='SIMILARITY_SCORE', nbins=20, labels=similarity_labels
+                                ), len(df_similarity))
                         
                         with col2:
                             # 閾値以上のレビューのチャネル分布
@@ -554,82 +1099,201 @@ section_5_similarity()
 # =========================================================
 st.markdown("---")
 
+def build_integrated_base_query(sample_params: dict = None, remaining: bool = False) -> str:
+    """統合分析の基本データ（感情スコア・カテゴリ）クエリを生成"""
+    return f"""
+    SELECT 
+        r.review_id,
+        r.review_text,
+        r.rating,
+        r.purchase_channel,
+        {sentiment_expr()} as sentiment_score,
+        {category_expr()} as category
+        {sample_columns(sample_params if not remaining else None)}
+    FROM {review_source(sample_params, remaining)}
+    {feature_join()}
+    """
+
+def build_integrated_summary_query(sample_params: dict = None) -> str:
+    """AI_SUMMARIZE_AGGによるカテゴリ・チャネル別要約クエリを生成"""
+    if USE_SUMMARY_FEATURES:
+        # 事前計算済みの要約（全件対象）を参照
+        return f"SELECT category, purchase_channel, category_summary FROM {SUMMARY_FEATURE_TABLE}"
+    return f"""
+    SELECT 
+        category,
+        purchase_channel,
+        SNOWFLAKE.CORTEX.TRANSLATE(
+            AI_SUMMARIZE_AGG(review_text),
+            '',
+            'ja'
+        ) as category_summary
+    FROM (
+        SELECT 
+            r.review_text,
+            r.purchase_channel,
+            {category_expr()} as category
+        FROM {review_source(sample_params)}
+        {feature_join()}
+    )
+    GROUP BY category, purchase_channel
+    """
+
+def store_integrated_results(key: tuple, df_base: pd.DataFrame, df_summary: pd.DataFrame) -> pd.DataFrame:
+    """
+    基本データとサマリーデータを共有結果キャッシュに保存し、session_stateにはキーのみを保持
+
+    要約はカテゴリ・チャネル単位で別に保持する（レビュー行には結合しない）
+    """
+    df_results = put_result(key, df_base)
+    put_result(key + ("summary",), df_summary)
+    st.session_state['integrated_results_key'] = key
+    st.session_state['integrated_summary_results_key'] = key + ("summary",)
+    return df_results
+
+def summarize_hierarchically(df_base: pd.DataFrame) -> pd.DataFrame:
+    """
+    カテゴリ×チャネル別要約を月別の部分集約（AI_SUMMARIZE_AGG）から統合する（全件実行時）
+
+    部分集約は保存されるため、前回から変化した月の分だけAI_SUMMARIZE_AGGを実行する
+    """
+    if USE_FEATURES:
+        source = f"CUSTOMER_REVIEWS r JOIN {FEATURE_TABLE} f ON r.review_id = f.review_id"
+        group_columns = ["f.category", "r.purchase_channel"]
+    else:
+        # 算出済みのカテゴリを一時テーブルに書き込み、要約時のAI_CLASSIFY再実行を省略
+        session.write_pandas(
+            df_base[['REVIEW_ID', 'CATEGORY']].astype(str),
+            "INTEGRATED_CATEGORY_TMP",
+            auto_create_table=True,
+            table_type="temporary",
+            overwrite=True
+        )
+        source = "CUSTOMER_REVIEWS r JOIN INTEGRATED_CATEGORY_TMP c ON r.review_id = c.review_id"
+        group_columns = ["c.category", "r.purchase_channel"]
+    
+    with route(session, AI_BATCH, "顧客の声分析: セクション6") as ai_session:
+        agg_result = hierarchical_aggregate(SUMMARIZE_KIND, source, group_columns, session=ai_session)
+    st.caption(
+        f"🧩 月別の部分集約 {agg_result['partials_total']}件中 {agg_result['partials_computed']}件を計算"
+        f"{'・統合結果を再利用' if agg_result['reduce_cached'] else ''}"
+    )
+    return pd.DataFrame([
+        {"CATEGORY": group['group'][0], "PURCHASE_CHANNEL": group['group'][1], "CATEGORY_SUMMARY": group['result']}
+        for group in agg_result['groups']
+    ])
+
 @st.fragment
+@profiled("顧客の声分析: セクション6", is_profiling_mode)
+@routed(DASHBOARD, "顧客の声分析: セクション6", session)
 def section_6_integrated():
     st.subheader("🚀 セクション6: 統合分析レポート")
     
-    if st.button("🚀 統合分析実行（全件）", type="primary"):
+    sample_params = get_sample_params() if is_quick_mode() else None
+    run_label = sample_run_label(sample_params)
+    
+    # 全件の要約は月別の部分集約から統合できる（事前計算済みの要約がある場合はそちらを参照）
+    hierarchical_summary = False
+    if not USE_SUMMARY_FEATURES:
+        hierarchical_summary = st.checkbox(
+            "🧩 要約に月別の部分集約を再利用する（階層集約・全件実行時）",
+            value=True,
+            key="summary_hierarchical",
+            help="カテゴリ×チャネル×月ごとのAI_SUMMARIZE_AGG結果を保存して統合します"
+        )
+    
+    if st.button(f"🚀 統合分析実行（{run_label}）", type="primary"):
         with st.spinner("統合分析実行中..."):
             try:
-                # 複数のAISQLを組み合わせた統合分析（全件対象）
-                # まず基本データを取得
-                base_query = """
-                SELECT 
-                    review_id,
-                    review_text,
-                    rating,
-                    purchase_channel,
-                    SNOWFLAKE.CORTEX.SENTIMENT(review_text) as sentiment_score,
-                    AI_CLASSIFY(
-                        review_text, 
-                        ARRAY_CONSTRUCT('商品品質', '配送サービス', '価格', 'カスタマーサービス', '店舗環境', 'その他')
-                    ):labels[0]::string as category
-                FROM CUSTOMER_REVIEWS 
-                WHERE review_text IS NOT NULL
-                """
-                
-                # AI_SUMMARIZE_AGGを使用してカテゴリ別要約を取得
-                summary_query = """
-                SELECT 
-                    category,
-                    purchase_channel,
-                    SNOWFLAKE.CORTEX.TRANSLATE(
-                        AI_SUMMARIZE_AGG(review_text),
-                        '',
-                        'ja'
-                    ) as category_summary
-                FROM (
-                    SELECT 
-                        review_text,
-                        purchase_channel,
-                        AI_CLASSIFY(
-                            review_text, 
-                            ARRAY_CONSTRUCT('商品品質', '配送サービス', '価格', 'カスタマーサービス', '店舗環境', 'その他')
-                        ):labels[0]::string as category
-                    FROM CUSTOMER_REVIEWS 
-                    WHERE review_text IS NOT NULL
-                )
-                GROUP BY category, purchase_channel
-                """
-                
-                # 基本データを取得
-                base_results = session.sql(base_query).collect()
-                # カテゴリ別要約を取得
-                summary_results = session.sql(summary_query).collect()
-                
-                if base_results and summary_results:
+                # 同じ条件・同じデータの統合分析結果があれば共有キャッシュから再利用
+                key = results_key("integrated", sample_params)
+                df_base = get_result(key)
+                df_summary = get_result(key + ("summary",))
+                if df_base is not None and df_summary is not None:
+                    st.caption("♻️ 同じ条件の統合分析結果を共有キャッシュから再利用しました")
+                else:
+                    # 複数のAISQLを組み合わせた統合分析
+                    # 基本データを取得
+                    base_results = run_query(session, build_integrated_base_query(sample_params), "顧客の声分析: セクション6")
                     df_base = pd.DataFrame([row.as_dict() for row in base_results])
-                    df_summary = pd.DataFrame([row.as_dict() for row in summary_results])
-                    
-                    # 基本データとサマリーデータを結合
-                    df_results = df_base.merge(
-                        df_summary, 
-                        on=['CATEGORY', 'PURCHASE_CHANNEL'], 
-                        how='left'
-                    )
-                    
-                    # 統合分析結果をsession_stateに保存
-                    st.session_state['integrated_results'] = df_results
-                    st.session_state['category_summaries'] = df_summary
+                    # AI_SUMMARIZE_AGGを使用してカテゴリ別要約を取得
+                    if hierarchical_summary and not sample_params and not df_base.empty:
+                        df_summary = summarize_hierarchically(df_base)
+                    else:
+                        summary_results = run_query(session, build_integrated_summary_query(sample_params), "顧客の声分析: セクション6")
+                        df_summary = pd.DataFrame([row.as_dict() for row in summary_results])
+                
+                if not df_base.empty and not df_summary.empty:
+                    # 統合分析結果を共有キャッシュに保存
+                    store_integrated_results(key, df_base, df_summary)
+                    if sample_params:
+                        st.session_state['integrated_sample'] = sample_params
+                    else:
+                        st.session_state.pop('integrated_sample', None)
                     
-                    st.success(f"✅ 統合分析完了（{len(base_results)}件のレビュー、{len(summary_results)}のカテゴリ別要約）")
+                    st.success(f"✅ 統合分析完了（{len(df_base)}件のレビュー、{len(df_summary)}のカテゴリ別要約）")
                 
             except Exception as e:
                 st.error(f"❌ 統合分析エラー: {str(e)}")
     
+    # サンプル結果の全件への昇格
+    if 'integrated_sample' in st.session_state and load_results("integrated") is not None:
+        if st.button("⏫ 全件に昇格（サンプル済みの行を再利用）", key="promote_integrated"):
+            with st.spinner("残りのレビューを分析中..."):
+                try:
+                    sample_params_done = st.session_state['integrated_sample']
+                    df_sample = load_results("integrated").drop(
+                        columns=['STRATUM_KEY', 'STRATUM_SIZE', 'CATEGORY_SUMMARY', 'sentiment_label'],
+                        errors='ignore'
+                    )
+                    remaining = run_query(
+                        session, build_integrated_base_query(sample_params_done, remaining=True), "顧客の声分析: セクション6",
+                        params=remaining_params(df_sample)
+                    )
+                    df_remaining = pd.DataFrame([row.as_dict() for row in remaining])
+                    df_base = pd.concat([df_sample, df_remaining], ignore_index=True)
+                    
+                    if USE_SUMMARY_FEATURES:
+                        # 事前計算済みの要約を参照
+                        summary_results = run_query(session, build_integrated_summary_query(), "顧客の声分析: セクション6")
+                    elif hierarchical_summary:
+                        summary_results = None
+                        df_summary = summarize_hierarchically(df_base)
+                    else:
+                        # 算出済みのカテゴリを一時テーブルに書き込み、要約時のAI_CLASSIFY再実行を省略
+                        session.write_pandas(
+                            df_base[['REVIEW_ID', 'CATEGORY']].astype(str),
+                            "INTEGRATED_CATEGORY_TMP",
+                            auto_create_table=True,
+                            table_type="temporary",
+                            overwrite=True
+                        )
+                        summary_results = run_query(session, """
+                            SELECT 
+                                c.category,
+                                r.purchase_channel,
+                                SNOWFLAKE.CORTEX.TRANSLATE(
+                                    AI_SUMMARIZE_AGG(r.review_text),
+                                    '',
+                                    'ja'
+                                ) as category_summary
+                            FROM CUSTOMER_REVIEWS r
+                            JOIN INTEGRATED_CATEGORY_TMP c ON r.review_id = c.review_id
+                            GROUP BY c.category, r.purchase_channel
+                        """, "顧客の声分析: セクション6")
+                    if summary_results is not None:
+                        df_summary = pd.DataFrame([row.as_dict() for row in summary_results])
+                    
+                    store_integrated_results(results_key("integrated"), df_base, df_summary)
+                    st.session_state.pop('integrated_sample', None)
+                    st.success(f"✅ 全{len(df_base)}件の統合分析完了（うち{len(df_sample)}件はサンプル結果を再利用）")
+                except Exception as e:
+                    st.error(f"❌ 統合分析エラー: {str(e)}")
+    
     # 統合分析結果の表示
-    if 'integrated_results' in st.session_state:
-        df_results = st.session_state['integrated_results']
+    df_results = load_results("integrated")
+    integrated_key = st.session_state.get('integrated_results_key')
+    if df_results is not None:
         
         # 感情スコアの定義説明
         st.info("""
@@ -639,6 +1303,18 @@ def section_6_integrated():
         - **ネガティブ**: -0.1未満 😞
         """)
         
+        # クイックモードの場合は全体への推定値を信頼区間付きで表示
+        if 'integrated_sample' in st.session_state:
+            st.markdown("#### 🎯 層化サンプルからの推定（95%信頼区間）")
+            df_band = df_results.assign(SENTIMENT_BAND=df_results['SENTIMENT_SCORE'].apply(
+                lambda x: 'ポジティブ' if x > 0.1 else ('ネガティブ' if x < -0.1 else 'ニュートラル')
+            ))
+            col1, col2 = st.columns(2)
+            with col1:
+                render_share_estimates(df_band, 'SENTIMENT_BAND', "感情分布")
+            with col2:
+                render_share_estimates(df_results, 'CATEGORY', "カテゴリ分布", ANALYSIS_CATEGORIES)
+        
         # 全体統計の可視化
         col1, col2, col3, col4 = st.columns(4)
         
@@ -665,10 +1341,12 @@ def section_6_integrated():
         
         with col1:
             # 感情分布
-            df_results['sentiment_label'] = df_results['SENTIMENT_SCORE'].apply(
-                lambda x: 'ポジティブ' if x > 0.1 else ('ネガティブ' if x < -0.1 else 'ニュートラル')
-            )
-            sentiment_counts = df_results['sentiment_label'].value_counts()
+            # 共有キャッシュの結果は変更せずにラベルを算出（行ごとの関数呼び出しは行わない）
+            sentiment_counts = pd.Series(np.select(
+                [df_results['SENTIMENT_SCORE'] > 0.1, df_results['SENTIMENT_SCORE'] < -0.1],
+                ['ポジティブ', 'ネガティブ'],
+                default='ニュートラル'
+            )).value_counts()
             fig = px.pie(
                 values=sentiment_counts.values,
                 names=sentiment_counts.index,
@@ -683,7 +1361,10 @@ def section_6_integrated():
         
         with col2:
             # カテゴリ別感情スコア
-            category_sentiment = df_results.groupby('CATEGORY')['SENTIMENT_SCORE'].mean().reset_index()
+            category_sentiment = aggregate(
+                integrated_key, df_results, {"SENTIMENT_SCORE": ("avg", "SENTIMENT_SCORE")},
+                group_by=["CATEGORY"], operation="セクション6: カテゴリ別感情", **engine_options()
+            )
             fig = px.bar(
                 category_sentiment,
                 x='CATEGORY',
@@ -699,12 +1380,23 @@ def section_6_integrated():
         # チャネル別分析
         col1, col2 = st.columns(2)
         
+        # チャネル別の件数・平均評価・平均感情スコア
+        channel_analysis = aggregate(
+            integrated_key, df_results,
+            {
+                "RATING": ("avg", "RATING"),
+                "SENTIMENT_SCORE": ("avg", "SENTIMENT_SCORE"),
+                "REVIEW_COUNT": ("count", None),
+            },
+            group_by=["PURCHASE_CHANNEL"], order_by="REVIEW_COUNT", descending=True,
+            operation="セクション6: チャネル別集計", **engine_options()
+        )
+        
         with col1:
             # チャネル別件数
-            channel_counts = df_results['PURCHASE_CHANNEL'].value_counts()
             fig = px.bar(
-                x=channel_counts.index,
-                y=channel_counts.values,
+                x=channel_analysis['PURCHASE_CHANNEL'],
+                y=channel_analysis['REVIEW_COUNT'],
                 title="購入チャネル別レビュー件数",
                 labels={"x": "購入チャネル", "y": "件数"}
             )
@@ -712,16 +1404,11 @@ def section_6_integrated():
         
         with col2:
             # チャネル別平均評価と感情スコア
-            channel_analysis = df_results.groupby('PURCHASE_CHANNEL').agg({
-                'RATING': 'mean',
-                'SENTIMENT_SCORE': 'mean'
-            }).reset_index()
-            
-            fig = px.scatter(
+            fig = scatter(
                 channel_analysis,
                 x='RATING',
                 y='SENTIMENT_SCORE',
-                size=[len(df_results[df_results['PURCHASE_CHANNEL'] == ch]) for ch in channel_analysis['PURCHASE_CHANNEL']],
+                size='REVIEW_COUNT',
                 hover_name='PURCHASE_CHANNEL',
                 title="チャネル別：評価 vs 感情スコア",
                 labels={"RATING": "平均評価", "SENTIMENT_SCORE": "平均感情スコア"}
@@ -747,7 +1434,7 @@ def section_6_integrated():
             
             with col1:
                 st.markdown("**😊 最もポジティブなレビュー**")
-                most_positive = df_results.loc[df_results['SENTIMENT_SCORE'].idxmax()]
+                most_positive = with_review_text(df_results.loc[[df_results['SENTIMENT_SCORE'].idxmax()]], session).iloc[0]
                 st.write(f"感情スコア: {most_positive['SENTIMENT_SCORE']:.3f}")
                 st.write(f"カテゴリ: {most_positive['CATEGORY']}")
                 st.write(f"レビュー: {most_positive['REVIEW_TEXT'][:100]}...")
@@ -756,7 +1443,7 @@ def section_6_integrated():
                 st.markdown("**😐 最もニュートラルなレビュー**")
                 df_neutral = df_results[abs(df_results['SENTIMENT_SCORE']) < 0.1]
                 if not df_neutral.empty:
-                    most_neutral = df_neutral.loc[df_neutral['SENTIMENT_SCORE'].abs().idxmin()]
+                    most_neutral = with_review_text(df_neutral.loc[[df_neutral['SENTIMENT_SCORE'].abs().idxmin()]], session).iloc[0]
                     st.write(f"感情スコア: {most_neutral['SENTIMENT_SCORE']:.3f}")
                     st.write(f"カテゴリ: {most_neutral['CATEGORY']}")
                     st.write(f"レビュー: {most_neutral['REVIEW_TEXT'][:100]}...")
@@ -765,28 +1452,36 @@ def section_6_integrated():
             
             with col3:
                 st.markdown("**😞 最もネガティブなレビュー**")
-                most_negative = df_results.loc[df_results['SENTIMENT_SCORE'].idxmin()]
+                most_negative = with_review_text(df_results.loc[[df_results['SENTIMENT_SCORE'].idxmin()]], session).iloc[0]
                 st.write(f"感情スコア: {most_negative['SENTIMENT_SCORE']:.3f}")
                 st.write(f"カテゴリ: {most_negative['CATEGORY']}")
                 st.write(f"レビュー: {most_negative['REVIEW_TEXT'][:100]}...")
         
         else:
             # 特定カテゴリの詳細分析
-            category_data = df_results[df_results['CATEGORY'] == analysis_category]
+            category_filters = {"CATEGORY": analysis_category}
+            category_stats = aggregate(
+                integrated_key, df_results,
+                {
+                    "REVIEW_COUNT": ("count", None),
+                    "AVG_RATING": ("avg", "RATING"),
+                    "AVG_SENTIMENT": ("avg", "SENTIMENT_SCORE"),
+                },
+                filters=category_filters, operation="セクション6: カテゴリ詳細", **engine_options()
+            ).iloc[0]
+            category_count = int(category_stats['REVIEW_COUNT'])
             
             col1, col2, col3 = st.columns(3)
             with col1:
-                st.metric("レビュー数", f"{len(category_data)}件")
+                st.metric("レビュー数", f"{category_count}件")
             with col2:
-                avg_rating = category_data['RATING'].mean()
-                st.metric("平均評価", f"{avg_rating:.2f}")
+                st.metric("平均評価", f"{category_stats['AVG_RATING']:.2f}")
             with col3:
-                avg_sentiment = category_data['SENTIMENT_SCORE'].mean()
-                st.metric("平均感情スコア", f"{avg_sentiment:.3f}")
+                st.metric("平均感情スコア", f"{category_stats['AVG_SENTIMENT']:.3f}")
             
             # ページネーション機能（セクション2と同様の実装）
             items_per_page_6 = st.slider("1ページあたりの表示件数:", 5, 50, 10, key="items_per_page_6")
-            total_pages_6 = max(1, (len(category_data) - 1) // items_per_page_6 + 1)
+            total_pages_6 = max(1, (category_count - 1) // items_per_page_6 + 1)
             
             if total_pages_6 > 1:
                 current_page_6 = st.selectbox(
@@ -798,14 +1493,16 @@ def section_6_integrated():
                 current_page_6 = 1
             
             # 現在のページのデータ表示
-            start_idx_6 = (current_page_6 - 1) * items_per_page_6
-            end_idx_6 = start_idx_6 + items_per_page_6
-            page_data_6 = category_data.iloc[start_idx_6:end_idx_6]
+            df_page_6, _ = paginate(
+                integrated_key, df_results, current_page_6, items_per_page_6, filters=category_filters,
+                operation="セクション6: ページ送り", **engine_options()
+            )
+            page_data_6 = with_review_text(df_page_6, session)
             
             # カテゴリ別AI要約の表示
             st.markdown(f"##### 🤖 {analysis_category} カテゴリのAI_SUMMARIZE_AGG要約")
-            if 'category_summaries' in st.session_state:
-                df_summaries = st.session_state['category_summaries']
+            df_summaries = load_results("integrated_summary")
+            if df_summaries is not None:
                 category_summaries = df_summaries[df_summaries['CATEGORY'] == analysis_category]
                 
                 for _, summary_row in category_summaries.iterrows():
@@ -831,8 +1528,7 @@ def section_6_integrated():
                     st.write(f"**レビュー内容**: {row['REVIEW_TEXT']}")
                     
                     # 該当するカテゴリ・チャネルの集約要約を表示
-                    if 'category_summaries' in st.session_state:
-                        df_summaries = st.session_state['category_summaries']
+                    if df_summaries is not None:
                         matching_summary = df_summaries[
                             (df_summaries['CATEGORY'] == row['CATEGORY']) & 
                             (df_summaries['PURCHASE_CHANNEL'] == row['PURCHASE_CHANNEL'])
@@ -842,14 +1538,163 @@ def section_6_integrated():
 
 section_6_integrated()
 
+# キューブの集計軸と表示名
+CUBE_DIMENSION_LABELS = {
+    "category": "カテゴリ",
+    "purchase_channel": "購入チャネル",
+    "rating_bucket": "評価",
+    "sentiment_band": "感情帯",
+    "review_month": "月",
+    "product_id": "商品ID",
+}
+
+@st.fragment
+@profiled("顧客の声分析: キューブ集計", is_profiling_mode)
+@routed(DASHBOARD, "顧客の声分析: キューブ集計", session)
+def section_6_cube():
+    """事前集計キューブからの絞り込み・集計（明細を走査しない）"""
+    with st.expander("🧊 レビューキューブで絞り込み・集計（全件・即時）"):
+        if not USE_CUBE:
+            st.caption(
+                f"⚠️ {CUBE_TABLE} がありません。setup_feature_pipeline.sql の後に setup_review_cube.sql を実行すると、"
+                "カテゴリ・チャネル・評価・感情帯・月・商品の任意の組み合わせを全件で即時に集計できます。"
+            )
+            return
+        
+        st.markdown(f"""
+        {CUBE_TABLE}（{cube_status['data_timestamp']} 時点、目標遅延 {cube_status['target_lag']}）の
+        事前集計から算出するため、レビュー件数によらず明細を走査しません。
+        """)
+        
+        # 絞り込み条件
+        filters = {}
+        filter_cols = st.columns(4)
+        for filter_col, dimension in zip(filter_cols, ["category", "purchase_channel", "rating_bucket", "sentiment_band"]):
+            with filter_col:
+                filters[dimension] = st.multiselect(
+                    CUBE_DIMENSION_LABELS[dimension],
+                    get_dimension_values(dimension, session=session),
+                    key=f"cube_filter_{dimension}"
+                )
+        months = get_dimension_values("review_month", session=session)
+        if months:
+            month_range = st.select_slider(
+                "期間（月）:",
+                options=months,
+                value=(months[0], months[-1]),
+                format_func=lambda month: month.strftime("%Y-%m") if hasattr(month, "strftime") else str(month),
+                key="cube_month_range"
+            )
+        else:
+            month_range = None
+        
+        # 集計軸
+        group_by = st.multiselect(
+            "集計軸:",
+            list(CUBE_DIMENSION_LABELS),
+            default=["category"],
+            format_func=lambda dimension: CUBE_DIMENSION_LABELS[dimension],
+            max_selections=2,
+            key="cube_group_by"
+        )
+        
+        start_time = time.time()
+        if month_range:
+            # 月の範囲は月初〜翌月初の前日で絞り込む
+            date_range = (month_range[0], (pd.Timestamp(month_range[1]) + pd.offsets.MonthEnd(0)).date())
+        else:
+            date_range = None
+        df_slice = slice_cube(
+            group_by, filters, date_range,
+            limit=1000 if "product_id" in group_by else None,
+            session=session
+        )
+        elapsed_ms = (time.time() - start_time) * 1000
+        
+        total_count = int(df_slice['REVIEW_COUNT'].sum()) if not df_slice.empty else 0
+        st.caption(f"⏱️ {elapsed_ms:.0f} ms（{len(df_slice):,}行・対象レビュー{total_count:,}件）")
+        if df_slice.empty:
+            st.info("条件に一致するレビューはありません")
+            return
+        
+        labels = {dimension.upper(): CUBE_DIMENSION_LABELS[dimension] for dimension in group_by}
+        labels.update(REVIEW_COUNT="件数", AVG_RATING="平均評価", AVG_SENTIMENT="平均感情スコア")
+        if group_by:
+            x_col = group_by[0].upper()
+            color_col = group_by[1].upper() if len(group_by) > 1 else None
+            df_chart = df_slice.copy()
+            df_chart[x_col] = df_chart[x_col].astype(str)
+            if color_col:
+                df_chart[color_col] = df_chart[color_col].astype(str)
+            col1, col2 = st.columns(2)
+            with col1:
+                fig = px.bar(df_chart, x=x_col, y='REVIEW_COUNT', color=color_col,
+                             title="件数", labels=labels)
+                st.plotly_chart(fig, use_container_width=True)
+            with col2:
+                fig = px.bar(df_chart, x=x_col, y='AVG_SENTIMENT', color=color_col, barmode="group",
+                             title="平均感情スコア", labels=labels)
+                fig.add_hline(y=0, line_dash="dash", line_color="black")
+                st.plotly_chart(fig, use_container_width=True)
+        st.dataframe(df_slice.rename(columns=labels), use_container_width=True, hide_index=True)
+
+section_6_cube()
+
+@st.fragment
+@profiled("顧客の声分析: エクスポート", is_profiling_mode)
+@routed(DASHBOARD, "顧客の声分析: エクスポート", session)
+def section_6_export():
+    """分析結果のエクスポート（ステージへのアンロード）"""
+    with st.expander("📦 分析結果をParquetでエクスポート"):
+        st.markdown(f"""
+        CUSTOMER_ANALYSISに感情スコア・カテゴリを結合した分析結果（全件）を、
+        `@{EXPORT_STAGE}` に購入チャネル・月ごとに分割した圧縮Parquetとして出力します。
+        データはウェアハウスから直接ステージに書き出されるため、アプリのメモリを経由しません。
+        """)
+        if not USE_FEATURES:
+            st.caption("⚠️ 特徴量パイプラインがないため、エクスポート時にレビューごとにAI_CLASSIFYを実行します。")
+        
+        if st.button("📦 エクスポート実行", key="export_analysis"):
+            with st.spinner("ステージへ出力中..."):
+                try:
+                    with route(session, AI_BATCH, "顧客の声分析: エクスポート") as ai_session:
+                        st.session_state['export_result'] = export_analysis(
+                            ANALYSIS_CATEGORIES, session=ai_session,
+                            use_features=USE_FEATURES, feature_table=FEATURE_TABLE
+                        )
+                except Exception as e:
+                    st.error(f"❌ エクスポートエラー: {str(e)}")
+        
+        if 'export_result' in st.session_state:
+            export_result = st.session_state['export_result']
+            st.success(
+                f"✅ {export_result['rows_unloaded']:,}行を出力しました"
+                f"（{export_result['output_bytes'] / 1024 / 1024:.1f} MB）: "
+                f"`@{EXPORT_STAGE}/{export_result['prefix']}/`"
+            )
+            files = list_export_files(export_result['prefix'], session=session)
+            if files:
+                df_files = pd.DataFrame(files)
+                df_files['size_mb'] = df_files['size'] / 1024 / 1024
+                st.dataframe(
+                    df_files[['partition', 'path', 'size_mb', 'last_modified', 'url']].rename(columns={
+                        'partition': 'パーティション', 'path': 'ファイル', 'size_mb': 'サイズ(MB)',
+                        'last_modified': '更新日時', 'url': 'ダウンロードURL'
+                    }),
+                    use_container_width=True, hide_index=True,
+                    column_config={"ダウンロードURL": st.column_config.LinkColumn(display_text="ダウンロード")}
+                )
+
+section_6_export()
+
 st.markdown("---")
 st.subheader("🎯 Step2 完了！")
 st.success("""
 ✅ **AISQL機能を使った顧客の声分析が完了しました！**
 
 **使用したAISQL機能:**
-- `AI_CLASSIFY`: マルチラベル分類（全件対象・カテゴリ別詳細分析）
-- `AI_FILTER`: スマートフィルタリング（全件対象・マッチ率可視化）
+- `AI_CLASSIFY`: マルチラベル分類（全件／層化サンプル・カテゴリ別詳細分析）
+- `AI_FILTER`: スマートフィルタリング（全件／層化サンプル・マッチ率可視化）
 - `AI_AGG`: 購入チャネル別集約分析（日本語翻訳付き）
 - `AI_SIMILARITY`: 類似レビュー検出（全件対象・分布可視化）
 - `AI_SUMMARIZE_AGG`: カテゴリ・チャネル別集約要約（複数レビューを効率的に要約）
@@ -863,7 +1708,7 @@ st.success("""
 - AI_SUMMARIZE_AGGによる複数レビューの効率的な集約要約
 """)
 
-# st.info("💡 **次のステップ**: Step3では、シンプルなチャットボットの実装を学習します。")
+st.info("💡 **次のステップ**: Step3では、Cortex Analystを使って売上データに自然言語で質問します。")
 
 st.markdown("---")
 st.markdown(f"**Snowflake Cortex Handson シナリオ#2 | Step2: 顧客の声分析**") 
@@ -0,0 +1,244 @@
+# =========================================================
+# Snowflake Cortex Handson シナリオ#2
+# AIを用いた顧客の声分析アプリケーション
+# Step3: 売上分析ページ
+# =========================================================
+# 概要: Cortex Analystによる売上データへの自然言語での質問
+#       （生成SQLと実行結果はキャッシュして再利用）と、
+#       Cortex Searchによる社内ドキュメント検索・取引データの商品名の一括突合
+# 使用する機能: Cortex Analyst, Cortex Search
+# =========================================================
+
+import streamlit as st
+from snowflake.snowpark.context import get_active_session
+import sys
+import os
+
+# analyst_utils等をインポートするためのパス設定
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from analyst_utils import ask_analyst, get_cache_stats, clear_cache, get_semantic_model_version
+from search_utils import (
+    PRODUCT_SEARCH_SERVICE, DOCUMENT_SEARCH_SERVICE,
+    is_search_service_available, search_many, search_to_dataframe, get_search_cache_stats
+)
+from table_utils import resolve_table_name
+from workload_utils import DASHBOARD, use_workload
+
+# ページ設定
+st.set_page_config(layout="wide")
+
+# Snowflakeセッション取得
+@st.cache_resource
+def get_snowflake_session():
+    return get_active_session()
+
+session = get_snowflake_session()
+
+# クエリの実行先ウェアハウスとクエリタグ（setup_workload_routing.sql の対応表に従う）
+use_workload(session, DASHBOARD, "売上分析")
+
+# =========================================================
+# 定数設定
+# =========================================================
+
+# SNOW_RETAIL_AGENT の sample_questions（売上データ分析）
+SAMPLE_QUESTIONS = [
+    "売上TOP10の商品を教えてください",
+    "月別の売上推移を時系列で見せて",
+    "店舗とECの売上を比較して",
+    "商品別の売上ランキングを作って",
+]
+
+# =========================================================
+# メインコンテンツ
+# =========================================================
+st.header("Cortex Analystを使った売上分析")
+
+st.markdown("""
+自然言語の質問から Cortex Analyst がSQLを生成し、売上データを集計します。
+一度回答した質問（表記ゆれを含む）は、セマンティックモデルと売上テーブルが
+更新されていない限りキャッシュから即座に回答します。
+""")
+
+# =========================================================
+# サイドバー: キャッシュ統計
+# =========================================================
+st.sidebar.header("⚡ 回答キャッシュ")
+stats = get_cache_stats()
+st.sidebar.metric("質問数", f"{stats['questions']:,}件")
+st.sidebar.metric("SQLキャッシュヒット率", f"{stats['sql_hit_rate']:.0%}")
+st.sidebar.metric("結果キャッシュヒット率", f"{stats['result_hit_rate']:.0%}")
+st.sidebar.metric("削減できた時間", f"{stats['saved_sec']:.1f}秒")
+st.sidebar.caption(f"SQL: {stats['sql_entries']}件 / 結果: {stats['result_entries']}件を保持")
+# キャッシュは全ユーザーで共有するため、破棄するのは現在のセマンティックモデルで生成した分のみ
+if st.sidebar.button("🗑️ 現在のモデルのキャッシュをクリア", key="clear_analyst_cache",
+                     help="現在のセマンティックモデルで生成したSQLと実行結果を破棄し、モデルの更新を確認し直します"):
+    clear_cache(get_semantic_model_version(session))
+    st.rerun()
+
+# =========================================================
+# 質問入力
+# =========================================================
+st.subheader("💬 質問")
+
+st.markdown("**質問例:**")
+cols = st.columns(len(SAMPLE_QUESTIONS))
+for i, sample in enumerate(SAMPLE_QUESTIONS):
+    if cols[i].button(sample, key=f"sample_question_{i}", use_container_width=True):
+        st.session_state.analyst_question = sample
+
+question = st.text_input("売上データについて質問してください", key="analyst_question")
+
+if st.button("🔍 質問する", type="primary", key="ask_analyst") or (
+    question and st.session_state.get("last_analyst_question") != question
+):
+    st.session_state.last_analyst_question = question
+    if question:
+        with st.spinner("Cortex Analystで回答を生成中..."):
+            try:
+                st.session_state.analyst_response = ask_analyst(question, session)
+            except Exception as e:
+                st.session_state.analyst_response = None
+                st.error(f"回答の生成でエラーが発生しました: {str(e)}")
+
+# =========================================================
+# 回答表示
+# =========================================================
+response = st.session_state.get("analyst_response")
+if response:
+    st.subheader("📋 回答")
+
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.metric("応答時間", f"{response['elapsed_sec']:.2f}秒")
+    with col2:
+        st.metric("SQL生成", "キャッシュ" if response["sql_cache_hit"] else "Cortex Analyst")
+    with col3:
+        st.metric("SQL実行", "キャッシュ" if response["result_cache_hit"] else "ウェアハウス")
+
+    if response["text"]:
+        st.markdown(response["text"])
+
+    if response["sql"]:
+        with st.expander("生成されたSQL", expanded=False):
+            st.code(response["sql"], language="sql")
+
+    if response["df"] is not None:
+        df = response["df"]
+        st.dataframe(df, use_container_width=True)
+
+        # 2列（ラベル + 数値）の結果はグラフでも表示
+        numeric_cols = df.select_dtypes("number").columns.tolist()
+        if len(df.columns) >= 2 and numeric_cols and df.columns[0] not in numeric_cols:
+            st.bar_chart(df.set_index(df.columns[0])[numeric_cols])
+
+# =========================================================
+# 社内ドキュメント検索（Cortex Search）
+# =========================================================
+st.markdown("---")
+st.subheader("📚 社内ドキュメント検索")
+st.markdown("""
+複数の質問をまとめて snow_retail_search_service に問い合わせます（同時実行数を制限して並列に発行）。
+同じ質問の検索結果は一定時間キャッシュされ、他のユーザーの検索結果も再利用されます。
+""")
+
+document_queries = st.text_area(
+    "検索する質問（1行に1件）",
+    value="ポイントカードの有効期限\nネットスーパーの配送料金",
+    key="document_queries"
+)
+if st.button("🔎 ドキュメントを検索", key="search_documents"):
+    queries = [line.strip() for line in document_queries.splitlines() if line.strip()]
+    if queries:
+        with st.spinner("ドキュメントを検索中..."):
+            try:
+                st.session_state.document_results = search_many(
+                    DOCUMENT_SEARCH_SERVICE, queries, ["title", "content", "document_type"], limit=3, session=session
+                )
+            except Exception as e:
+                st.session_state.document_results = None
+                st.error(f"ドキュメント検索でエラーが発生しました: {str(e)}")
+
+for query, hits in (st.session_state.get("document_results") or {}).items():
+    with st.expander(f"🔎 {query}（{len(hits)}件）", expanded=False):
+        for hit in hits:
+            st.markdown(f"**{hit.get('title', '')}**（{hit.get('document_type', '')}）")
+            st.write(str(hit.get("content", ""))[:300])
+
+# =========================================================
+# 商品名の一括突合（Cortex Search）
+# =========================================================
+st.markdown("---")
+st.subheader("🔗 取引データの商品名と商品マスタの一括突合")
+
+if not is_search_service_available(PRODUCT_SEARCH_SERVICE, session):
+    st.info("""
+    商品マスタの検索サービス（product_master_service）がありません。
+    Part1 ノートブックの「Cortex Searchの利用」を実行すると利用できます。
+    """)
+else:
+    st.markdown("""
+    取引データの商品名（表記ゆれを含む）をまとめて product_master_service で検索し、
+    最も近い商品マスタの商品名と、Part1のベクトル類似度による名寄せ結果を比較します。
+    """)
+    match_limit = st.number_input("突合する商品名の件数:", min_value=10, max_value=5000, value=100, step=10,
+                                  key="match_limit")
+    if st.button("🔗 一括突合を実行", key="match_products"):
+        with st.spinner("商品名を突合中..."):
+            try:
+                names = session.sql(f"""
+                    SELECT product_name, ANY_VALUE(product_name_master) AS product_name_master
+                    FROM (
+                        SELECT product_name, product_name_master
+                        FROM {resolve_table_name("RETAIL_DATA_WITH_PRODUCT_MASTER", session)}
+                        UNION ALL
+                        SELECT product_name, product_name_master
+                        FROM {resolve_table_name("EC_DATA_WITH_PRODUCT_MASTER", session)}
+                    )
+                    WHERE product_name IS NOT NULL
+                    GROUP BY product_name
+                    ORDER BY product_name
+                    LIMIT {int(match_limit)}
+                """).to_pandas()
+                df_matches = search_to_dataframe(
+                    PRODUCT_SEARCH_SERVICE, names["PRODUCT_NAME"].tolist(), ["product_name"], limit=1,
+                    session=session
+                )
+                df_matches = names.merge(
+                    df_matches.rename(columns={"QUERY": "PRODUCT_NAME", "product_name": "SEARCH_MATCH"}),
+                    on="PRODUCT_NAME", how="left"
+                ).drop(columns=["RANK"])
+                df_matches["一致"] = df_matches["SEARCH_MATCH"] == df_matches["PRODUCT_NAME_MASTER"]
+                st.session_state.product_matches = df_matches
+            except Exception as e:
+                st.session_state.product_matches = None
+                st.error(f"商品名の突合でエラーが発生しました: {str(e)}")
+
+    df_matches = st.session_state.get("product_matches")
+    if df_matches is not None and not df_matches.empty:
+        col1, col2 = st.columns(2)
+        with col1:
+            st.metric("突合した商品名", f"{len(df_matches):,}件")
+        with col2:
+            st.metric("名寄せ結果との一致率", f"{df_matches['一致'].mean():.0%}")
+        st.dataframe(df_matches, use_container_width=True)
+
+search_stats = get_search_cache_stats()
+st.caption(f"検索キャッシュ: {search_stats['entries']}件を保持 / ヒット率 {search_stats['hit_rate']:.0%}")
+
+# =========================================================
+# 次のステップ
+# =========================================================
+st.markdown("---")
+st.subheader("🎯 Step3 完了！")
+st.success("""
+✅ **Cortex Analystによる売上分析が完了しました！**
+
+**確認した内容:**
+- 自然言語の質問からのSQL生成（Cortex Analyst）
+- 生成SQLと実行結果のキャッシュによる応答時間の短縮
+- 社内ドキュメントの一括検索と商品名の一括突合（Cortex Search）
+""")
+
+st.markdown("---")
+st.markdown("**Snowflake Cortex Handson シナリオ#2 | Step3: 売上分析**")
@@ -0,0 +1,107 @@
+# =========================================================
+# Snowflake Cortex Handson シナリオ#2
+# 前処理プランナー - 不要なCortex関数呼び出しの省略
+# =========================================================
+# 概要: 前処理の前にレビューの言語と長さをローカルで判定し、
+#       英語のレビューは翻訳（TRANSLATE）を、1チャンクに収まるレビューは
+#       分割（SPLIT_TEXT_RECURSIVE_CHARACTER）を省略する。
+#       実行ごとに省略した呼び出し数をレポートする
+# =========================================================
+
+import re
+
+# 前処理の分割設定（process_reviewsのSPLIT_TEXT_RECURSIVE_CHARACTERと同じ値）
+CHUNK_SIZE = 300
+CHUNK_OVERLAP = 30
+
+# 日本語の文字（ひらがな・カタカナ・漢字・半角カナ）
+JAPANESE_PATTERN = re.compile("[\u3040-\u30ff\u3400-\u9fff\uff66-\uff9f]")
+
+# 英字（a-z, A-Z）以外の文字
+NON_ENGLISH_LETTER_PATTERN = re.compile(r"[^\W\d_a-zA-Z]")
+
+
+def detect_language(text: str) -> str:
+    """
+    レビューの言語を簡易判定する
+
+    日本語の文字を含む場合は "ja"、文字がすべて英字の場合は "en"、それ以外は "other"。
+    判定に迷う場合（アクセント付きの文字を含むなど）は翻訳を省略しないよう "other" を返す。
+
+    Args:
+        text: レビュー本文
+
+    Returns:
+        str: "ja" / "en" / "other"
+    """
+    if not text:
+        return "other"
+    if JAPANESE_PATTERN.search(text):
+        return "ja"
+    if NON_ENGLISH_LETTER_PATTERN.search(text) or not re.search(r"[a-zA-Z]", text):
+        return "other"
+    return "en"
+
+
+def plan_review(text: str, chunk_size: int = CHUNK_SIZE) -> dict:
+    """
+    1件のレビューで必要なCortex関数呼び出しを判定する
+
+    Args:
+        text: レビュー本文
+        chunk_size: 分割のチャンクサイズ（文字数）
+
+    Returns:
+        dict: {"language", "length", "translate": 翻訳が必要か, "split": 分割が必要か}
+    """
+    text = text or ""
+    language = detect_language(text)
+    return {
+        "language": language,
+        "length": len(text),
+        "translate": language != "en",
+        "split": len(text) > chunk_size,
+    }
+
+
+def plan_reviews(texts: list, chunk_size: int = CHUNK_SIZE) -> tuple:
+    """
+    レビューのリストに対する前処理の計画と、省略できる呼び出し数を算出する
+
+    Args:
+        texts: レビュー本文のリスト
+        chunk_size: 分割のチャンクサイズ（文字数）
+
+    Returns:
+        tuple: (計画のリスト, レポート)
+               レポートは {"reviews", "translate_calls", "translate_skipped",
+                           "split_calls", "split_skipped", "languages": {言語: 件数}}
+    """
+    plans = [plan_review(text, chunk_size) for text in texts]
+    languages = {}
+    for plan in plans:
+        languages[plan["language"]] = languages.get(plan["language"], 0) + 1
+    translate_calls = sum(1 for plan in plans if plan["translate"])
+    split_calls = sum(1 for plan in plans if plan["split"])
+    report = {
+        "reviews": len(plans),
+        "translate_calls": translate_calls,
+        "translate_skipped": len(plans) - translate_calls,
+        "split_calls": split_calls,
+        "split_skipped": len(plans) - split_calls,
+        "languages": languages,
+    }
+    return plans, report
+
+
+def single_chunk(text: str) -> list:
+    """
+    分割を省略したレビューのチャンク（SPLIT_TEXT_RECURSIVE_CHARACTERの結果と同じ形式）
+
+    Args:
+        text: レビュー本文（チャンクサイズ以下）
+
+    Returns:
+        list: [{"CHUNK": 本文}]（空の場合は空リスト）
+    """
+    return [{"CHUNK": text}] if text else []
@@ -0,0 +1,355 @@
+# =========================================================
+# Snowflake Cortex Handson シナリオ#2
+# プロファイルユーティリティ - 再実行ごとのサンプリングプロファイル
+# =========================================================
+# 概要: ページの再実行・フラグメントの実行ごとに、実行中のスレッドのスタックを
+#       一定間隔でサンプリングする。各サンプルを最も内側の該当フレームで
+#       クエリ待ち（Snowpark・コネクタ）・描画（Streamlit・Plotly）・Python処理に分類し、
+#       実行ごとにspeedscope形式（またはflamegraph.pl用のfolded形式）のファイルを出力する。
+#       環境変数 SNOWRETAIL_PROFILE=1 またはページの設定で有効化し、
+#       直近の結果とファイルのダウンロードはページのサイドバーに表示する
+# =========================================================
+
+import functools
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from collections import OrderedDict, deque
+from datetime import datetime
+
+# 有効化する環境変数と出力先を指定する環境変数
+PROFILE_ENV = "SNOWRETAIL_PROFILE"
+PROFILE_DIR_ENV = "SNOWRETAIL_PROFILE_DIR"
+
+# ページの設定を保持するsession_stateのキー
+PROFILING_MODE_KEY = "profiling_mode"
+
+# 既定の出力先
+DEFAULT_PROFILE_DIR = os.path.join(tempfile.gettempdir(), "snowretail_profiles")
+
+# サンプリング間隔（秒）
+SAMPLE_INTERVAL_SEC = 0.005
+
+# 出力形式
+SPEEDSCOPE = "speedscope"
+FOLDED = "folded"
+
+# フェーズ
+QUERY_PHASE = "query"
+RENDER_PHASE = "render"
+COMPUTE_PHASE = "compute"
+
+PHASES = [QUERY_PHASE, COMPUTE_PHASE, RENDER_PHASE]
+
+# フェーズの判定に使うファイルパス（スタックの内側から最初に一致したものを採用）
+QUERY_PATHS = [os.sep.join(["snowflake", "snowpark"]), os.sep.join(["snowflake", "connector"])]
+RENDER_PATHS = [os.sep + "streamlit" + os.sep, os.sep + "plotly" + os.sep]
+
+# アプリのディレクトリ（ここのフレームに達したらPython処理とする）
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# 保持する直近のプロファイル結果の件数
+MAX_RECENT_PROFILES = 20
+
+# プロセス内で共有する状態
+_lock = threading.Lock()
+_active = {}                     # スレッドID -> 実行中のRerunProfiler
+_recent = deque(maxlen=MAX_RECENT_PROFILES)
+
+
+def is_profiling_enabled(enabled: bool = False) -> bool:
+    """
+    プロファイルが有効か
+
+    Args:
+        enabled: ページの設定で有効化されているか
+
+    Returns:
+        bool: 環境変数またはページの設定で有効な場合True
+    """
+    return bool(enabled) or os.environ.get(PROFILE_ENV, "").lower() in ("1", "true", "yes")
+
+
+def _classify(stack: list) -> str:
+    """サンプルのスタック（外側から内側の順）をフェーズに分類する"""
+    for filename, _, _ in reversed(stack):
+        if any(path in filename for path in QUERY_PATHS):
+            return QUERY_PHASE
+        if any(path in filename for path in RENDER_PATHS):
+            return RENDER_PHASE
+        if filename.startswith(APP_DIR):
+            return COMPUTE_PHASE
+    return COMPUTE_PHASE
+
+
+class RerunProfiler:
+    """
+    1回の再実行（またはフラグメントの実行）のサンプリングプロファイラ
+
+    root_frameを指定した場合、そのフレームがスタックから消えた時点
+    （ページのスクリプトが終了した時点）でサンプリングを終えてファイルを出力する。
+    （Streamlitはスクリプトのコードを再実行間で使い回すため、コードではなくフレームで判定する）
+    """
+
+    def __init__(self, name: str, root_frame=None, interval: float = SAMPLE_INTERVAL_SEC,
+                 output_format: str = SPEEDSCOPE, output_dir: str = None):
+        if output_format not in (SPEEDSCOPE, FOLDED):
+            raise ValueError(f"未知の出力形式です: {output_format}")
+        self.name = name
+        self.root_frame = root_frame
+        self.interval = interval
+        self.output_format = output_format
+        self.output_dir = output_dir or os.environ.get(PROFILE_DIR_ENV) or DEFAULT_PROFILE_DIR
+        self.thread_id = threading.get_ident()
+        self.frames = OrderedDict()  # (ファイル, 関数名, 行) -> フレーム番号
+        self.samples = []            # (フレーム番号のリスト, 重み（秒）, フェーズ)
+        self.result = None
+        self._stop = threading.Event()
+        self._done = threading.Event()
+        self._sampler = threading.Thread(target=self._run, name=f"profiler-{name}", daemon=True)
+
+    def start(self):
+        """サンプリングを開始する"""
+        self.started_at = time.perf_counter()
+        self.started_wall = datetime.now()
+        with _lock:
+            _active[self.thread_id] = self
+        self._sampler.start()
+        return self
+
+    def stop(self) -> dict:
+        """サンプリングを終了してファイルを出力する（出力済みの場合は結果を返すのみ）"""
+        self._stop.set()
+        if threading.current_thread() is not self._sampler:
+            self._done.wait()
+        return self.result
+
+    def _stack(self):
+        """対象スレッドのスタック（外側から内側の順）を取得する"""
+        frame = sys._current_frames().get(self.thread_id)
+        stack, root_found = [], self.root_frame is None
+        while frame is not None:
+            code = frame.f_code
+            if frame is self.root_frame:
+                root_found = True
+            stack.append((code.co_filename, code.co_name, code.co_firstlineno))
+            frame = frame.f_back
+        if not root_found:
+            return None
+        stack.reverse()
+        return stack
+
+    def _run(self):
+        """サンプリングスレッド"""
+        last = time.perf_counter()
+        try:
+            while not self._stop.is_set():
+                time.sleep(self.interval)
+                stack = self._stack()
+                now = time.perf_counter()
+                if stack is None:
+                    # ページのスクリプトが終了した
+                    break
+                indexes = [self.frames.setdefault(key, len(self.frames)) for key in stack]
+                self.samples.append((indexes, now - last, _classify(stack)))
+                last = now
+        finally:
+            self._finish()
+            self._done.set()
+
+    def _finish(self):
+        """フェーズ別の時間を集計してファイルを出力する"""
+        duration = time.perf_counter() - self.started_at
+        # スクリプトのフレーム（ローカル変数を含む）を解放する
+        self.root_frame = None
+        with _lock:
+            if _active.get(self.thread_id) is self:
+                del _active[self.thread_id]
+        phases = {phase: 0.0 for phase in PHASES}
+        for _, weight, phase in self.samples:
+            phases[phase] += weight
+        path = None
+        if self.samples:
+            try:
+                path = self._write()
+            except OSError:
+                path = None
+        self.result = {
+            "name": self.name,
+            "started_at": self.started_wall.strftime("%H:%M:%S"),
+            "duration_sec": duration,
+            "samples": len(self.samples),
+            "phases": phases,
+            "path": path,
+        }
+        with _lock:
+            _recent.append(self.result)
+
+    def _write(self) -> str:
+        """プロファイルをファイルに出力する"""
+        os.makedirs(self.output_dir, exist_ok=True)
+        stamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
+        safe_name = "".join(ch if ch.isalnum() else "_" for ch in self.name)
+        frames = list(self.frames)
+        if self.output_format == FOLDED:
+            # flamegraph.pl 用（1行1スタック、重みはミリ秒）。先頭にフェーズを置く
+            path = os.path.join(self.output_dir, f"{stamp}_{safe_name}.folded")
+            folded = {}
+            for indexes, weight, phase in self.samples:
+                key = ";".join([phase] + [f"{frames[i][1]} ({os.path.basename(frames[i][0])})" for i in indexes])
+                folded[key] = folded.get(key, 0.0) + weight
+            with open(path, "w", encoding="utf-8") as f:
+                for key, weight in folded.items():
+                    f.write(f"{key} {max(1, int(weight * 1000))}\n")
+            return path
+
+        # speedscope（https://www.speedscope.app/）用。フェーズごとに1つのプロファイルとする
+        path = os.path.join(self.output_dir, f"{stamp}_{safe_name}.speedscope.json")
+        end_value = sum(weight for _, weight, _ in self.samples)
+        profiles = [{
+            "type": "sampled",
+            "name": f"{self.name} (all)",
+            "unit": "seconds",
+            "startValue": 0,
+            "endValue": end_value,
+            "samples": [indexes for indexes, _, _ in self.samples],
+            "weights": [weight for _, weight, _ in self.samples],
+        }]
+        for phase in PHASES:
+            phase_samples = [(indexes, weight) for indexes, weight, sample_phase in self.samples if sample_phase == phase]
+            if phase_samples:
+                profiles.append({
+                    "type": "sampled",
+                    "name": f"{self.name} ({phase})",
+                    "unit": "seconds",
+                    "startValue": 0,
+                    "endValue": sum(weight for _, weight in phase_samples),
+                    "samples": [indexes for indexes, _ in phase_samples],
+                    "weights": [weight for _, weight in phase_samples],
+                })
+        document = {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "name": self.name,
+            "exporter": "snowretail profile_utils",
+            "activeProfileIndex": 0,
+            "shared": {
+                "frames": [{"name": name, "file": filename, "line": line} for filename, name, line in frames]
+            },
+            "profiles": profiles,
+        }
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(document, f, ensure_ascii=False)
+        return path
+
+
+def profile_rerun(name: str, enabled: bool = False, output_format: str = SPEEDSCOPE):
+    """
+    ページの再実行のプロファイルを開始する（ページのスクリプトの先頭で呼び出す）
+
+    スクリプトの終了（st.stop・st.rerunを含む）を検知してファイルを出力するため、
+    終了処理の呼び出しは不要。
+
+    Args:
+        name: プロファイル名（ページ名など）
+        enabled: ページの設定で有効化されているか（環境変数でも有効化できる）
+        output_format: SPEEDSCOPE または FOLDED
+
+    Returns:
+        RerunProfiler または None: 無効な場合はNone
+    """
+    if not is_profiling_enabled(enabled):
+        return None
+    return RerunProfiler(name, root_frame=sys._getframe(1), output_format=output_format).start()
+
+
+def profiled(name: str, enabled=None, output_format: str = SPEEDSCOPE):
+    """
+    関数（フラグメント）の実行ごとにプロファイルを取るデコレータ
+
+    ページの再実行のプロファイル中に呼ばれた場合は、ページのプロファイルに含める。
+
+    Args:
+        name: プロファイル名（セクション名など）
+        enabled: 有効かを返す関数（省略時は環境変数のみで判定）
+        output_format: SPEEDSCOPE または FOLDED
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with _lock:
+                nested = threading.get_ident() in _active
+            if nested or not is_profiling_enabled(enabled() if enabled else False):
+                return func(*args, **kwargs)
+            profiler = RerunProfiler(name, output_format=output_format).start()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                profiler.stop()
+        return wrapper
+    return decorator
+
+
+def get_recent_profiles() -> list:
+    """
+    直近のプロファイル結果を取得する（新しい順）
+
+    Returns:
+        list: [{"name", "started_at", "duration_sec", "samples", "phases": {フェーズ: 秒}, "path"}]
+    """
+    with _lock:
+        return list(reversed(_recent))
+
+
+def is_profiling_mode() -> bool:
+    """再実行のプロファイルが有効か（ページのサイドバーの設定）"""
+    import streamlit as st
+    return bool(st.session_state.get(PROFILING_MODE_KEY, False))
+
+
+def render_profile_sidebar():
+    """再実行のプロファイル設定・直近の結果とファイルのダウンロード（サイドバー）"""
+    import pandas as pd
+    import streamlit as st
+    st.sidebar.checkbox(
+        "🔬 再実行のプロファイルを取得",
+        key=PROFILING_MODE_KEY,
+        help="ページの再実行・セクションの実行ごとにスタックをサンプリングし、speedscope形式のファイルを出力します"
+             f"（環境変数 {PROFILE_ENV}=1 でも有効化）"
+    )
+    if not is_profiling_enabled(is_profiling_mode()):
+        return
+    profiles = get_recent_profiles()
+    if profiles:
+        df_profiles = pd.DataFrame([{
+            "実行": profile["name"],
+            "開始": profile["started_at"],
+            "合計(ms)": profile["duration_sec"] * 1000,
+            "クエリ待ち(ms)": profile["phases"][QUERY_PHASE] * 1000,
+            "Python処理(ms)": profile["phases"][COMPUTE_PHASE] * 1000,
+            "描画(ms)": profile["phases"][RENDER_PHASE] * 1000,
+            "ファイル": profile["path"],
+        } for profile in profiles])
+        st.sidebar.dataframe(df_profiles.round(0), hide_index=True)
+
+        # 出力ファイルはアプリのコンテナ内にあるため、選択した1件をダウンロードできるようにする
+        files = [profile for profile in profiles if profile["path"] and os.path.exists(profile["path"])]
+        if files:
+            selected = st.sidebar.selectbox(
+                "ダウンロードするプロファイル:",
+                range(len(files)),
+                format_func=lambda i: f"{files[i]['started_at']} {files[i]['name']}",
+                key="profile_download_select"
+            )
+            path = files[selected]["path"]
+            with open(path, "rb") as f:
+                st.sidebar.download_button(
+                    "⬇️ プロファイルをダウンロード",
+                    data=f.read(),
+                    file_name=os.path.basename(path),
+                    mime="application/json" if path.endswith(".json") else "text/plain",
+                    key="profile_download"
+                )
+    st.sidebar.caption("この再実行のプロファイルは終了後に記録されます")
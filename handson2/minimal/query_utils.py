@@ -0,0 +1,76 @@
+# =========================================================
+# Snowflake Cortex Handson シナリオ#2
+# クエリユーティリティ - 独立した読み取りクエリの同時発行
+# =========================================================
+# 概要: ページ描画で使う互いに独立した読み取りクエリを、描画前にまとめて
+#       非同期ジョブとして発行する。呼び出し側は結果を必要になった時点で
+#       受け取るため、描画の待ち時間は各クエリの合計ではなく最も遅いクエリ程度になる
+# =========================================================
+
+from concurrent.futures import Future
+
+
+def submit_query(session, query: str, params: list = None):
+    """
+    読み取りクエリを非同期ジョブとして発行する
+
+    非同期実行に対応していない環境では同期実行し、
+    結果（またはエラー）を格納したFutureを返す。
+
+    Args:
+        session: Snowflakeセッション
+        query: 読み取りクエリ
+        params: バインド変数（省略可）
+
+    Returns:
+        AsyncJob または Future: result()でRowのリストを返す（失敗時は例外を送出）
+    """
+    try:
+        return session.sql(query, params=params).collect_nowait()
+    except Exception:
+        future = Future()
+        try:
+            future.set_result(session.sql(query, params=params).collect())
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+
+def submit_queries(session, queries: dict) -> dict:
+    """
+    複数の読み取りクエリをまとめて発行する
+
+    Args:
+        session: Snowflakeセッション
+        queries: {名前: クエリ} または {名前: (クエリ, バインド変数)}
+
+    Returns:
+        dict: {名前: submit_query()の戻り値}
+    """
+    jobs = {}
+    for name, query in queries.items():
+        if isinstance(query, tuple):
+            jobs[name] = submit_query(session, *query)
+        else:
+            jobs[name] = submit_query(session, query)
+    return jobs
+
+
+def get_scalar(job, default=None):
+    """
+    1行1列の結果（件数など）を取り出す
+
+    Args:
+        job: submit_query()の戻り値（Noneの場合はdefault）
+        default: 失敗時・結果なしの場合の値
+
+    Returns:
+        先頭行の先頭列の値
+    """
+    if job is None:
+        return default
+    try:
+        rows = job.result()
+        return rows[0][0] if rows else default
+    except:
+        return default
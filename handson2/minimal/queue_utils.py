@@ -0,0 +1,195 @@
+# =========================================================
+# Snowflake Cortex Handson シナリオ#2
+# キューユーティリティ - 前処理の処理状態管理
+# =========================================================
+# 概要: setup_processing_state.sql で作成した未処理キューを使い、
+#       未処理レビュー数と次バッチの取得を未処理件数に比例する時間で行う
+# =========================================================
+
+from snowflake.snowpark.context import get_active_session
+
+from storage_utils import time_query
+
+# 未処理キューと新着ストリーム
+QUEUE_TABLE = "REVIEW_PROCESSING_QUEUE"
+NEW_REVIEWS_STREAM = "CUSTOMER_REVIEWS_NEW"
+
+# 未処理レビュー数（ストリームと初回投入の重複を考慮してreview_idの重複は除く）
+BACKLOG_COUNT_QUERY = f"SELECT COUNT(DISTINCT review_id) as count FROM {QUEUE_TABLE}"
+
+
+def _get_session():
+    """Snowflakeセッションを取得"""
+    return get_active_session()
+
+
+def is_processing_queue_ready(session=None, tables: set = None) -> bool:
+    """
+    未処理キューが利用可能か
+
+    Args:
+        session: Snowflakeセッション（省略可）
+        tables: スキーマ内のテーブル名の一覧（table_utils.get_table_names()の結果・省略時は存在確認クエリを発行する）
+
+    Returns:
+        bool: キューテーブルが存在する場合True
+    """
+    if tables is not None:
+        return QUEUE_TABLE in tables
+    if session is None:
+        session = _get_session()
+    try:
+        session.sql(f"SELECT 1 FROM {QUEUE_TABLE} LIMIT 1").collect()
+        return True
+    except:
+        return False
+
+
+def sync_new_reviews(session=None) -> int:
+    """
+    タスクの実行を待たずに新着レビューをキューへ取り込む
+
+    Args:
+        session: Snowflakeセッション（省略可）
+
+    Returns:
+        int: 取り込んだ件数
+    """
+    if session is None:
+        session = _get_session()
+    result = session.sql(f"""
+        INSERT INTO {QUEUE_TABLE} (review_id)
+        SELECT review_id FROM {NEW_REVIEWS_STREAM}
+    """).collect()
+    return result[0][0] if result else 0
+
+
+def get_backlog_count(session=None) -> int:
+    """
+    未処理レビュー数を取得する（キューの件数のみを数える）
+
+    ストリームと初回投入の重複を考慮してreview_idの重複は除いて数える。
+
+    Args:
+        session: Snowflakeセッション（省略可）
+
+    Returns:
+        int: 未処理レビュー数
+    """
+    if session is None:
+        session = _get_session()
+    result = session.sql(BACKLOG_COUNT_QUERY).collect()
+    return result[0]['COUNT']
+
+
+def purge_orphaned_entries(session=None) -> int:
+    """
+    CUSTOMER_REVIEWSから削除されたレビューをキューから削除する
+
+    Args:
+        session: Snowflakeセッション（省略可）
+
+    Returns:
+        int: 削除した件数
+    """
+    if session is None:
+        session = _get_session()
+    result = session.sql(f"""
+        DELETE FROM {QUEUE_TABLE} q
+        WHERE NOT EXISTS (SELECT 1 FROM CUSTOMER_REVIEWS r WHERE r.review_id = q.review_id)
+    """).collect()
+    return result[0][0] if result else 0
+
+
+def fetch_next_batch(session=None, limit: int = None) -> list:
+    """
+    次に処理するレビューをキュー順に取得する
+
+    レビューと結合してから件数を絞るため、削除済みのレビューがキューに残っていても
+    取得件数は減らない。取得件数がlimitに満たない場合（キューの末尾まで達した場合）は、
+    削除済みのレビューをキューから削除して未処理レビュー数と一致させる。
+
+    Args:
+        session: Snowflakeセッション（省略可）
+        limit: 取得件数（Noneの場合は全件）
+
+    Returns:
+        list: CUSTOMER_REVIEWSのRowのリスト
+    """
+    if session is None:
+        session = _get_session()
+    limit_clause = f"LIMIT {int(limit)}" if limit else ""
+    reviews = session.sql(f"""
+        SELECT r.*
+        FROM (
+            SELECT review_id, MIN(enqueued_at) AS enqueued_at
+            FROM {QUEUE_TABLE}
+            GROUP BY review_id
+        ) q
+        JOIN CUSTOMER_REVIEWS r ON r.review_id = q.review_id
+        ORDER BY q.enqueued_at, q.review_id
+        {limit_clause}
+    """).collect()
+    if not limit or len(reviews) < limit:
+        purge_orphaned_entries(session)
+    return reviews
+
+
+def mark_processed(review_id: str, session=None):
+    """
+    前処理が完了したレビューをキューから削除する
+
+    Args:
+        review_id: 処理済みのレビューID
+        session: Snowflakeセッション（省略可）
+    """
+    if session is None:
+        session = _get_session()
+    session.sql(f"DELETE FROM {QUEUE_TABLE} WHERE review_id = ?", params=[review_id]).collect()
+
+
+def benchmark_backlog_queries(processed_table: str, batch_size: int = 10, session=None, repeat: int = 3) -> list:
+    """
+    アンチ結合方式とキュー方式で未処理数・次バッチ取得の時間を比較する
+
+    Args:
+        processed_table: アンチ結合で参照する処理済みテーブル
+        batch_size: 次バッチ取得の件数
+        session: Snowflakeセッション（省略可）
+        repeat: 各クエリの実行回数（最速値を採用）
+
+    Returns:
+        list: [{"query", "anti_join_sec", "queue_sec", "speedup"}]
+    """
+    if session is None:
+        session = _get_session()
+
+    queries = {
+        "未処理レビュー数": (
+            f"""SELECT COUNT(*) FROM CUSTOMER_REVIEWS r
+                LEFT JOIN {processed_table} a ON r.review_id = a.review_id
+                WHERE a.review_id IS NULL""",
+            f"SELECT COUNT(DISTINCT review_id) FROM {QUEUE_TABLE}",
+        ),
+        "次バッチ取得": (
+            f"""SELECT r.* FROM CUSTOMER_REVIEWS r
+                LEFT JOIN {processed_table} a ON r.review_id = a.review_id
+                WHERE a.review_id IS NULL LIMIT {int(batch_size)}""",
+            f"""SELECT r.* FROM {QUEUE_TABLE} q
+                JOIN CUSTOMER_REVIEWS r ON r.review_id = q.review_id
+                ORDER BY q.enqueued_at, q.review_id LIMIT {int(batch_size)}""",
+        ),
+    }
+
+    results = []
+    # 結果キャッシュはtime_query()でクエリ単位に無効化する（共有セッションの設定は変更しない）
+    for name, (anti_join_query, queue_query) in queries.items():
+        anti_join_sec = time_query(session, anti_join_query, repeat)
+        queue_sec = time_query(session, queue_query, repeat)
+        results.append({
+            "query": name,
+            "anti_join_sec": anti_join_sec,
+            "queue_sec": queue_sec,
+            "speedup": anti_join_sec / queue_sec if queue_sec else None,
+        })
+    return results
@@ -0,0 +1,221 @@
+# =========================================================
+# Snowflake Cortex Handson シナリオ#2
+# 分析結果キャッシュユーティリティ - ユーザー間で共有する省メモリの結果キャッシュ
+# =========================================================
+# 概要: AI_CLASSIFYや統合分析の結果を (分析の種類, パラメータ, データバージョン) を
+#       キーとしてプロセス内で1つだけ保持し、メモリ上限を超えたら古いものから破棄する。
+#       カテゴリ・購入チャネルはカテゴリ型、評価などの整数は小さい整数型、
+#       スコアはfloat32で保持し、レビュー本文は
+#       保持せず表示するページ分だけ取得する。各ユーザーのsession_stateはキーのみを持つ
+# =========================================================
+
+import json
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+from snowflake.snowpark.context import get_active_session
+
+# 結果キャッシュのメモリ上限（バイト）
+MEMORY_BUDGET_BYTES = 256 * 1024 * 1024
+
+# レビュー本文キャッシュの上限件数
+MAX_TEXT_ENTRIES = 20000
+
+# カテゴリ型で保持する列
+CATEGORICAL_COLUMNS = ["CATEGORY", "PURCHASE_CHANNEL", "STRATUM_KEY"]
+
+# 整数で保持する列（欠損を含む場合は欠損値を扱える整数型にする）
+INTEGER_COLUMNS = ["RATING", "HELPFUL_VOTES"]
+
+# 結果キャッシュに保持しない列（本文は表示時に取得する）
+TEXT_COLUMNS = ["REVIEW_TEXT"]
+
+# プロセス内で共有するキャッシュ（Streamlitの再実行・ユーザー間で共有される）
+_lock = threading.Lock()
+_results = OrderedDict()         # キー -> (DataFrame, バイト数)
+_texts = OrderedDict()           # review_id -> レビュー本文
+_state = {"bytes": 0}
+_stats = {"lookups": 0, "hits": 0, "evictions": 0}
+
+
+def _get_session():
+    """Snowflakeセッションを取得"""
+    return get_active_session()
+
+
+def make_key(analysis_type: str, params: dict, data_version) -> tuple:
+    """
+    結果キャッシュのキーを作成する
+
+    Args:
+        analysis_type: 分析の種類（例: "classify"）
+        params: 分析のパラメータ（サンプル設定など）
+        data_version: 参照テーブルのバージョン（get_data_version()の戻り値）
+
+    Returns:
+        tuple: キャッシュキー
+    """
+    return (analysis_type, json.dumps(params, sort_keys=True, ensure_ascii=False, default=str), data_version)
+
+
+def get_data_version(tables: list, session=None) -> tuple:
+    """
+    テーブルの最終更新コミット時刻をまとめて取得する
+
+    Args:
+        tables: テーブル名のリスト
+        session: Snowflakeセッション（省略可）
+
+    Returns:
+        tuple: ((テーブル名, 最終更新時刻), ...)
+    """
+    if session is None:
+        session = _get_session()
+    if not tables:
+        return ()
+    columns = ", ".join(f"SYSTEM$LAST_CHANGE_COMMIT_TIME('{table}') AS v{i}" for i, table in enumerate(tables))
+    row = session.sql(f"SELECT {columns}").collect()[0]
+    return tuple((table, row[i]) for i, table in enumerate(tables))
+
+
+def compact_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    分析結果をキャッシュ用の省メモリな形式に変換する
+
+    本文の列を除き、カテゴリ列はカテゴリ型、整数の列は値が収まる最小の整数型、
+    浮動小数点の列はfloat32にする。
+
+    Args:
+        df: 分析結果
+
+    Returns:
+        DataFrame: 変換後の分析結果（元のDataFrameは変更しない）
+    """
+    df = df.drop(columns=[column for column in TEXT_COLUMNS if column in df.columns]).reset_index(drop=True)
+    # 連結などでobject型になった数値列を数値型に戻す
+    df = df.infer_objects()
+    for column in df.columns:
+        if column in CATEGORICAL_COLUMNS:
+            df[column] = df[column].astype("category")
+        elif column in INTEGER_COLUMNS or pd.api.types.is_integer_dtype(df[column]):
+            values = pd.to_numeric(df[column], errors="coerce")
+            if values.isna().any():
+                df[column] = values.astype("Int32")
+            else:
+                df[column] = pd.to_numeric(values, downcast="integer")
+        elif pd.api.types.is_float_dtype(df[column]):
+            df[column] = df[column].astype(np.float32)
+    return df
+
+
+def put_result(key: tuple, df: pd.DataFrame) -> pd.DataFrame:
+    """
+    分析結果をキャッシュに追加する（メモリ上限を超えたら古いものから破棄）
+
+    Args:
+        key: make_key()で作成したキー
+        df: 分析結果
+
+    Returns:
+        DataFrame: キャッシュに保持した省メモリ形式の分析結果（読み取り専用として扱う）
+    """
+    compact = compact_frame(df)
+    nbytes = int(compact.memory_usage(deep=True).sum())
+    with _lock:
+        if key in _results:
+            _state["bytes"] -= _results.pop(key)[1]
+        _results[key] = (compact, nbytes)
+        _state["bytes"] += nbytes
+        # 追加した結果自体は残す
+        while _state["bytes"] > MEMORY_BUDGET_BYTES and len(_results) > 1:
+            _, (_, evicted_bytes) = _results.popitem(last=False)
+            _state["bytes"] -= evicted_bytes
+            _stats["evictions"] += 1
+    return compact
+
+
+def get_result(key: tuple):
+    """
+    キャッシュから分析結果を取得する
+
+    Args:
+        key: make_key()で作成したキー（Noneの場合はNone）
+
+    Returns:
+        DataFrame または None: 省メモリ形式の分析結果（読み取り専用として扱う）
+    """
+    if key is None:
+        return None
+    with _lock:
+        _stats["lookups"] += 1
+        entry = _results.get(key)
+        if entry is None:
+            return None
+        _results.move_to_end(key)
+        _stats["hits"] += 1
+        return entry[0]
+
+
+def with_review_text(df: pd.DataFrame, session=None) -> pd.DataFrame:
+    """
+    表示する行のレビュー本文を取得してREVIEW_TEXT列を付与する
+
+    取得済みの本文はプロセス内で共有し、未取得のreview_idのみを1回のクエリで取得する。
+
+    Args:
+        df: REVIEW_ID列を持つ分析結果（表示するページ分）
+        session: Snowflakeセッション（省略可）
+
+    Returns:
+        DataFrame: REVIEW_TEXT列を付与したコピー
+    """
+    review_ids = [str(review_id) for review_id in df['REVIEW_ID'].tolist()]
+    with _lock:
+        missing = []
+        for review_id in dict.fromkeys(review_ids):
+            if review_id in _texts:
+                # 参照された本文は破棄の順番を後ろにする（LRU）
+                _texts.move_to_end(review_id)
+            else:
+                missing.append(review_id)
+    if missing:
+        if session is None:
+            session = _get_session()
+        rows = session.sql("""
+            SELECT review_id, review_text
+            FROM CUSTOMER_REVIEWS
+            WHERE review_id IN (SELECT value::string FROM TABLE(FLATTEN(input => PARSE_JSON(?))))
+        """, params=[json.dumps(missing)]).collect()
+        with _lock:
+            for row in rows:
+                _texts[row['REVIEW_ID']] = row['REVIEW_TEXT']
+            while len(_texts) > MAX_TEXT_ENTRIES:
+                _texts.popitem(last=False)
+    with _lock:
+        texts = [_texts.get(review_id, "") for review_id in review_ids]
+    return df.assign(REVIEW_TEXT=texts)
+
+
+def get_result_cache_stats() -> dict:
+    """
+    結果キャッシュの使用状況を取得する
+
+    Returns:
+        dict: {"entries", "bytes", "budget_bytes", "lookups", "hits", "hit_rate", "evictions", "texts"}
+    """
+    with _lock:
+        stats = dict(_stats, entries=len(_results), bytes=_state["bytes"], texts=len(_texts))
+    stats["budget_bytes"] = MEMORY_BUDGET_BYTES
+    stats["hit_rate"] = stats["hits"] / stats["lookups"] if stats["lookups"] else 0.0
+    return stats
+
+
+def clear_result_cache():
+    """結果キャッシュ・本文キャッシュと統計を破棄する"""
+    with _lock:
+        _results.clear()
+        _texts.clear()
+        _state["bytes"] = 0
+        _stats.update(lookups=0, hits=0, evictions=0)
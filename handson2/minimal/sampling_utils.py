@@ -0,0 +1,238 @@
+# =========================================================
+# Snowflake Cortex Handson シナリオ#2
+# サンプリングユーティリティ - 層化サンプルによるクイック分析
+# =========================================================
+# 概要: AI_CLASSIFY / AI_FILTER などを全件ではなく層化サンプルで実行し、
+#       信頼区間付きで母集団全体の構成比・件数を推定する
+#       （信頼区間は層別分散から求めた有効サンプルサイズに対するWilson区間）
+# =========================================================
+
+import json
+import math
+
+import pandas as pd
+
+# 層化に使用する列（購入チャネル × 評価 × 月）
+STRATUM_KEY_EXPR = (
+    "purchase_channel || '|' || TO_VARCHAR(rating) || '|' "
+    "|| TO_VARCHAR(DATE_TRUNC('MONTH', review_date), 'YYYY-MM')"
+)
+
+# 既定のサンプルサイズ・シード・信頼係数（95%信頼区間）
+DEFAULT_SAMPLE_SIZE = 200
+# 層ごとの最低サンプル数（層内分散の推定に2件以上必要）
+MIN_PER_STRATUM = 2
+DEFAULT_SEED = 42
+Z_95 = 1.96
+
+
+def build_sample_source(sample_size: int, seed: int = DEFAULT_SEED) -> str:
+    """
+    層化サンプルのサブクエリを生成する（比例配分・各層最低MIN_PER_STRATUM件）
+
+    HASH(review_id, seed)で並べるため、同じシードなら何度実行しても
+    同じレビューが選ばれる。各層の最低件数を確保するため、実際のサンプル件数は
+    sample_sizeより多くなる（build_sample_size_query()で確認できる）。
+
+    Args:
+        sample_size: 目標サンプルサイズ
+        seed: サンプリングのシード
+
+    Returns:
+        str: review_id, stratum_key, stratum_size を返すサブクエリ
+    """
+    sample_size = max(1, int(sample_size))
+    seed = int(seed)
+    return f"""
+        SELECT review_id, stratum_key, stratum_size
+        FROM (
+            SELECT
+                review_id,
+                {STRATUM_KEY_EXPR} AS stratum_key,
+                COUNT(*) OVER (PARTITION BY {STRATUM_KEY_EXPR}) AS stratum_size,
+                COUNT(*) OVER () AS population_size,
+                ROW_NUMBER() OVER (
+                    PARTITION BY {STRATUM_KEY_EXPR}
+                    ORDER BY HASH(review_id, {seed})
+                ) AS stratum_rank
+            FROM CUSTOMER_REVIEWS
+            WHERE review_text IS NOT NULL
+        )
+        WHERE stratum_rank <= GREATEST({MIN_PER_STRATUM}, ROUND(stratum_size * {sample_size} / population_size))
+    """
+
+
+def build_sample_size_query(sample_size: int, seed: int = DEFAULT_SEED) -> str:
+    """
+    層化サンプルの実際の件数を取得するクエリを生成する
+
+    Args:
+        sample_size: 目標サンプルサイズ
+        seed: サンプリングのシード
+
+    Returns:
+        str: SAMPLE_COUNT列（実際のサンプル件数）を返すクエリ
+    """
+    return f"SELECT COUNT(*) AS sample_count FROM ({build_sample_source(sample_size, seed)})"
+
+
+def build_remaining_filter(alias: str = "") -> str:
+    """
+    分析済みのレビューを除外するWHERE条件を生成する（全件への昇格用）
+
+    除外するreview_idはJSON配列のバインド変数1つで渡す（remaining_params()）。
+    サンプルを再計算せず、実際に保存した結果のreview_idを除外するため、
+    データが更新されていても取りこぼしや重複が生じない。
+
+    Args:
+        alias: review_idに付けるテーブル別名（例: "r"）
+
+    Returns:
+        str: "review_id NOT IN (...)" 形式の条件式（バインド変数1つ）
+    """
+    column = f"{alias}.review_id" if alias else "review_id"
+    return f"{column} NOT IN (SELECT value::string FROM TABLE(FLATTEN(input => PARSE_JSON(?))))"
+
+
+def remaining_params(df: pd.DataFrame) -> list:
+    """
+    build_remaining_filter()のバインド変数を作成する
+
+    Args:
+        df: REVIEW_ID列を持つ分析済みの結果
+
+    Returns:
+        list: [review_idのJSON配列]
+    """
+    return [json.dumps([str(review_id) for review_id in df["REVIEW_ID"].tolist()])]
+
+
+def _wilson_interval(p: float, n: float, z: float) -> tuple:
+    """比率pとサンプル件数nからWilsonスコア信頼区間を求める（内部用）"""
+    if n <= 0:
+        return 0.0, 1.0
+    denominator = 1 + z ** 2 / n
+    center = (p + z ** 2 / (2 * n)) / denominator
+    half = z * math.sqrt(max(0.0, p * (1 - p)) / n + z ** 2 / (4 * n ** 2)) / denominator
+    return max(0.0, center - half), min(1.0, center + half)
+
+
+def _stratified_proportion(df: pd.DataFrame, indicator: pd.Series, z: float) -> dict:
+    """層ごとの比率から母集団比率と信頼区間を推定する（内部用）"""
+    frame = pd.DataFrame({
+        "stratum": df["STRATUM_KEY"].values,
+        "stratum_size": df["STRATUM_SIZE"].astype(float).values,
+        "hit": indicator.astype(float).values,
+    })
+    strata = frame.groupby("stratum").agg(
+        n=("hit", "size"),
+        hits=("hit", "sum"),
+        size=("stratum_size", "first"),
+    )
+    population = strata["size"].sum()
+    if population <= 0:
+        return {"share": 0.0, "ci_low": 0.0, "ci_high": 0.0, "population": 0, "sample_size": 0}
+
+    weight = strata["size"] / population
+    p_h = strata["hits"] / strata["n"]
+    share = float((weight * p_h).sum())
+
+    # 全数を抽出した層は誤差がないため、確定分として区間の推定から除く
+    census = strata["n"] >= strata["size"]
+    known = float((weight[census] * p_h[census]).sum())
+    sampled = strata[~census]
+    if sampled.empty:
+        return {"share": share, "ci_low": share, "ci_high": share,
+                "population": int(population), "sample_size": int(strata["n"].sum())}
+    sampled_weight = float(weight[~census].sum())
+    w = weight[~census] / sampled_weight
+    p_s = float((w * p_h[~census]).sum())
+
+    # 有限母集団修正つきの層別分散。2件未満の層は層内分散を推定できないため1つの層にまとめ、
+    # まとめても1件の場合はベルヌーイ分散の上限（0.25）を使う
+    small = sampled["n"] < MIN_PER_STRATUM
+    regular = sampled[~small]
+    p_regular = p_h[~census][~small]
+    fpc = (1 - regular["n"] / regular["size"]).clip(lower=0)
+    var_h = p_regular * (1 - p_regular) / (regular["n"] - 1).clip(lower=1)
+    variance = float((w[~small] ** 2 * fpc * var_h).sum())
+    if small.any():
+        pooled = sampled[small].sum()
+        pooled_p = pooled["hits"] / pooled["n"]
+        pooled_fpc = max(0.0, 1 - pooled["n"] / pooled["size"])
+        pooled_var = pooled_p * (1 - pooled_p) / (pooled["n"] - 1) if pooled["n"] >= 2 else 0.25
+        variance += float(w[small].sum()) ** 2 * pooled_fpc * pooled_var
+
+    # 層内のヒットがすべて0件・すべて1件だと層別分散は0になるため、区間は有効サンプルサイズ
+    # （層別分散と同じ精度になる単純無作為抽出の件数。サンプル件数が上限）に対するWilson区間で求める
+    n_sampled = float(sampled["n"].sum())
+    if variance > 0 and 0 < p_s < 1:
+        n_effective = min(n_sampled, p_s * (1 - p_s) / variance)
+    else:
+        n_effective = n_sampled
+    low, high = _wilson_interval(p_s, n_effective, z)
+
+    return {
+        "share": share,
+        "ci_low": known + sampled_weight * low,
+        "ci_high": known + sampled_weight * high,
+        "population": int(population),
+        "sample_size": int(strata["n"].sum()),
+    }
+
+
+def estimate_shares(df: pd.DataFrame, value_col: str, z: float = Z_95, categories: list = None) -> pd.DataFrame:
+    """
+    層化サンプルからカテゴリ構成比を推定する
+
+    Args:
+        df: STRATUM_KEY, STRATUM_SIZE列を含むサンプル結果
+        value_col: 構成比を求める列名（例: "CATEGORY"）
+        z: 信頼係数（既定は95%）
+        categories: サンプルに現れなくても推定する値のリスト（省略可。上限は0にならない）
+
+    Returns:
+        pd.DataFrame: 値ごとのサンプル件数、推定構成比、信頼区間、推定件数
+    """
+    values = set(df[value_col].dropna().unique().tolist()) | set(categories or [])
+    rows = []
+    for value in sorted(values):
+        est = _stratified_proportion(df, df[value_col] == value, z)
+        rows.append({
+            value_col: value,
+            "サンプル件数": int((df[value_col] == value).sum()),
+            "推定構成比": est["share"],
+            "下限": est["ci_low"],
+            "上限": est["ci_high"],
+            "推定件数": round(est["share"] * est["population"]),
+            "推定件数(下限)": round(est["ci_low"] * est["population"]),
+            "推定件数(上限)": round(est["ci_high"] * est["population"]),
+        })
+    return pd.DataFrame(rows)
+
+
+def estimate_match_rate(df: pd.DataFrame, flag_col: str, z: float = Z_95) -> dict:
+    """
+    層化サンプルから条件マッチ率を推定する
+
+    Args:
+        df: STRATUM_KEY, STRATUM_SIZE列を含むサンプル結果
+        flag_col: マッチ判定（bool）の列名
+        z: 信頼係数（既定は95%）
+
+    Returns:
+        dict: {
+            "rate": float, "ci_low": float, "ci_high": float,  # 推定マッチ率
+            "estimated_matches": int, "population": int,      # 母集団への外挿
+            "sample_size": int                                 # 実際のサンプル件数
+        }
+    """
+    est = _stratified_proportion(df, df[flag_col].fillna(False).astype(bool), z)
+    return {
+        "rate": est["share"],
+        "ci_low": est["ci_low"],
+        "ci_high": est["ci_high"],
+        "estimated_matches": round(est["share"] * est["population"]),
+        "population": est["population"],
+        "sample_size": est["sample_size"],
+    }
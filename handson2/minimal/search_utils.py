@@ -0,0 +1,246 @@
+# =========================================================
+# Snowflake Cortex Handson シナリオ#2
+# 検索ユーティリティ - Cortex Search Serviceの一括・キャッシュ付き検索
+# =========================================================
+# 概要: サービスのハンドルを使い回し、複数クエリを並列数を制限して同時に発行する。
+#       応答は (サービス, クエリ, フィルタ, 列, 件数) ごとにTTL付きでキャッシュし、
+#       取引データの商品名と商品マスタの突合のような一括処理はDataFrameで返す。
+#       キャッシュはユーザー間で共有するため、検索結果は常にコピーを返す
+# =========================================================
+
+import json
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+from snowflake.snowpark.context import get_active_session
+
+# 検索サービスの既定の配置先
+DEFAULT_DATABASE = "SNOWRETAIL_DB"
+DEFAULT_SCHEMA = "SNOWRETAIL_SCHEMA"
+
+# ハンズオンの検索サービス（商品マスタはPart1のオプション、ドキュメントはsetup.sqlで作成）
+PRODUCT_SEARCH_SERVICE = "product_master_service"
+DOCUMENT_SEARCH_SERVICE = "snow_retail_search_service"
+
+# 同時に発行するクエリ数の上限
+DEFAULT_MAX_WORKERS = 8
+
+# キャッシュの有効期間（秒）と上限件数
+DEFAULT_TTL_SEC = 600
+MAX_CACHE_ENTRIES = 4096
+
+# プロセス内で共有するハンドルとキャッシュ
+_lock = threading.Lock()
+_services = {}                    # (database, schema, service) -> CortexSearchServiceResource
+_cache = OrderedDict()            # キャッシュキー -> (有効期限, 検索結果のリスト)
+_stats = {"queries": 0, "hits": 0}
+
+
+def _get_session():
+    """Snowflakeセッションを取得"""
+    return get_active_session()
+
+
+def is_search_service_available(service_name: str, session=None) -> bool:
+    """
+    検索サービスが作成済みか
+
+    Args:
+        service_name: 検索サービス名
+        session: Snowflakeセッション（省略可）
+
+    Returns:
+        bool: 存在する場合True
+    """
+    if session is None:
+        session = _get_session()
+    try:
+        rows = session.sql(f"SHOW CORTEX SEARCH SERVICES LIKE '{service_name}'").collect()
+        return len(rows) > 0
+    except:
+        return False
+
+
+def _copy_results(results: list) -> list:
+    """検索結果のコピーを作成する（共有キャッシュを呼び出し側の変更から守る）"""
+    return [dict(hit) for hit in results]
+
+
+def get_search_service(service_name: str, session=None,
+                       database: str = DEFAULT_DATABASE, schema: str = DEFAULT_SCHEMA):
+    """
+    Cortex Search Serviceのハンドルを取得する（初回のみ作成して使い回す）
+
+    Args:
+        service_name: 検索サービス名
+        session: Snowflakeセッション（省略可）
+        database: データベース名
+        schema: スキーマ名
+
+    Returns:
+        CortexSearchServiceResource: 検索サービスのハンドル
+    """
+    key = (database.lower(), schema.lower(), service_name.lower())
+    with _lock:
+        if key in _services:
+            return _services[key]
+    if session is None:
+        session = _get_session()
+
+    from snowflake.core import Root
+
+    service = Root(session).databases[key[0]].schemas[key[1]].cortex_search_services[key[2]]
+    with _lock:
+        return _services.setdefault(key, service)
+
+
+def _cache_key(service_name: str, query: str, columns: list, filter: dict, limit: int) -> tuple:
+    """キャッシュキーを作成する（フィルタは順序に依存しないJSON文字列にする）"""
+    filter_key = json.dumps(filter, sort_keys=True, ensure_ascii=False) if filter else ""
+    return (service_name.lower(), query, tuple(columns), filter_key, limit)
+
+
+def _get_cached(key: tuple):
+    """有効期限内のキャッシュを取得する"""
+    with _lock:
+        _stats["queries"] += 1
+        entry = _cache.get(key)
+        if entry is None:
+            return None
+        if entry[0] < time.time():
+            del _cache[key]
+            return None
+        _cache.move_to_end(key)
+        _stats["hits"] += 1
+        return _copy_results(entry[1])
+
+
+def _put_cached(key: tuple, results: list, ttl_sec: int):
+    """キャッシュに追加する（上限を超えたら古いものから破棄）"""
+    with _lock:
+        _cache[key] = (time.time() + ttl_sec, _copy_results(results))
+        _cache.move_to_end(key)
+        while len(_cache) > MAX_CACHE_ENTRIES:
+            _cache.popitem(last=False)
+
+
+def search(service_name: str, query: str, columns: list, filter: dict = None, limit: int = 5,
+           session=None, ttl_sec: int = DEFAULT_TTL_SEC) -> list:
+    """
+    1件のクエリで検索する（キャッシュを経由）
+
+    Args:
+        service_name: 検索サービス名
+        query: 検索クエリ
+        columns: 取得する列
+        filter: 属性フィルタ（省略可）
+        limit: 取得件数
+        session: Snowflakeセッション（省略可）
+        ttl_sec: キャッシュの有効期間（秒）
+
+    Returns:
+        list: 検索結果（列名をキーとする辞書）のリスト（キャッシュとは別のコピー）
+    """
+    key = _cache_key(service_name, query, columns, filter, limit)
+    cached = _get_cached(key)
+    if cached is not None:
+        return cached
+
+    service = get_search_service(service_name, session)
+    params = {"query": query, "columns": columns, "limit": limit}
+    if filter:
+        params["filter"] = filter
+    # 応答のresultsをそのまま使う（JSON文字列への変換と再パースは行わない）
+    results = list(service.search(**params).results)
+    _put_cached(key, results, ttl_sec)
+    return results
+
+
+def search_many(service_name: str, queries: list, columns: list, filter: dict = None, limit: int = 5,
+                session=None, max_workers: int = DEFAULT_MAX_WORKERS,
+                ttl_sec: int = DEFAULT_TTL_SEC) -> dict:
+    """
+    複数のクエリを並列に検索する（重複クエリは1回だけ発行）
+
+    Args:
+        service_name: 検索サービス名
+        queries: 検索クエリのリスト
+        columns: 取得する列
+        filter: 属性フィルタ（省略可）
+        limit: クエリごとの取得件数
+        session: Snowflakeセッション（省略可）
+        max_workers: 同時に発行するクエリ数の上限
+        ttl_sec: キャッシュの有効期間（秒）
+
+    Returns:
+        dict: {クエリ: 検索結果のリスト}
+    """
+    if session is None:
+        session = _get_session()
+    unique_queries = list(dict.fromkeys(queries))
+
+    # スレッドを起動する前にハンドルを作成しておく
+    get_search_service(service_name, session)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        results = executor.map(
+            lambda query: search(service_name, query, columns, filter, limit, session, ttl_sec),
+            unique_queries,
+        )
+        return dict(zip(unique_queries, results))
+
+
+def search_to_dataframe(service_name: str, queries: list, columns: list, filter: dict = None,
+                        limit: int = 1, session=None, max_workers: int = DEFAULT_MAX_WORKERS,
+                        ttl_sec: int = DEFAULT_TTL_SEC) -> pd.DataFrame:
+    """
+    複数のクエリを並列に検索し、結果を1つのDataFrameにまとめる
+
+    取引データの商品名を商品マスタの検索サービスで一括突合する用途を想定。
+
+    Args:
+        service_name: 検索サービス名
+        queries: 検索クエリのリスト
+        columns: 取得する列
+        filter: 属性フィルタ（省略可）
+        limit: クエリごとの取得件数
+        session: Snowflakeセッション（省略可）
+        max_workers: 同時に発行するクエリ数の上限
+        ttl_sec: キャッシュの有効期間（秒）
+
+    Returns:
+        DataFrame: QUERY, RANK（1始まり）と取得列。結果のないクエリは取得列がNaNの1行
+    """
+    results = search_many(service_name, queries, columns, filter, limit, session, max_workers, ttl_sec)
+    rows = []
+    for query, hits in results.items():
+        if not hits:
+            rows.append({"QUERY": query, "RANK": None})
+        for rank, hit in enumerate(hits, start=1):
+            rows.append({"QUERY": query, "RANK": rank, **hit})
+    df = pd.DataFrame(rows, columns=["QUERY", "RANK"] + list(columns))
+    df["RANK"] = df["RANK"].astype("Int64")
+    return df
+
+
+def get_search_cache_stats() -> dict:
+    """
+    検索キャッシュのヒット率を取得する
+
+    Returns:
+        dict: {"queries": int, "hits": int, "hit_rate": float, "entries": int}
+    """
+    with _lock:
+        stats = dict(_stats, entries=len(_cache))
+    stats["hit_rate"] = stats["hits"] / stats["queries"] if stats["queries"] else 0.0
+    return stats
+
+
+def clear_search_cache():
+    """検索キャッシュと統計を破棄する（サービスのハンドルは保持）"""
+    with _lock:
+        _cache.clear()
+        _stats.update(queries=0, hits=0)
@@ -0,0 +1,305 @@
+# =========================================================
+# Snowflake Cortex Handson シナリオ#2
+# ストレージユーティリティ - レビュー／チャンクの正規化レイアウト
+# =========================================================
+# 概要: CUSTOMER_ANALYSISはチャンクごとにレビュー属性を複製して保持するため、
+#       レビュー単位のREVIEW_ANALYSISとチャンク単位のREVIEW_CHUNKSに分割し、
+#       互換ビューCUSTOMER_ANALYSISで既存クエリを動作させる
+# =========================================================
+
+import time
+
+from snowflake.snowpark.context import get_active_session
+
+# 正規化レイアウトのテーブル
+REVIEW_TABLE = "REVIEW_ANALYSIS"
+CHUNK_TABLE = "REVIEW_CHUNKS"
+COMPAT_VIEW = "CUSTOMER_ANALYSIS"
+WIDE_BACKUP_TABLE = "CUSTOMER_ANALYSIS_WIDE_BACKUP"
+
+# テーブル作成文（新規環境は既存を再利用、移行時は既存テーブルがあればエラーにする）
+CREATE_IF_NOT_EXISTS = "CREATE TABLE IF NOT EXISTS"
+CREATE_NEW = "CREATE TABLE"
+
+# 計測用のクエリ単位のパラメータ（結果キャッシュを使わない）
+NO_RESULT_CACHE = {"USE_CACHED_RESULT": False}
+
+# レビュー単位の属性と感情スコア
+REVIEW_TABLE_DDL = f"""
+{{create}} {REVIEW_TABLE} (
+    review_id VARCHAR(20),
+    product_id VARCHAR(10),
+    customer_id VARCHAR(10),
+    rating NUMBER(2,1),
+    review_text TEXT,
+    review_date TIMESTAMP_NTZ,
+    purchase_channel VARCHAR(20),
+    helpful_votes NUMBER(5),
+    sentiment_score FLOAT,
+    updated_at TIMESTAMP_NTZ DEFAULT CURRENT_TIMESTAMP()
+)
+"""
+
+# チャンク単位のテキストと埋め込み（レビュー属性は持たない）
+# chunk_idの採番開始値は移行時に既存のanalysis_idの最大値より大きくする
+CHUNK_TABLE_DDL = f"""
+{{create}} {CHUNK_TABLE} (
+    chunk_id NUMBER AUTOINCREMENT START {{start}} INCREMENT 1,
+    review_id VARCHAR(20),
+    chunk_index NUMBER(5),
+    chunked_text TEXT,
+    embedding VECTOR(FLOAT, 1024),
+    updated_at TIMESTAMP_NTZ DEFAULT CURRENT_TIMESTAMP()
+)
+"""
+
+# 既存のCUSTOMER_ANALYSISと同じ列構成の互換ビュー
+COMPAT_VIEW_DDL = f"""
+CREATE OR REPLACE VIEW {COMPAT_VIEW} AS
+SELECT
+    c.chunk_id AS analysis_id,
+    r.review_id,
+    r.product_id,
+    r.customer_id,
+    r.rating,
+    r.review_text,
+    r.review_date,
+    r.purchase_channel,
+    r.helpful_votes,
+    c.chunked_text,
+    c.embedding,
+    r.sentiment_score,
+    c.updated_at
+FROM {CHUNK_TABLE} c
+JOIN {REVIEW_TABLE} r ON c.review_id = r.review_id
+"""
+
+# 移行前後で比較するクエリ（名称: (ワイドレイアウト, 正規化レイアウト)）
+BENCHMARK_QUERIES = {
+    "処理済みレビュー数": (
+        f"SELECT COUNT(DISTINCT review_id) FROM {WIDE_BACKUP_TABLE}",
+        f"SELECT COUNT(*) FROM {REVIEW_TABLE}",
+    ),
+    "感情スコア分布": (
+        f"""SELECT sentiment_score, COUNT(DISTINCT review_id) FROM {WIDE_BACKUP_TABLE}
+            GROUP BY sentiment_score ORDER BY sentiment_score""",
+        f"""SELECT sentiment_score, COUNT(*) FROM {REVIEW_TABLE}
+            GROUP BY sentiment_score ORDER BY sentiment_score""",
+    ),
+    "処理統計": (
+        f"""SELECT COUNT(DISTINCT review_id), COUNT(*), AVG(sentiment_score)
+            FROM {WIDE_BACKUP_TABLE}""",
+        f"""SELECT COUNT(*), (SELECT COUNT(*) FROM {CHUNK_TABLE}), AVG(sentiment_score)
+            FROM {REVIEW_TABLE}""",
+    ),
+}
+
+
+def _get_session():
+    """Snowflakeセッションを取得"""
+    return get_active_session()
+
+
+def is_normalized_layout(session=None, tables: set = None) -> bool:
+    """
+    正規化レイアウト（REVIEW_ANALYSIS / REVIEW_CHUNKS）が使用されているか
+
+    Args:
+        session: Snowflakeセッション（省略可）
+        tables: スキーマ内のテーブル名の一覧（table_utils.get_table_names()の結果・省略時は存在確認クエリを発行する）
+
+    Returns:
+        bool: 両テーブルが存在する場合True
+    """
+    if tables is not None:
+        return REVIEW_TABLE in tables and CHUNK_TABLE in tables
+    if session is None:
+        session = _get_session()
+    try:
+        session.sql(f"SELECT 1 FROM {REVIEW_TABLE} LIMIT 1").collect()
+        session.sql(f"SELECT 1 FROM {CHUNK_TABLE} LIMIT 1").collect()
+        return True
+    except:
+        return False
+
+
+def create_normalized_layout(session=None):
+    """
+    正規化レイアウトのテーブルと互換ビューを作成する（新規環境用）
+
+    Args:
+        session: Snowflakeセッション（省略可）
+    """
+    if session is None:
+        session = _get_session()
+    session.sql(REVIEW_TABLE_DDL.format(create=CREATE_IF_NOT_EXISTS)).collect()
+    session.sql(CHUNK_TABLE_DDL.format(create=CREATE_IF_NOT_EXISTS, start=1)).collect()
+    session.sql(COMPAT_VIEW_DDL).collect()
+
+
+def get_table_bytes(session, table_names: list) -> dict:
+    """
+    テーブルのストレージ使用量（バイト）を取得する
+
+    Args:
+        session: Snowflakeセッション
+        table_names: テーブル名のリスト
+
+    Returns:
+        dict: {テーブル名: バイト数}
+    """
+    names = ", ".join(f"'{name.upper()}'" for name in table_names)
+    rows = session.sql(f"""
+        SELECT table_name, COALESCE(bytes, 0) AS bytes
+        FROM INFORMATION_SCHEMA.TABLES
+        WHERE table_schema = CURRENT_SCHEMA()
+          AND table_name IN ({names})
+    """).collect()
+    return {row['TABLE_NAME']: row['BYTES'] for row in rows}
+
+
+def time_query(session, query: str, repeat: int = 3, params: list = None) -> float:
+    """
+    クエリの最速実行時間（秒）を計測する
+
+    結果キャッシュはクエリ単位のパラメータで無効化する（セッションの設定は変更しない）。
+
+    Args:
+        session: Snowflakeセッション
+        query: 計測するクエリ
+        repeat: 実行回数（最速値を採用）
+        params: バインド変数（省略可）
+
+    Returns:
+        float: 最速の実行時間（秒）
+    """
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        session.sql(query, params=params).collect(statement_params=NO_RESULT_CACHE)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def benchmark_layouts(session=None, repeat: int = 3) -> list:
+    """
+    ワイドレイアウト（バックアップ）と正規化レイアウトのクエリ時間を比較する
+
+    Args:
+        session: Snowflakeセッション（省略可）
+        repeat: 各クエリの実行回数（最速値を採用）
+
+    Returns:
+        list: [{"query", "wide_sec", "normalized_sec", "speedup"}]
+    """
+    if session is None:
+        session = _get_session()
+
+    results = []
+    # 結果キャッシュはtime_query()でクエリ単位に無効化する（共有セッションの設定は変更しない）
+    for name, (wide_query, normalized_query) in BENCHMARK_QUERIES.items():
+        wide_sec = time_query(session, wide_query, repeat)
+        normalized_sec = time_query(session, normalized_query, repeat)
+        results.append({
+            "query": name,
+            "wide_sec": wide_sec,
+            "normalized_sec": normalized_sec,
+            "speedup": wide_sec / normalized_sec if normalized_sec else None,
+        })
+    return results
+
+
+def migrate_to_normalized_layout(session=None, benchmark: bool = True) -> dict:
+    """
+    ワイドなCUSTOMER_ANALYSISテーブルを正規化レイアウトへ移行する
+
+    新しいテーブルを作成・投入した後に、元のテーブルをCUSTOMER_ANALYSIS_WIDE_BACKUPに
+    改名して同名の互換ビューを作成する。途中で失敗した場合は作成したテーブルを削除し、
+    元のテーブルをCUSTOMER_ANALYSISに戻す。
+    チャンクは元のanalysis_idをchunk_idとして引き継ぎ、以降の採番はその最大値の次から行う。
+    移行中に追加された行は移行されないため、レビュー処理を実行していない時に実行すること。
+
+    Args:
+        session: Snowflakeセッション（省略可）
+        benchmark: 移行後にクエリ時間を比較するか
+
+    Returns:
+        dict: {
+            "reviews": int, "chunks": int,          # 移行件数
+            "bytes_before": int, "bytes_after": int, "bytes_saved": int,
+            "benchmark": list                       # benchmark_layouts()の結果
+        }
+    """
+    if session is None:
+        session = _get_session()
+
+    if is_normalized_layout(session):
+        raise ValueError("既に正規化レイアウトに移行済みです。")
+
+    max_id = session.sql(
+        f"SELECT COALESCE(MAX(analysis_id), 0) AS max_id FROM {COMPAT_VIEW}"
+    ).collect()[0]['MAX_ID']
+
+    created, renamed = [], False
+    try:
+        # 新しいテーブルを作成（既存のテーブルがある場合はエラーにして上書きしない）
+        session.sql(REVIEW_TABLE_DDL.format(create=CREATE_NEW)).collect()
+        created.append(REVIEW_TABLE)
+        session.sql(CHUNK_TABLE_DDL.format(create=CREATE_NEW, start=int(max_id) + 1)).collect()
+        created.append(CHUNK_TABLE)
+
+        # レビュー単位の属性は1レビュー1行に集約
+        session.sql(f"""
+            INSERT INTO {REVIEW_TABLE} (
+                review_id, product_id, customer_id, rating, review_text,
+                review_date, purchase_channel, helpful_votes, sentiment_score, updated_at
+            )
+            SELECT
+                review_id,
+                ANY_VALUE(product_id), ANY_VALUE(customer_id), ANY_VALUE(rating),
+                ANY_VALUE(review_text), ANY_VALUE(review_date), ANY_VALUE(purchase_channel),
+                ANY_VALUE(helpful_votes), ANY_VALUE(sentiment_score), MAX(updated_at)
+            FROM {COMPAT_VIEW}
+            GROUP BY review_id
+        """).collect()
+
+        # チャンクは元のanalysis_idを引き継ぐ（埋め込みストアなどの参照を維持する）
+        session.sql(f"""
+            INSERT INTO {CHUNK_TABLE} (chunk_id, review_id, chunk_index, chunked_text, embedding, updated_at)
+            SELECT
+                analysis_id,
+                review_id,
+                ROW_NUMBER() OVER (PARTITION BY review_id ORDER BY analysis_id) - 1,
+                chunked_text,
+                embedding,
+                updated_at
+            FROM {COMPAT_VIEW}
+        """).collect()
+
+        # 最後に元のテーブルを退避して互換ビューに置き換える
+        session.sql(f"ALTER TABLE {COMPAT_VIEW} RENAME TO {WIDE_BACKUP_TABLE}").collect()
+        renamed = True
+        session.sql(COMPAT_VIEW_DDL).collect()
+    except:
+        if renamed:
+            session.sql(f"ALTER TABLE {WIDE_BACKUP_TABLE} RENAME TO {COMPAT_VIEW}").collect()
+        for table in reversed(created):
+            session.sql(f"DROP TABLE IF EXISTS {table}").collect()
+        raise
+
+    reviews = session.sql(f"SELECT COUNT(*) AS cnt FROM {REVIEW_TABLE}").collect()[0]['CNT']
+    chunks = session.sql(f"SELECT COUNT(*) AS cnt FROM {CHUNK_TABLE}").collect()[0]['CNT']
+
+    table_bytes = get_table_bytes(session, [WIDE_BACKUP_TABLE, REVIEW_TABLE, CHUNK_TABLE])
+    bytes_before = table_bytes.get(WIDE_BACKUP_TABLE, 0)
+    bytes_after = table_bytes.get(REVIEW_TABLE, 0) + table_bytes.get(CHUNK_TABLE, 0)
+
+    return {
+        "reviews": reviews,
+        "chunks": chunks,
+        "bytes_before": bytes_before,
+        "bytes_after": bytes_after,
+        "bytes_saved": bytes_before - bytes_after,
+        "benchmark": benchmark_layouts(session) if benchmark else [],
+    }
@@ -3,8 +3,14 @@
 # テーブルユーティリティ - フォールバック機能
 # =========================================================
 # 概要: Part1の成果物テーブルが存在しない場合、自動的にフォールバックテーブルを参照
+#       参照先はスキーマ内のテーブル一覧（INFORMATION_SCHEMA.TABLES）を1回読み込んで判定し、
+#       プロセス内で一定時間共有する（テーブルごとの存在確認クエリは発行しない）。
+#       テーブル一覧が唯一の判定基準で、テーブルの作成・SWAP後は判定し直す
 # =========================================================
 
+import threading
+import time
+
 from snowflake.snowpark.context import get_active_session
 
 # フォールバックテーブルのマッピング
@@ -16,19 +22,98 @@ FALLBACK_TABLE_MAPPING = {
     "RETAIL_DATA_WITH_PRODUCT_MASTER": "RETAIL_DATA_WITH_PRODUCT_MASTER_FALLBACK",
 }
 
+# テーブル一覧の再読み込み間隔（秒）
+RESOLUTION_TTL_SEC = 300
+
+# プロセス内で共有する判定結果（Streamlitの再実行・ユーザー間で共有される）
+_lock = threading.Lock()
+_resolution = {"entries": None, "tables": None, "loaded_at": 0.0}
+
 
 def _get_session():
     """Snowflakeセッションを取得"""
     return get_active_session()
 
 
-def _table_exists(session, table_name: str) -> bool:
-    """テーブルの存在確認（内部用）"""
+def _list_tables(session) -> set:
+    """現在のスキーマのテーブル・ビュー名の一覧を1回のクエリで取得する（内部用）"""
     try:
-        session.sql(f"SELECT 1 FROM {table_name} LIMIT 1").collect()
-        return True
+        rows = session.sql("""
+            SELECT table_name FROM INFORMATION_SCHEMA.TABLES
+            WHERE table_schema = CURRENT_SCHEMA()
+        """).collect()
+        return {row['TABLE_NAME'] for row in rows}
     except:
-        return False
+        return set()
+
+
+def _resolve_entry(table_name: str, fallback_table: str, tables: set) -> dict:
+    """テーブル一覧から1テーブルの参照先を判定する（内部用）"""
+    original_exists = table_name in tables
+    is_fallback = not original_exists and fallback_table in tables
+    return {
+        "exists": original_exists or is_fallback,
+        "actual_table": fallback_table if is_fallback else table_name,
+        "is_fallback": is_fallback,
+        "original_exists": original_exists
+    }
+
+
+def _resolve_from_tables(tables: set) -> dict:
+    """テーブル一覧からフォールバックの判定結果を作成する（内部用）"""
+    return {
+        table_name: _resolve_entry(table_name, fallback_table, tables)
+        for table_name, fallback_table in FALLBACK_TABLE_MAPPING.items()
+    }
+
+
+def _load_resolution(session, refresh: bool = False) -> tuple:
+    """テーブル一覧を取得して参照先を判定する（一定間隔でのみ再読み込み・内部用）"""
+    with _lock:
+        if (not refresh and _resolution["entries"] is not None
+                and time.time() - _resolution["loaded_at"] < RESOLUTION_TTL_SEC):
+            return _resolution["entries"], _resolution["tables"]
+
+    tables = _list_tables(session)
+    entries = _resolve_from_tables(tables)
+
+    with _lock:
+        _resolution.update(entries=entries, tables=tables, loaded_at=time.time())
+    return entries, tables
+
+
+def refresh_table_resolution(session=None) -> dict:
+    """
+    テーブルの参照先を判定し直す（テーブルの作成・SWAP後に呼び出す）
+
+    テーブル一覧を読み込み直し、プロセス内の判定結果を更新する。
+
+    Args:
+        session: Snowflakeセッション（省略可）
+
+    Returns:
+        dict: {元のテーブル名: check_table_with_fallback()と同じ形式の判定結果}
+    """
+    if session is None:
+        session = _get_session()
+    entries, _ = _load_resolution(session, refresh=True)
+    return entries
+
+
+def get_table_names(session=None) -> set:
+    """
+    スキーマ内のテーブル・ビュー名の一覧を返す（プロセス内で共有する一覧・クエリは一定間隔でのみ発行）
+
+    Args:
+        session: Snowflakeセッション（省略可）
+
+    Returns:
+        set: テーブル名（大文字）の集合
+    """
+    if session is None:
+        session = _get_session()
+    _, tables = _load_resolution(session)
+    return tables
 
 
 def resolve_table_name(table_name: str, session=None) -> str:
@@ -48,21 +133,7 @@ def resolve_table_name(table_name: str, session=None) -> str:
         # Part1完了済み: "EC_DATA_WITH_PRODUCT_MASTER"
         # Part1未完了: "EC_DATA_WITH_PRODUCT_MASTER_FALLBACK"
     """
-    if session is None:
-        session = _get_session()
-    
-    # 元のテーブルが存在するか確認
-    if _table_exists(session, table_name):
-        return table_name
-    
-    # フォールバックテーブルがマッピングに存在するか確認
-    if table_name in FALLBACK_TABLE_MAPPING:
-        fallback_table = FALLBACK_TABLE_MAPPING[table_name]
-        if _table_exists(session, fallback_table):
-            return fallback_table
-    
-    # どちらも存在しない場合は元のテーブル名を返す（エラーハンドリングは呼び出し元で）
-    return table_name
+    return check_table_with_fallback(table_name, session)["actual_table"]
 
 
 def check_table_with_fallback(table_name: str, session=None) -> dict:
@@ -84,34 +155,19 @@ def check_table_with_fallback(table_name: str, session=None) -> dict:
     if session is None:
         session = _get_session()
     
-    original_exists = _table_exists(session, table_name)
-    
-    if original_exists:
-        return {
-            "exists": True,
-            "actual_table": table_name,
-            "is_fallback": False,
-            "original_exists": True
-        }
+    entries, tables = _load_resolution(session)
     
-    # フォールバックを確認
-    if table_name in FALLBACK_TABLE_MAPPING:
-        fallback_table = FALLBACK_TABLE_MAPPING[table_name]
-        fallback_exists = _table_exists(session, fallback_table)
-        
-        if fallback_exists:
-            return {
-                "exists": True,
-                "actual_table": fallback_table,
-                "is_fallback": True,
-                "original_exists": False
-            }
+    # フォールバック対象のテーブルは判定済みの参照先を返す
+    if table_name in entries:
+        return dict(entries[table_name])
     
+    # フォールバック対象外のテーブルはテーブル一覧で確認
+    exists = table_name.upper() in tables
     return {
-        "exists": False,
+        "exists": exists,
         "actual_table": table_name,
         "is_fallback": False,
-        "original_exists": False
+        "original_exists": exists
     }
 
 
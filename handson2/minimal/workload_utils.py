@@ -0,0 +1,319 @@
+# =========================================================
+# Snowflake Cortex Handson シナリオ#2
+# ワークロードユーティリティ - ウェアハウスの振り分けとクエリタグ
+# =========================================================
+# 概要: クエリをメタデータ参照・画面描画用の集計・AI分析バッチ・前処理の
+#       4種類に分類し、setup_workload_routing.sql の対応表に従って種類ごとの
+#       ウェアハウスで実行する。各クエリにはアプリ・種類・セクション・ユーザーを
+#       クエリ単位のQUERY_TAGとして付与し、種類ごとのコストを集計できるようにする。
+#       Snowparkセッションは全ユーザーで共有されるため、セッションのウェアハウスは
+#       画面描画用に固定し、他の種類のクエリは発行の間だけ切り替える
+# =========================================================
+
+import functools
+import json
+import re
+import threading
+import time
+from contextlib import contextmanager
+
+from snowflake.snowpark.context import get_active_session
+
+# ワークロードの種類
+METADATA = "metadata"
+DASHBOARD = "dashboard"
+AI_BATCH = "ai_batch"
+PREPROCESSING = "preprocessing"
+
+WORKLOADS = [METADATA, DASHBOARD, AI_BATCH, PREPROCESSING]
+
+# ワークロードとウェアハウスの対応表（setup_workload_routing.sql）
+WORKLOAD_TABLE = "WORKLOAD_WAREHOUSES"
+
+# QUERY_TAGのアプリ名（WORKLOAD_COST_BY_CLASSビューの抽出条件）
+APP_NAME = "snowretail_voc"
+
+# 対応表の再読み込み間隔（秒）
+CONFIG_TTL_SEC = 300
+
+# 分類に使うCortex関数（書き込みを伴うものは前処理、読み取りのみのものはAI分析バッチ）
+CORTEX_FUNCTION_PATTERN = re.compile(
+    r"\b(AI_[A-Z_]+|COMPLETE|TRANSLATE|SENTIMENT|SUMMARIZE|SPLIT_TEXT_RECURSIVE_CHARACTER|EMBED_TEXT_\d+)\s*\("
+)
+WRITE_PATTERN = re.compile(r"^(INSERT|MERGE|UPDATE|DELETE|COPY|CALL) ")
+
+# プロセス内で共有する対応表と、セッションの既定のウェアハウス
+# （StreamlitのセッションはSnowparkセッションを共有するため、セッションの設定は全ユーザーで共通）
+_lock = threading.Lock()
+_switch_lock = threading.Lock()  # ウェアハウスを切り替えてクエリを発行する間は他の切り替えを待たせる
+_config = {"warehouses": None, "loaded_at": 0.0}
+_session_state = {}              # id(session) -> {"resting": 既定のウェアハウス}
+
+# 再実行（スクリプトのスレッド）ごとの現在のワークロード・セクション・ユーザー
+_local = threading.local()
+
+
+def _get_session():
+    """Snowflakeセッションを取得"""
+    return get_active_session()
+
+
+def classify_query(query: str) -> str:
+    """
+    クエリのワークロードの種類を判定する
+
+    Args:
+        query: SQL
+
+    Returns:
+        str: METADATA / DASHBOARD / AI_BATCH / PREPROCESSING
+    """
+    text = re.sub(r"\s+", " ", query).strip().upper()
+    if re.match(r"^(SHOW|DESC|DESCRIBE|LIST|LS) ", text) or "INFORMATION_SCHEMA" in text:
+        return METADATA
+    if re.match(r"^SELECT 1 FROM \S+ LIMIT 1$", text):
+        return METADATA
+    if WRITE_PATTERN.match(text):
+        return PREPROCESSING
+    if CORTEX_FUNCTION_PATTERN.search(text):
+        return AI_BATCH
+    return DASHBOARD
+
+
+def get_workload_warehouses(session=None, refresh: bool = False) -> dict:
+    """
+    ワークロードごとの実行先ウェアハウスを取得する（一定間隔でのみ再読み込み）
+
+    Args:
+        session: Snowflakeセッション（省略可）
+        refresh: キャッシュを無視して再読み込みするか
+
+    Returns:
+        dict: {ワークロード: ウェアハウス名}（対応表がない場合は空）
+    """
+    with _lock:
+        if not refresh and _config["warehouses"] is not None and time.time() - _config["loaded_at"] < CONFIG_TTL_SEC:
+            return _config["warehouses"]
+    if session is None:
+        session = _get_session()
+    try:
+        rows = session.sql(f"SELECT workload, warehouse_name FROM {WORKLOAD_TABLE}").collect()
+        warehouses = {row['WORKLOAD']: row['WAREHOUSE_NAME'] for row in rows if row['WAREHOUSE_NAME']}
+    except:
+        # 対応表が未作成の場合はアプリのQUERY_WAREHOUSEのまま実行する
+        warehouses = {}
+    with _lock:
+        _config.update(warehouses=warehouses, loaded_at=time.time())
+    return warehouses
+
+
+def _get_user() -> str:
+    """クエリタグに記録するユーザー名（アプリを閲覧しているユーザー）を取得する"""
+    try:
+        import streamlit as st
+        user = getattr(st, "user", None) or st.experimental_user
+        return user.get("user_name") or user.get("email") or "unknown"
+    except:
+        return "unknown"
+
+
+def _tag(workload: str, section: str, user: str) -> str:
+    """QUERY_TAGの文字列を作成する（内部用）"""
+    return json.dumps({"app": APP_NAME, "workload": workload, "section": section, "user": user}, ensure_ascii=False)
+
+
+def _same_warehouse(a: str, b: str) -> bool:
+    """ウェアハウス名が同じか（引用符・大文字小文字を区別しない・内部用）"""
+    return (a or "").strip('"').upper() == (b or "").strip('"').upper()
+
+
+def _get_resting_warehouse(session) -> str:
+    """
+    セッションの既定のウェアハウスを取得する（初回のみ設定・内部用）
+
+    既定のウェアハウスは画面描画用の集計のウェアハウス（対応表にない場合はアプリのQUERY_WAREHOUSE）とし、
+    種類を指定しないクエリはここで実行する。セッションのQUERY_TAGも全ユーザー共通の値にする。
+    """
+    key = id(session)
+    with _lock:
+        current = _session_state.get(key)
+    if current:
+        return current["resting"]
+    with _switch_lock:
+        with _lock:
+            current = _session_state.get(key)
+        if current:
+            return current["resting"]
+        home = session.get_current_warehouse()
+        resting = get_workload_warehouses(session).get(DASHBOARD) or home
+        if resting and not _same_warehouse(resting, home):
+            session.use_warehouse(resting)
+        session.query_tag = _tag(DASHBOARD, "", "")
+        with _lock:
+            _session_state[key] = {"resting": resting}
+    return resting
+
+
+def _current() -> dict:
+    """この再実行の現在のワークロード・セクション・ユーザー（内部用）"""
+    return getattr(_local, "current", None) or {"workload": DASHBOARD, "section": "", "user": None}
+
+
+def execute(session, dataframe, workload: str, section: str, user: str = None,
+            statement_params: dict = None) -> list:
+    """
+    1つのクエリを指定したワークロードのウェアハウスで実行する
+
+    セッションは全ユーザーで共有されるため、ウェアハウスの切り替えはクエリの発行（非同期）までの間だけ行い、
+    発行後すぐに既定のウェアハウスへ戻す（クエリは発行時点のウェアハウスで実行される）。
+    QUERY_TAGはセッションではなくクエリ単位のパラメータとして付与する。
+
+    Args:
+        session: Snowflakeセッション
+        dataframe: session.sql()の戻り値
+        workload: ワークロードの種類
+        section: クエリタグに記録するセクション名
+        user: クエリタグに記録するユーザー名（省略時は閲覧中のユーザー）
+        statement_params: クエリ単位のその他のパラメータ（省略可）
+
+    Returns:
+        list: Rowのリスト
+    """
+    if workload not in WORKLOADS:
+        raise ValueError(f"未知のワークロードです: {workload}")
+    statement_params = dict(statement_params or {}, QUERY_TAG=_tag(workload, section, user or _get_user()))
+    resting = _get_resting_warehouse(session)
+    warehouse = get_workload_warehouses(session).get(workload)
+    if not warehouse or _same_warehouse(warehouse, resting):
+        return dataframe.collect(statement_params=statement_params)
+    with _switch_lock:
+        session.use_warehouse(warehouse)
+        try:
+            job = dataframe.collect_nowait(statement_params=statement_params)
+        finally:
+            session.use_warehouse(resting)
+    return job.result()
+
+
+class _RoutedDataFrame:
+    """session.sql()の戻り値の代替（collect時にワークロードのウェアハウスで実行する）"""
+
+    def __init__(self, routed_session, dataframe):
+        self._routed = routed_session
+        self._dataframe = dataframe
+
+    def collect(self, statement_params: dict = None) -> list:
+        r = self._routed
+        return execute(r.session, self._dataframe, r.workload, r.section, r.user, statement_params)
+
+    def to_pandas(self):
+        import pandas as pd
+        return pd.DataFrame([row.as_dict() for row in self.collect()])
+
+    def __getattr__(self, name):
+        return getattr(self._dataframe, name)
+
+
+class RoutedSession:
+    """
+    sql()で作成したクエリを指定したワークロードとして実行するセッション
+
+    ユーティリティ関数の session 引数に渡して使う。sql() 以外の操作は元のセッションで実行する。
+    """
+
+    def __init__(self, session, workload: str, section: str, user: str = None):
+        if workload not in WORKLOADS:
+            raise ValueError(f"未知のワークロードです: {workload}")
+        self.session = session
+        self.workload = workload
+        self.section = section
+        self.user = user
+
+    def sql(self, query: str, params: list = None) -> _RoutedDataFrame:
+        return _RoutedDataFrame(self, self.session.sql(query, params=params))
+
+    def __getattr__(self, name):
+        return getattr(self.session, name)
+
+
+def use_workload(session, workload: str, section: str, user: str = None):
+    """
+    この再実行の既定のワークロードとセクションを設定する（ページ単位の既定値）
+
+    セッションの設定は変更せず、run_query() でワークロードを判定・記録する際の既定値として使う。
+
+    Args:
+        session: Snowflakeセッション
+        workload: ワークロードの種類
+        section: クエリタグに記録するセクション名
+        user: クエリタグに記録するユーザー名（省略時は閲覧中のユーザー）
+    """
+    if workload not in WORKLOADS:
+        raise ValueError(f"未知のワークロードです: {workload}")
+    _get_resting_warehouse(session)
+    _local.current = {"workload": workload, "section": section, "user": user}
+
+
+@contextmanager
+def route(session, workload: str, section: str, user: str = None):
+    """
+    ブロック内で指定したワークロードとして実行するセッションを返す（終了時に既定値を元に戻す）
+
+    Example:
+        >>> with route(session, AI_BATCH, "セクション4") as ai_session:
+        ...     hierarchical_aggregate(..., session=ai_session)
+
+    Args:
+        session: Snowflakeセッション
+        workload: ワークロードの種類
+        section: クエリタグに記録するセクション名
+        user: クエリタグに記録するユーザー名（省略可）
+    """
+    previous = getattr(_local, "current", None)
+    use_workload(session, workload, section, user)
+    try:
+        yield RoutedSession(session, workload, section, user)
+    finally:
+        _local.current = previous
+
+
+def routed(workload: str, section: str, session=None):
+    """
+    関数内の既定のワークロードとセクションを設定するデコレータ
+
+    Streamlitのフラグメント（セクション）単位で既定値を切り替える用途を想定。
+    関数内のクエリは run_query() で種類を判定して実行する。
+
+    Args:
+        workload: ワークロードの種類
+        section: クエリタグに記録するセクション名
+        session: Snowflakeセッション（省略時は呼び出し時のアクティブセッション）
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with route(session or _get_session(), workload, section):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def run_query(session, query: str, section: str = None, params: list = None, workload: str = None) -> list:
+    """
+    クエリを分類し、対応するウェアハウスで実行する
+
+    Args:
+        session: Snowflakeセッション
+        query: SQL
+        section: クエリタグに記録するセクション名（省略時は現在のセクション）
+        params: バインド変数（省略可）
+        workload: ワークロードの種類（省略時はclassify_queryで判定）
+
+    Returns:
+        list: Rowのリスト
+    """
+    current = _current()
+    return execute(
+        session, session.sql(query, params=params), workload or classify_query(query),
+        section or current["section"], current["user"]
+    )
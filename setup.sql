@@ -279,3 +279,30 @@ SELECT 'setup successfully' AS status;
 -- ★Part1をスキップする場合:
 -- Part2のアプリは自動的にフォールバックテーブルを参照するため、
 -- Part1を実行しなくてもPart2を体験できます。
+-- 
+-- ★レビュー特徴量を自動更新する場合:
+-- setup_feature_pipeline.sql を実行すると、翻訳・感情スコア・カテゴリ・
+-- チャンク埋め込みがDynamic Tableで自動更新され、アプリはその値を参照します。
+-- 
+-- ★売上の事前集計を作成する場合:
+-- Part1 完了後に setup_sales_rollups.sql を実行してください。
+-- 日別・月別の売上集計テーブル（SALES_DAILY_ROLLUP / SALES_MONTHLY_ROLLUP）を作成し、
+-- ステージ上の sales_analysis_model.yaml をそれらを参照するモデルに置き換えるため、
+-- Cortex Analyst の集計系の質問が取引明細を走査しなくなります。
+-- 
+-- ★社内ドキュメントをチャンク単位で検索する場合:
+-- setup_document_index.sql を実行すると、SNOW_RETAIL_DOCUMENTS をチャンクに分割した
+-- SNOW_RETAIL_DOCUMENT_CHUNKS に対して snow_retail_search_service が作り直され、
+-- 更新されたドキュメントのみが再分割・再埋め込みされます。
+-- 
+-- ★分析結果をファイルで受け取る場合:
+-- Step2 ページの「分析結果をParquetでエクスポート」から、CUSTOMER_ANALYSIS に感情スコア・カテゴリを
+-- 結合した結果を @ANALYSIS_EXPORT_STAGE へ購入チャネル・月ごとの圧縮Parquetとして出力できます。
+-- 
+-- ★重いAI関数の実行と画面表示のウェアハウスを分ける場合:
+-- setup_workload_routing.sql を実行すると、アプリのクエリがメタデータ参照・画面描画用の集計・
+-- AI分析バッチ・前処理の種類ごとに別のウェアハウスで実行され、QUERY_TAG で種類別のコストを集計できます。
+-- 
+-- ★レビューを任意の軸で即時に集計する場合:
+-- setup_feature_pipeline.sql の後に setup_review_cube.sql を実行すると、日付×購入チャネル×カテゴリ×評価×感情帯×商品の
+-- 事前集計 REVIEW_CUBE が増分更新され、Step2 ページの「レビューキューブで絞り込み・集計」から明細を走査せずに集計できます。
@@ -0,0 +1,134 @@
+// =========================================================
+// 社内ドキュメントのチャンク単位インデックス
+// =========================================================
+-- setup.sql 実行後に実行してください。
+-- SNOW_RETAIL_DOCUMENTS の CONTENT を重複ありのチャンクに分割してチャンクテーブルに保持し、
+-- snow_retail_search_service をチャンクテーブルに対して作り直します。
+-- ドキュメントの VERSION / UPDATED_AT が変わった場合のみ、そのドキュメントを再分割します。
+-- 変更のないドキュメントのチャンク行は更新されないため、検索サービスの
+-- リフレッシュでも再埋め込みされません。
+
+USE ROLE ACCOUNTADMIN;
+USE WAREHOUSE COMPUTE_WH;
+USE SCHEMA SNOWRETAIL_DB.SNOWRETAIL_SCHEMA;
+
+
+// Step1: チャンクテーブル //
+
+-- chunk_id は「ドキュメントID-チャンク番号」で、同じ版のドキュメントからは常に同じIDになる
+CREATE TABLE IF NOT EXISTS SNOW_RETAIL_DOCUMENT_CHUNKS (
+    chunk_id VARCHAR(100),
+    document_id VARCHAR(16777216),
+    chunk_index NUMBER(5),
+    title VARCHAR(16777216),
+    content VARCHAR(16777216),
+    document_type VARCHAR(16777216),
+    department VARCHAR(16777216),
+    version NUMBER(38,1),
+    updated_at TIMESTAMP_NTZ(9),
+    chunked_at TIMESTAMP_NTZ DEFAULT CURRENT_TIMESTAMP()
+);
+
+-- 検索サービスの増分リフレッシュのために変更追跡を有効化
+ALTER TABLE SNOW_RETAIL_DOCUMENT_CHUNKS SET CHANGE_TRACKING = TRUE;
+
+
+// Step2: 変更されたドキュメントだけを再分割するプロシージャ //
+
+CREATE OR REPLACE PROCEDURE REFRESH_DOCUMENT_CHUNKS()
+RETURNS VARCHAR
+LANGUAGE SQL
+AS
+$$
+DECLARE
+    removed INTEGER DEFAULT 0;
+    added INTEGER DEFAULT 0;
+BEGIN
+    -- 版（VERSION / UPDATED_AT）が変わった、または削除されたドキュメントのチャンクを削除
+    DELETE FROM SNOW_RETAIL_DOCUMENT_CHUNKS
+    WHERE NOT EXISTS (
+        SELECT 1 FROM SNOW_RETAIL_DOCUMENTS d
+        WHERE d.document_id = SNOW_RETAIL_DOCUMENT_CHUNKS.document_id
+          AND EQUAL_NULL(d.version, SNOW_RETAIL_DOCUMENT_CHUNKS.version)
+          AND EQUAL_NULL(d.updated_at, SNOW_RETAIL_DOCUMENT_CHUNKS.updated_at)
+    );
+    removed := SQLROWCOUNT;
+
+    -- チャンクを持たないドキュメント（新規・変更分）のみを分割
+    INSERT INTO SNOW_RETAIL_DOCUMENT_CHUNKS (
+        chunk_id, document_id, chunk_index, title, content,
+        document_type, department, version, updated_at
+    )
+    SELECT
+        d.document_id || '-' || LPAD(t.index, 4, '0'),
+        d.document_id,
+        t.index,
+        d.title,
+        t.value::string,
+        d.document_type,
+        d.department,
+        d.version,
+        d.updated_at
+    FROM SNOW_RETAIL_DOCUMENTS d,
+        LATERAL FLATTEN(
+            input => SNOWFLAKE.CORTEX.SPLIT_TEXT_RECURSIVE_CHARACTER(d.content, 'markdown', 500, 100)
+        ) t
+    WHERE d.content IS NOT NULL
+      AND NOT EXISTS (
+          SELECT 1 FROM SNOW_RETAIL_DOCUMENT_CHUNKS c WHERE c.document_id = d.document_id
+      );
+    added := SQLROWCOUNT;
+
+    RETURN 'removed ' || removed || ' chunks, added ' || added || ' chunks';
+END;
+$$;
+
+-- 初回の分割
+CALL REFRESH_DOCUMENT_CHUNKS();
+
+
+// Step3: 定期的な再分割タスク //
+
+-- 変更がなければ版の比較のみで終了する
+CREATE OR REPLACE TASK REFRESH_DOCUMENT_CHUNKS_TASK
+    WAREHOUSE = cortex_search_wh
+    SCHEDULE = '60 minute'
+AS
+    CALL REFRESH_DOCUMENT_CHUNKS();
+
+ALTER TASK REFRESH_DOCUMENT_CHUNKS_TASK RESUME;
+
+
+// Step4: チャンクテーブルに対する検索サービス //
+
+-- サービス名と列名（document_id / title / content）は変えないため、
+-- SNOW_RETAIL_AGENT の DocumentSearch ツールはそのまま利用できる
+CREATE OR REPLACE CORTEX SEARCH SERVICE snow_retail_search_service
+    ON content
+    ATTRIBUTES title, document_type, department
+    WAREHOUSE = cortex_search_wh
+    TARGET_LAG = '1 hour'
+    EMBEDDING_MODEL = 'voyage-multilingual-2'
+    AS (
+        SELECT
+            chunk_id,
+            document_id,
+            chunk_index,
+            title,
+            content,
+            document_type,
+            department,
+            version,
+            updated_at
+        FROM SNOW_RETAIL_DOCUMENT_CHUNKS
+    );
+
+
+// Step5: 確認 //
+
+SELECT document_id, version, COUNT(*) AS chunks, MAX(chunked_at) AS chunked_at
+FROM SNOW_RETAIL_DOCUMENT_CHUNKS
+GROUP BY document_id, version
+ORDER BY document_id;
+
+SELECT 'document index created' AS status;
@@ -0,0 +1,100 @@
+// =========================================================
+// レビュー特徴量パイプライン（Dynamic Table）
+// =========================================================
+-- setup.sql 実行後に実行してください。
+-- CUSTOMER_REVIEWS の増加に合わせて、翻訳・感情スコア・カテゴリ・
+-- チャンク埋め込みを TARGET_LAG 以内に自動で最新化します。
+-- Streamlitアプリはこれらのテーブルを読むだけで、画面描画中に
+-- Cortex関数を呼び出さなくなります。
+
+USE ROLE ACCOUNTADMIN;
+USE WAREHOUSE COMPUTE_WH;
+USE SCHEMA SNOWRETAIL_DB.SNOWRETAIL_SCHEMA;
+
+
+// Step1: 特徴量更新用ウェアハウスと変更追跡 //
+
+-- 特徴量の更新はインタラクティブなクエリと分離する
+CREATE WAREHOUSE IF NOT EXISTS feature_pipeline_wh WITH WAREHOUSE_SIZE='X-SMALL' AUTO_SUSPEND = 60;
+
+-- 増分リフレッシュのために変更追跡を有効化
+ALTER TABLE CUSTOMER_REVIEWS SET CHANGE_TRACKING = TRUE;
+
+
+// Step2: レビュー単位の特徴量（翻訳・感情・カテゴリ） //
+
+CREATE OR REPLACE DYNAMIC TABLE REVIEW_FEATURES
+    TARGET_LAG = '10 minutes'
+    WAREHOUSE = feature_pipeline_wh
+    REFRESH_MODE = INCREMENTAL
+    COMMENT = 'レビュー単位の特徴量（翻訳・感情スコア・カテゴリ）'
+AS
+SELECT
+    review_id,
+    product_id,
+    customer_id,
+    rating,
+    review_date,
+    purchase_channel,
+    helpful_votes,
+    translated_text,
+    SNOWFLAKE.CORTEX.SENTIMENT(translated_text) AS sentiment_score,
+    category
+FROM (
+    SELECT
+        r.*,
+        SNOWFLAKE.CORTEX.TRANSLATE(r.review_text, '', 'en') AS translated_text,
+        AI_CLASSIFY(
+            r.review_text,
+            ARRAY_CONSTRUCT('商品品質', '配送サービス', '価格', 'カスタマーサービス', '店舗環境', 'その他')
+        ):labels[0]::string AS category
+    FROM CUSTOMER_REVIEWS r
+    WHERE r.review_text IS NOT NULL
+);
+
+
+// Step3: チャンク単位の埋め込み //
+
+-- 埋め込みモデルを変更する場合はこの定義を差し替えて再作成してください
+CREATE OR REPLACE DYNAMIC TABLE REVIEW_CHUNK_FEATURES
+    TARGET_LAG = '10 minutes'
+    WAREHOUSE = feature_pipeline_wh
+    REFRESH_MODE = INCREMENTAL
+    COMMENT = 'チャンク単位の埋め込み（multilingual-e5-large）'
+AS
+SELECT
+    r.review_id,
+    t.index AS chunk_index,
+    t.value::string AS chunked_text,
+    'multilingual-e5-large' AS embedding_model,
+    SNOWFLAKE.CORTEX.EMBED_TEXT_1024('multilingual-e5-large', t.value::string) AS embedding
+FROM CUSTOMER_REVIEWS r,
+    LATERAL FLATTEN(
+        input => SNOWFLAKE.CORTEX.SPLIT_TEXT_RECURSIVE_CHARACTER(r.review_text, 'none', 300, 30)
+    ) t
+WHERE r.review_text IS NOT NULL;
+
+
+// Step4: カテゴリ×チャネル別要約 //
+
+-- 集約系のAI関数は増分リフレッシュに対応しないため、FULLで日次更新する
+CREATE OR REPLACE DYNAMIC TABLE REVIEW_CATEGORY_SUMMARIES
+    TARGET_LAG = '1 day'
+    WAREHOUSE = feature_pipeline_wh
+    REFRESH_MODE = FULL
+    COMMENT = 'カテゴリ×購入チャネル別のAI_SUMMARIZE_AGG要約'
+AS
+SELECT
+    f.category,
+    f.purchase_channel,
+    SNOWFLAKE.CORTEX.TRANSLATE(AI_SUMMARIZE_AGG(r.review_text), '', 'ja') AS category_summary
+FROM REVIEW_FEATURES f
+JOIN CUSTOMER_REVIEWS r ON f.review_id = r.review_id
+GROUP BY f.category, f.purchase_channel;
+
+
+// Step5: 確認 //
+
+SHOW DYNAMIC TABLES LIKE 'REVIEW_%';
+
+SELECT 'feature pipeline created' AS status;
@@ -0,0 +1,58 @@
+// =========================================================
+// レビュー前処理の処理状態管理（未処理キュー）
+// =========================================================
+-- setup.sql 実行後、Streamlitアプリで前処理用テーブルを作成してから実行してください。
+-- 未処理レビュー数の確認と次バッチの取得を、CUSTOMER_REVIEWS と
+-- CUSTOMER_ANALYSIS のアンチ結合（履歴全体のスキャン）ではなく、
+-- 未処理分だけを保持するキューテーブルで行えるようにします。
+
+USE ROLE ACCOUNTADMIN;
+USE WAREHOUSE COMPUTE_WH;
+USE SCHEMA SNOWRETAIL_DB.SNOWRETAIL_SCHEMA;
+
+
+// Step1: 未処理キューと新着ストリーム //
+
+-- 未処理レビューのキュー（処理が完了した行は削除される）
+CREATE TABLE IF NOT EXISTS REVIEW_PROCESSING_QUEUE (
+    review_id VARCHAR(20),
+    enqueued_at TIMESTAMP_NTZ DEFAULT CURRENT_TIMESTAMP()
+)
+CLUSTER BY (review_id);
+
+-- 新着レビューを検知するストリーム（追記のみ）
+CREATE OR REPLACE STREAM CUSTOMER_REVIEWS_NEW
+    ON TABLE CUSTOMER_REVIEWS
+    APPEND_ONLY = TRUE;
+
+
+// Step2: 既存の未処理レビューをキューに投入（初回のみ履歴をスキャン） //
+
+INSERT INTO REVIEW_PROCESSING_QUEUE (review_id)
+SELECT r.review_id
+FROM CUSTOMER_REVIEWS r
+WHERE NOT EXISTS (SELECT 1 FROM CUSTOMER_ANALYSIS a WHERE a.review_id = r.review_id)
+  AND NOT EXISTS (SELECT 1 FROM REVIEW_PROCESSING_QUEUE q WHERE q.review_id = r.review_id);
+
+
+// Step3: 新着レビューを定期的にキューへ取り込むタスク //
+
+CREATE OR REPLACE TASK ENQUEUE_NEW_REVIEWS
+    WAREHOUSE = COMPUTE_WH
+    SCHEDULE = '1 minute'
+    WHEN SYSTEM$STREAM_HAS_DATA('CUSTOMER_REVIEWS_NEW')
+AS
+    INSERT INTO REVIEW_PROCESSING_QUEUE (review_id)
+    SELECT review_id FROM CUSTOMER_REVIEWS_NEW;
+
+ALTER TASK ENQUEUE_NEW_REVIEWS RESUME;
+
+
+// Step4: review_idによる点検索の最適化 //
+
+-- キューから取り出したreview_idでCUSTOMER_REVIEWSを引くため、
+-- 検索最適化で該当マイクロパーティションのみを読むようにする
+-- （検索最適化サービスはEnterprise Edition以上が必要です）
+ALTER TABLE CUSTOMER_REVIEWS ADD SEARCH OPTIMIZATION ON EQUALITY(review_id);
+
+SELECT 'processing state created' AS status;
@@ -0,0 +1,76 @@
+// =========================================================
+// レビューキューブ（ダッシュボード用の事前集計）
+// =========================================================
+-- setup_feature_pipeline.sql 実行後に実行してください。
+-- REVIEW_FEATURES を 日付 × 購入チャネル × カテゴリ × 評価 × 感情帯 × 商品 で事前集計し、
+-- Dynamic Table で増分更新します。
+-- Streamlitアプリのカテゴリ・チャネル・評価・感情帯・月・商品の絞り込みと集計は
+-- このテーブルから算出するため、レビュー件数が数千万件でも明細を走査しなくなります。
+
+USE ROLE ACCOUNTADMIN;
+USE WAREHOUSE COMPUTE_WH;
+USE SCHEMA SNOWRETAIL_DB.SNOWRETAIL_SCHEMA;
+
+
+// Step1: 集計更新用ウェアハウス //
+
+-- 集計の更新はインタラクティブなクエリと分離する
+CREATE WAREHOUSE IF NOT EXISTS feature_pipeline_wh WITH WAREHOUSE_SIZE='X-SMALL' AUTO_SUSPEND = 60;
+
+
+// Step2: 日付 × チャネル × カテゴリ × 評価 × 感情帯 × 商品の集計 //
+
+-- 感情帯はアプリの定義（0.1より大きい: ポジティブ / -0.1未満: ネガティブ / それ以外: ニュートラル）に合わせる
+-- 平均値は合計と件数から算出するため、任意の粒度に再集計できる
+CREATE OR REPLACE DYNAMIC TABLE REVIEW_CUBE
+    TARGET_LAG = '10 minutes'
+    WAREHOUSE = feature_pipeline_wh
+    REFRESH_MODE = INCREMENTAL
+    CLUSTER BY (review_date, purchase_channel)
+    COMMENT = '日付×購入チャネル×カテゴリ×評価×感情帯×商品のレビュー集計'
+AS
+SELECT
+    review_date::date AS review_date,
+    purchase_channel,
+    category,
+    ROUND(rating)::int AS rating_bucket,
+    CASE
+        WHEN sentiment_score > 0.1 THEN 'ポジティブ'
+        WHEN sentiment_score < -0.1 THEN 'ネガティブ'
+        ELSE 'ニュートラル'
+    END AS sentiment_band,
+    product_id,
+    COUNT(*) AS review_count,
+    SUM(rating) AS rating_sum,
+    COUNT(rating) AS rating_count,
+    SUM(sentiment_score) AS sentiment_sum,
+    COUNT(sentiment_score) AS sentiment_count,
+    SUM(helpful_votes) AS helpful_votes
+FROM REVIEW_FEATURES
+GROUP BY
+    review_date::date,
+    purchase_channel,
+    category,
+    ROUND(rating)::int,
+    CASE
+        WHEN sentiment_score > 0.1 THEN 'ポジティブ'
+        WHEN sentiment_score < -0.1 THEN 'ネガティブ'
+        ELSE 'ニュートラル'
+    END,
+    product_id;
+
+
+// Step3: 確認 //
+
+SHOW DYNAMIC TABLES LIKE 'REVIEW_CUBE';
+
+SELECT
+    purchase_channel,
+    sentiment_band,
+    SUM(review_count) AS review_count,
+    SUM(rating_sum) / NULLIF(SUM(rating_count), 0) AS avg_rating
+FROM REVIEW_CUBE
+GROUP BY purchase_channel, sentiment_band
+ORDER BY purchase_channel, sentiment_band;
+
+SELECT 'review cube created' AS status;
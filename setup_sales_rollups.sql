@@ -0,0 +1,112 @@
+// =========================================================
+// 売上ロールアップ（Cortex Analyst用の事前集計）
+// =========================================================
+-- Part1 のノートブック実行後（またはフォールバックテーブルへのデータ投入後）に実行してください。
+-- RETAIL_DATA_WITH_PRODUCT_MASTER / EC_DATA_WITH_PRODUCT_MASTER を
+-- 日別・月別 × 商品 × 購入チャネルで事前集計し、Dynamic Table で増分更新します。
+-- 最後にステージ上の sales_analysis_model.yaml を、これらのテーブルを優先して参照する
+-- handson2/rollups/sales_analysis_model.yaml に置き換えるため、
+-- 「売上TOP10」「月別売上推移」「店舗とECの比較」などの質問が取引明細を走査しなくなります。
+-- （setup.sql が配置する既定のモデルは取引テーブルのみを参照し、このスクリプトなしで動作します）
+-- ※Part1 を再実行して元テーブルを作り直した場合は、このスクリプトも再実行してください。
+-- ※Streamlitアプリの「データ準備」ページは、Part1 スキップ時に
+--   ALTER TABLE <テーブル> SWAP WITH <テーブル>_PREBUILT で RETAIL_DATA_WITH_PRODUCT_MASTER /
+--   EC_DATA_WITH_PRODUCT_MASTER を入れ替えます。入れ替え後のテーブルは変更追跡が無効で、
+--   ロールアップの Dynamic Table は入れ替え前のデータのままになるため、SWAP の後は
+--   このスクリプトを再実行するか、少なくとも次を実行してください。
+--     ALTER TABLE RETAIL_DATA_WITH_PRODUCT_MASTER SET CHANGE_TRACKING = TRUE;
+--     ALTER TABLE EC_DATA_WITH_PRODUCT_MASTER SET CHANGE_TRACKING = TRUE;
+--     ALTER DYNAMIC TABLE SALES_DAILY_ROLLUP REFRESH;
+--     ALTER DYNAMIC TABLE SALES_MONTHLY_ROLLUP REFRESH;
+
+USE ROLE ACCOUNTADMIN;
+USE WAREHOUSE COMPUTE_WH;
+USE SCHEMA SNOWRETAIL_DB.SNOWRETAIL_SCHEMA;
+
+
+// Step1: 集計更新用ウェアハウスと変更追跡 //
+
+-- 集計の更新はインタラクティブなクエリと分離する
+CREATE WAREHOUSE IF NOT EXISTS feature_pipeline_wh WITH WAREHOUSE_SIZE='X-SMALL' AUTO_SUSPEND = 60;
+
+-- 増分リフレッシュのために変更追跡を有効化
+ALTER TABLE RETAIL_DATA_WITH_PRODUCT_MASTER SET CHANGE_TRACKING = TRUE;
+ALTER TABLE EC_DATA_WITH_PRODUCT_MASTER SET CHANGE_TRACKING = TRUE;
+
+
+// Step2: 日別 × 商品 × チャネルの集計 //
+
+-- 購入チャネルは CUSTOMER_REVIEWS.purchase_channel と同じ値（店舗 / EC）を使う
+CREATE OR REPLACE DYNAMIC TABLE SALES_DAILY_ROLLUP
+    TARGET_LAG = '1 hour'
+    WAREHOUSE = feature_pipeline_wh
+    REFRESH_MODE = INCREMENTAL
+    COMMENT = '日別×商品×購入チャネルの売上集計'
+AS
+SELECT
+    transaction_date AS sales_date,
+    '店舗' AS purchase_channel,
+    product_id_master,
+    product_name_master,
+    SUM(quantity) AS quantity,
+    SUM(total_price) AS total_sales,
+    COUNT(*) AS order_count
+FROM RETAIL_DATA_WITH_PRODUCT_MASTER
+GROUP BY transaction_date, product_id_master, product_name_master
+UNION ALL
+SELECT
+    transaction_date AS sales_date,
+    'EC' AS purchase_channel,
+    product_id_master,
+    product_name_master,
+    SUM(quantity) AS quantity,
+    SUM(total_price) AS total_sales,
+    COUNT(*) AS order_count
+FROM EC_DATA_WITH_PRODUCT_MASTER
+GROUP BY transaction_date, product_id_master, product_name_master;
+
+
+// Step3: 月別 × 商品 × チャネルの集計 //
+
+-- 日別集計から再集計するため、取引明細は参照しない
+CREATE OR REPLACE DYNAMIC TABLE SALES_MONTHLY_ROLLUP
+    TARGET_LAG = '1 hour'
+    WAREHOUSE = feature_pipeline_wh
+    REFRESH_MODE = INCREMENTAL
+    COMMENT = '月別×商品×購入チャネルの売上集計'
+AS
+SELECT
+    DATE_TRUNC('MONTH', sales_date) AS sales_month,
+    purchase_channel,
+    product_id_master,
+    product_name_master,
+    SUM(quantity) AS quantity,
+    SUM(total_sales) AS total_sales,
+    SUM(order_count) AS order_count
+FROM SALES_DAILY_ROLLUP
+GROUP BY DATE_TRUNC('MONTH', sales_date), purchase_channel, product_id_master, product_name_master;
+
+
+// Step4: 確認 //
+
+SHOW DYNAMIC TABLES LIKE 'SALES_%_ROLLUP';
+
+-- 取引明細と合計が一致することを確認
+SELECT
+    (SELECT SUM(total_price) FROM RETAIL_DATA_WITH_PRODUCT_MASTER)
+        + (SELECT SUM(total_price) FROM EC_DATA_WITH_PRODUCT_MASTER) AS transaction_total,
+    (SELECT SUM(total_sales) FROM SALES_DAILY_ROLLUP) AS daily_rollup_total,
+    (SELECT SUM(total_sales) FROM SALES_MONTHLY_ROLLUP) AS monthly_rollup_total;
+
+
+
+// Step5: セマンティックモデルの置き換え //
+
+-- ロールアップを参照するモデルで、ステージ上の既定のモデル（同名）を上書きする
+-- Cortex Analyst・エージェント・アプリは同じファイルを参照するため、設定の変更は不要
+COPY FILES INTO @SNOWRETAIL_DB.SNOWRETAIL_SCHEMA.SEMANTIC_MODEL_STAGE
+    FROM @GIT_INTEGRATION_FOR_HANDSON/branches/main/handson2/rollups/sales_analysis_model.yaml;
+
+LIST @SNOWRETAIL_DB.SNOWRETAIL_SCHEMA.SEMANTIC_MODEL_STAGE;
+
+SELECT 'sales rollups created' AS status;
@@ -0,0 +1,71 @@
+// =========================================================
+// ワークロード別のウェアハウス分離とクエリタグ
+// =========================================================
+-- setup.sql 実行後に実行してください。
+-- Streamlitアプリのクエリを次の4種類に分類し、種類ごとのウェアハウスで実行します。
+--   metadata      : テーブルの存在確認などのメタデータ参照
+--   dashboard     : 件数・統計などの画面描画用の集計
+--   ai_batch      : AI_CLASSIFY / AI_FILTER / AI_AGG などの分析バッチ
+--   preprocessing : 翻訳・感情分析・分割・埋め込みの前処理
+-- 他のユーザーの数分かかるAI関数の実行中でも、メタデータ参照や件数表示が待たされなくなります。
+-- 各クエリには QUERY_TAG（アプリ・種類・セクション・ユーザー）が付与されるため、
+-- 種類ごとのコストを集計できます。
+
+USE ROLE ACCOUNTADMIN;
+USE WAREHOUSE COMPUTE_WH;
+USE SCHEMA SNOWRETAIL_DB.SNOWRETAIL_SCHEMA;
+
+
+// Step1: ワークロード別のウェアハウス //
+
+-- 対話的なクエリ（メタデータ参照・画面描画用の集計）
+CREATE WAREHOUSE IF NOT EXISTS interactive_wh
+    WITH WAREHOUSE_SIZE='X-SMALL' AUTO_SUSPEND = 60 AUTO_RESUME = TRUE;
+
+-- AI関数による分析バッチ（同時実行に備えてマルチクラスタで拡張）
+CREATE WAREHOUSE IF NOT EXISTS ai_batch_wh
+    WITH WAREHOUSE_SIZE='SMALL' AUTO_SUSPEND = 60 AUTO_RESUME = TRUE
+    MIN_CLUSTER_COUNT = 1 MAX_CLUSTER_COUNT = 3;
+
+-- レビューデータの前処理
+CREATE WAREHOUSE IF NOT EXISTS preprocessing_wh
+    WITH WAREHOUSE_SIZE='SMALL' AUTO_SUSPEND = 60 AUTO_RESUME = TRUE;
+
+
+// Step2: ワークロードとウェアハウスの対応表 //
+
+-- アプリはこの表を参照して実行先を切り替える（表がない場合は QUERY_WAREHOUSE のまま実行）
+CREATE OR REPLACE TABLE WORKLOAD_WAREHOUSES (
+    workload VARCHAR(50),
+    warehouse_name VARCHAR(255)
+);
+
+INSERT INTO WORKLOAD_WAREHOUSES (workload, warehouse_name) VALUES
+    ('metadata', 'INTERACTIVE_WH'),
+    ('dashboard', 'INTERACTIVE_WH'),
+    ('ai_batch', 'AI_BATCH_WH'),
+    ('preprocessing', 'PREPROCESSING_WH');
+
+
+// Step3: ワークロード別のコスト //
+
+-- QUERY_TAG の種類・セクション・ユーザーごとのクエリ数と消費クレジット（ACCOUNT_USAGEのため数時間の遅延あり）
+CREATE OR REPLACE VIEW WORKLOAD_COST_BY_CLASS AS
+SELECT
+    TRY_PARSE_JSON(q.query_tag):workload::string AS workload,
+    TRY_PARSE_JSON(q.query_tag):section::string AS section,
+    TRY_PARSE_JSON(q.query_tag):user::string AS app_user,
+    q.warehouse_name,
+    DATE_TRUNC('day', q.start_time) AS usage_date,
+    COUNT(*) AS query_count,
+    SUM(q.credits_attributed_compute) AS credits
+FROM SNOWFLAKE.ACCOUNT_USAGE.QUERY_ATTRIBUTION_HISTORY q
+WHERE TRY_PARSE_JSON(q.query_tag):app::string = 'snowretail_voc'
+GROUP BY ALL;
+
+
+// Step4: 確認 //
+
+SELECT * FROM WORKLOAD_WAREHOUSES ORDER BY workload;
+
+SELECT 'workload routing created' AS status;
@@ -0,0 +1,26 @@
+# =========================================================
+# analyst_utils のキャッシュ破棄のテスト
+# =========================================================
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "handson2", "minimal"))
+import analyst_utils
+from analyst_utils import clear_cache
+
+
+def test_clear_cache_for_model_version_keeps_other_versions():
+    clear_cache()
+    analyst_utils._sql_cache[("v1", "売上top10")] = {"sql": "SELECT 1", "text": "", "cost_sec": 1.0}
+    analyst_utils._sql_cache[("v2", "売上top10")] = {"sql": "SELECT 2", "text": "", "cost_sec": 1.0}
+    analyst_utils._result_cache[("SELECT 1", ())] = {"df": None, "cost_sec": 1.0}
+    analyst_utils._result_cache[("SELECT 2", ())] = {"df": None, "cost_sec": 1.0}
+    analyst_utils._stats["questions"] = 5
+
+    clear_cache("v2")
+
+    assert list(analyst_utils._sql_cache) == [("v1", "売上top10")]
+    assert list(analyst_utils._result_cache) == [("SELECT 1", ())]
+    assert analyst_utils._stats["questions"] == 5
+    clear_cache()
@@ -0,0 +1,57 @@
+# =========================================================
+# engine_utils のスナップショットと集計のテスト
+# =========================================================
+
+import os
+import sys
+
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "handson2", "minimal"))
+from engine_utils import aggregate, clear_engine, get_snapshot, is_engine_available
+
+pytestmark = pytest.mark.skipif(not is_engine_available(), reason="duckdb / pyarrow が必要")
+
+
+def make_results(ratings: list) -> pd.DataFrame:
+    df = pd.DataFrame({
+        "CATEGORY": ["品質", "配送", None, "品質"][:len(ratings)],
+        "RATING": ratings,
+    })
+    df["CATEGORY"] = df["CATEGORY"].astype("category")
+    return df
+
+
+def test_snapshot_is_rebuilt_when_result_is_replaced():
+    clear_engine()
+    key = ("classify", "{}", ())
+    first = make_results([5, 4, 3, 2])
+    assert get_snapshot(key, first).num_rows == 4
+    assert get_snapshot(key, first) is get_snapshot(key, first)
+    replaced = make_results([5, 4])
+    assert get_snapshot(key, replaced).num_rows == 2
+
+
+def test_duckdb_and_pandas_keep_null_group():
+    clear_engine()
+    df = make_results([5, 4, 3, 2])
+    measures = {"REVIEW_COUNT": ("count", None)}
+    via_duckdb = aggregate(("k",), df, measures, group_by=["CATEGORY"], use_engine=True)
+    via_pandas = aggregate(("k",), df, measures, group_by=["CATEGORY"], use_engine=False)
+    assert len(via_duckdb) == len(via_pandas) == 3
+    assert via_duckdb["REVIEW_COUNT"].sum() == via_pandas["REVIEW_COUNT"].sum() == 4
+    assert via_pandas["CATEGORY"].isna().sum() == 1
+
+
+def test_count_of_column_skips_nulls_in_both_engines():
+    clear_engine()
+    df = pd.DataFrame({"CATEGORY": ["品質", "品質", "配送"], "RATING": [5, None, 4]})
+    measures = {"ROWS": ("count", None), "RATED": ("count", "RATING")}
+    for use_engine in (True, False):
+        result = aggregate(("k",), df, measures, group_by=["CATEGORY"], use_engine=use_engine)
+        assert result["ROWS"].tolist() == [2, 1]
+        assert result["RATED"].tolist() == [1, 1]
+        total = aggregate(("k",), df, measures, use_engine=use_engine)
+        assert int(total["ROWS"].iloc[0]) == 3
+        assert int(total["RATED"].iloc[0]) == 2
@@ -0,0 +1,28 @@
+# =========================================================
+# 負荷テストツール（tools/loadtest.py）のスモークテスト
+# =========================================================
+
+import os
+import sys
+
+import pytest
+
+pytest.importorskip("streamlit.testing.v1")
+
+import snowflake.snowpark.context
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "tools"))
+import loadtest
+
+
+def test_single_session_browse_journey(tmp_path):
+    get_active_session = snowflake.snowpark.context.get_active_session
+    try:
+        output = tmp_path / "loadtest.json"
+        assert loadtest.main([
+            "--sessions", "1", "--journey", "browse", "--latency-ms", "0", "--rows", "20",
+            "--output", str(output)
+        ]) == 0
+        assert output.exists()
+    finally:
+        snowflake.snowpark.context.get_active_session = get_active_session
@@ -0,0 +1,21 @@
+# =========================================================
+# profile_utils のプロファイラのテスト
+# =========================================================
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "handson2", "minimal"))
+from profile_utils import FOLDED, RerunProfiler
+
+
+def test_started_at_is_captured_when_sampling_starts(tmp_path):
+    profiler = RerunProfiler("test", interval=0.001, output_format=FOLDED, output_dir=str(tmp_path))
+    profiler.start()
+    started_wall = profiler.started_wall
+    time.sleep(0.05)
+    result = profiler.stop()
+    assert result["started_at"] == started_wall.strftime("%H:%M:%S")
+    assert result["duration_sec"] >= 0.05
+    assert result["path"] and os.path.exists(result["path"])
@@ -0,0 +1,63 @@
+# =========================================================
+# result_cache_utils の省メモリ形式と本文キャッシュのテスト
+# =========================================================
+
+import json
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "handson2", "minimal"))
+import result_cache_utils
+from result_cache_utils import clear_result_cache, compact_frame, with_review_text
+
+
+def test_compact_frame_keeps_integers_as_small_ints():
+    df = pd.DataFrame({
+        "REVIEW_ID": ["r1", "r2"],
+        "RATING": [5, 3],
+        "HELPFUL_VOTES": [120, 0],
+        "SENTIMENT_SCORE": [0.5, -0.25],
+        "CATEGORY": ["品質", "配送"],
+        "REVIEW_TEXT": ["a", "b"],
+    })
+    compact = compact_frame(df)
+    assert compact["RATING"].dtype == np.int8
+    assert compact["HELPFUL_VOTES"].dtype == np.int8
+    assert compact["SENTIMENT_SCORE"].dtype == np.float32
+    assert compact["CATEGORY"].dtype == "category"
+    assert "REVIEW_TEXT" not in compact.columns
+    assert compact["RATING"].tolist() == [5, 3]
+
+
+def test_compact_frame_keeps_missing_ratings_as_integers():
+    df = pd.DataFrame({"RATING": [4, None]}, dtype=object)
+    compact = compact_frame(df)
+    assert compact["RATING"].dtype == "Int32"
+    assert compact["RATING"].iloc[0] == 4
+
+
+class FakeSession:
+    """本文の取得クエリに固定の本文を返すセッション"""
+
+    def __init__(self, texts: dict):
+        self.texts = texts
+
+    def sql(self, query, params=None):
+        review_ids = json.loads(params[0])
+        rows = [{"REVIEW_ID": review_id, "REVIEW_TEXT": self.texts[review_id]} for review_id in review_ids]
+        return type("Result", (), {"collect": lambda _: rows})()
+
+
+def test_review_text_cache_evicts_least_recently_used(monkeypatch):
+    clear_result_cache()
+    monkeypatch.setattr(result_cache_utils, "MAX_TEXT_ENTRIES", 2)
+    session = FakeSession({"r1": "one", "r2": "two", "r3": "three"})
+    with_review_text(pd.DataFrame({"REVIEW_ID": ["r1", "r2"]}), session)
+    # r1を参照してから新しい本文を取得すると、参照されていないr2が破棄される
+    assert with_review_text(pd.DataFrame({"REVIEW_ID": ["r1"]}), session)["REVIEW_TEXT"].tolist() == ["one"]
+    with_review_text(pd.DataFrame({"REVIEW_ID": ["r3"]}), session)
+    assert list(result_cache_utils._texts) == ["r1", "r3"]
+    clear_result_cache()
@@ -0,0 +1,110 @@
+# =========================================================
+# sampling_utils の層化推定のテスト
+# =========================================================
+
+import os
+import sys
+
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "handson2", "minimal"))
+from sampling_utils import (
+    _stratified_proportion, _wilson_interval, build_remaining_filter, build_sample_source,
+    estimate_shares, remaining_params
+)
+
+
+def make_sample(strata: dict) -> pd.DataFrame:
+    """{層: (層の全件数, [各サンプルのヒット])} からサンプル結果を作成する"""
+    rows = []
+    for key, (size, hits) in strata.items():
+        for i, hit in enumerate(hits):
+            rows.append({"REVIEW_ID": f"{key}-{i}", "STRATUM_KEY": key, "STRATUM_SIZE": size, "HIT": hit})
+    return pd.DataFrame(rows)
+
+
+def estimate(df: pd.DataFrame) -> dict:
+    return _stratified_proportion(df, df["HIT"], 1.96)
+
+
+def test_share_is_weighted_by_stratum_size():
+    df = make_sample({"a": (300, [True, False, True, False]), "b": (100, [False, False])})
+    est = estimate(df)
+    assert est["share"] == pytest.approx(0.75 * 0.5)
+    assert est["population"] == 400
+    assert est["sample_size"] == 6
+
+
+def test_single_sample_strata_do_not_collapse_interval():
+    # 各層1件ずつ（p_h が 0 か 1）でも信頼区間の幅は0にならない
+    df = make_sample({f"s{i}": (50, [i % 2 == 0]) for i in range(20)})
+    est = estimate(df)
+    assert est["share"] == pytest.approx(0.5)
+    assert est["ci_high"] - est["ci_low"] > 0.1
+
+
+def test_single_pooled_sample_uses_conservative_variance():
+    df = make_sample({"a": (100, [True])})
+    est = estimate(df)
+    assert est["share"] == 1.0
+    assert est["ci_low"] < 1.0
+
+
+def test_censused_strata_add_no_variance():
+    # 全数を抽出した層のみの場合は推定誤差がない
+    df = make_sample({"a": (1, [True]), "b": (2, [True, False])})
+    est = estimate(df)
+    assert est["share"] == pytest.approx(2 / 3)
+    assert est["ci_low"] == pytest.approx(est["share"])
+    assert est["ci_high"] == pytest.approx(est["share"])
+
+
+def test_regular_strata_use_wilson_interval_on_effective_sample_size():
+    df = make_sample({"a": (100, [True, True, False, False]), "b": (100, [True, False, False, False])})
+    est = estimate(df)
+    # 各層 W_h=0.5, fpc=0.96, s_h^2 = p(1-p)/(n-1)
+    variance = 0.25 * 0.96 * (0.25 / 3) + 0.25 * 0.96 * (0.1875 / 3)
+    n_effective = min(8, 0.375 * 0.625 / variance)
+    low, high = _wilson_interval(0.375, n_effective, 1.96)
+    assert est["ci_low"] == pytest.approx(low)
+    assert est["ci_high"] == pytest.approx(high)
+
+
+def test_pure_strata_do_not_collapse_interval():
+    # 層内がすべてヒット・すべて非ヒットでも信頼区間の幅は0にならない
+    est = estimate(make_sample({"a": (1000, [True, True]), "b": (1000, [False, False])}))
+    assert est["share"] == pytest.approx(0.5)
+    assert est["ci_low"] < 0.5 < est["ci_high"]
+
+
+def test_zero_hits_have_non_zero_upper_bound():
+    est = estimate(make_sample({"a": (1000, [False, False]), "b": (1000, [False, False])}))
+    assert est["share"] == 0.0
+    assert est["ci_low"] == 0.0
+    assert est["ci_high"] > 0.0
+
+
+def test_unseen_categories_are_reported():
+    df = make_sample({"a": (100, [True, False])})
+    df["CATEGORY"] = ["品質", "配送"]
+    df_est = estimate_shares(df, "CATEGORY", categories=["品質", "配送", "価格"])
+    unseen = df_est[df_est["CATEGORY"] == "価格"].iloc[0]
+    assert unseen["サンプル件数"] == 0
+    assert unseen["推定構成比"] == 0.0
+    assert unseen["上限"] > 0.0
+
+
+def test_empty_population():
+    df = make_sample({"a": (0, [True])})
+    assert estimate(df)["share"] == 0.0
+
+
+def test_sample_allocates_at_least_two_per_stratum():
+    assert "GREATEST(2," in build_sample_source(100)
+
+
+def test_remaining_filter_excludes_stored_review_ids():
+    df = make_sample({"a": (10, [True, False])})
+    assert build_remaining_filter(alias="c").startswith("c.review_id NOT IN")
+    assert remaining_params(df) == ['["a-0", "a-1"]']
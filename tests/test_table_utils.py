@@ -0,0 +1,54 @@
+# =========================================================
+# table_utils の参照先判定のテスト
+# =========================================================
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "handson2", "minimal"))
+import table_utils
+from table_utils import check_table_with_fallback, refresh_table_resolution
+
+
+class FakeSession:
+    """テーブル一覧の取得クエリに固定の結果を返し、発行したクエリを記録するセッション"""
+
+    def __init__(self, tables: list):
+        self.tables = tables
+        self.queries = []
+
+    def sql(self, query, params=None):
+        self.queries.append(query)
+        rows = [{"TABLE_NAME": table} for table in self.tables]
+        return type("Result", (), {"collect": lambda _: rows})()
+
+
+def reset():
+    table_utils._resolution.update(entries=None, tables=None, loaded_at=0.0)
+
+
+def test_fallback_is_used_when_original_is_missing():
+    reset()
+    info = check_table_with_fallback("PRODUCT_MASTER", FakeSession(["PRODUCT_MASTER_FALLBACK"]))
+    assert info["actual_table"] == "PRODUCT_MASTER_FALLBACK"
+    assert info["is_fallback"]
+
+
+def test_original_table_is_preferred_over_fallback():
+    reset()
+    info = check_table_with_fallback("PRODUCT_MASTER", FakeSession(["PRODUCT_MASTER", "PRODUCT_MASTER_FALLBACK"]))
+    assert info["actual_table"] == "PRODUCT_MASTER"
+    assert not info["is_fallback"]
+
+
+def test_listing_is_shared_until_refreshed():
+    reset()
+    session = FakeSession(["CUSTOMER_REVIEWS"])
+    assert check_table_with_fallback("CUSTOMER_REVIEWS", session)["exists"]
+    assert not check_table_with_fallback("CUSTOMER_ANALYSIS", session)["exists"]
+    assert len(session.queries) == 1
+    # テーブル作成後に判定し直すと、新しいテーブルが一覧に反映される
+    session.tables.append("CUSTOMER_ANALYSIS")
+    refresh_table_resolution(session)
+    assert check_table_with_fallback("CUSTOMER_ANALYSIS", session)["exists"]
+    assert len(session.queries) == 2
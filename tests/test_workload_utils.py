@@ -0,0 +1,79 @@
+# =========================================================
+# workload_utils のクエリ単位の振り分けのテスト
+# =========================================================
+
+import json
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "handson2", "minimal"))
+import workload_utils
+from workload_utils import AI_BATCH, DASHBOARD, PREPROCESSING, route, run_query
+
+
+class FakeSession:
+    """発行したクエリと、その時点のウェアハウス・クエリ単位のパラメータを記録するセッション"""
+
+    def __init__(self):
+        self.warehouse = "APP_WH"
+        self.query_tag = None
+        self.executed = []
+
+    def get_current_warehouse(self):
+        return self.warehouse
+
+    def use_warehouse(self, warehouse):
+        self.warehouse = warehouse
+
+    def sql(self, query, params=None):
+        session = self
+
+        class Statement:
+            def collect(self, statement_params=None):
+                session.executed.append((query, session.warehouse, statement_params))
+                return []
+
+            def collect_nowait(self, statement_params=None):
+                rows = self.collect(statement_params)
+                return type("Job", (), {"result": lambda _: rows})()
+
+        return Statement()
+
+
+@pytest.fixture
+def session(monkeypatch):
+    monkeypatch.setattr(workload_utils, "get_workload_warehouses", lambda session=None, refresh=False: {
+        DASHBOARD: "INTERACTIVE_WH", AI_BATCH: "AI_BATCH_WH", PREPROCESSING: "PREPROCESSING_WH",
+    })
+    monkeypatch.setattr(workload_utils, "_get_user", lambda: "viewer")
+    workload_utils._session_state.clear()
+    return FakeSession()
+
+
+def test_ai_query_is_routed_without_moving_the_shared_session(session):
+    run_query(session, "SELECT AI_CLASSIFY(review_text, ['a']) FROM CUSTOMER_REVIEWS", "セクション2")
+    query, warehouse, params = session.executed[-1]
+    assert warehouse == "AI_BATCH_WH"
+    assert json.loads(params["QUERY_TAG"]) == {
+        "app": "snowretail_voc", "workload": AI_BATCH, "section": "セクション2", "user": "viewer"
+    }
+    # 発行後は既定（画面描画用）のウェアハウスに戻り、セッションのタグは全ユーザー共通
+    assert session.warehouse == "INTERACTIVE_WH"
+    assert json.loads(session.query_tag)["user"] == ""
+
+
+def test_dashboard_query_runs_on_resting_warehouse(session):
+    run_query(session, "SELECT COUNT(*) FROM CUSTOMER_REVIEWS", "セクション2")
+    assert session.executed[-1][1] == "INTERACTIVE_WH"
+    assert json.loads(session.executed[-1][2]["QUERY_TAG"])["workload"] == DASHBOARD
+
+
+def test_routed_session_tags_helper_queries(session):
+    with route(session, PREPROCESSING, "前処理") as prep_session:
+        prep_session.sql("SELECT COUNT(*) FROM CUSTOMER_REVIEWS").collect()
+    _, warehouse, params = session.executed[-1]
+    assert warehouse == "PREPROCESSING_WH"
+    assert json.loads(params["QUERY_TAG"])["workload"] == PREPROCESSING
+    assert session.warehouse == "INTERACTIVE_WH"
@@ -0,0 +1,299 @@
+# =========================================================
+# Snowflake Cortex Handson
+# 大容量CSVの並列バルクロードツール
+# =========================================================
+# 概要: data/ 配下のCSV（または同形式の大容量抽出ファイル）を
+#       適切なサイズのgzipファイルに分割して並列アップロードし、
+#       COPY INTO で全テーブルを同時にロードする。
+#       ロード後はテーブル定義とのスキーマ照合・件数照合を行い、
+#       テーブルごとの所要時間をレポートする。
+#
+# 使い方:
+#   python tools/bulk_load.py --connection default
+#   python tools/bulk_load.py --table CUSTOMER_REVIEWS=/path/to/reviews.csv --truncate
+# =========================================================
+
+import argparse
+import csv
+import gzip
+import io
+import os
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from snowflake.snowpark import Session
+
+# リポジトリのルート
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 既定のロード対象（テーブル名: CSVパス）
+DEFAULT_TABLES = {
+    "CUSTOMER_REVIEWS": "data/customer_reviews.csv",
+    "SNOW_RETAIL_DOCUMENTS": "data/snow_retail_documents.csv",
+    "EC_DATA": "data/ec_data.csv",
+    "RETAIL_DATA": "data/retail_data.csv",
+    "PRODUCT_MASTER_PREBUILT": "data/backup/product_master_backup.csv",
+    "EC_DATA_WITH_PRODUCT_MASTER_PREBUILT": "data/backup/ec_data_with_product_master_backup.csv",
+    "RETAIL_DATA_WITH_PRODUCT_MASTER_PREBUILT": "data/backup/retail_data_with_product_master_backup.csv",
+}
+
+# 分割後ファイルの目安サイズ（非圧縮）。gzip後に100〜250MB程度になる大きさ
+DEFAULT_CHUNK_SIZE_MB = 512
+
+DEFAULT_STAGE = "BULK_LOAD_STAGE"
+
+# ファイル形式（setup.sql のロードと同じ設定。分割ファイルは区切り文字・改行を含む値のみダブルクォートで囲む）
+# 元データ（CUSTOMER_REVIEWS / SNOW_RETAIL_DOCUMENTS 等）は 'NULL' 等の文字列をそのまま値として扱う
+CSV_FORMAT = "TYPE = CSV SKIP_HEADER = 1 FIELD_OPTIONALLY_ENCLOSED_BY = '\"'"
+# バックアップCSV（setup.sql の BACKUP_CSV_FORMAT）は 'NULL' / 'null' / 空文字をNULLとして扱う
+BACKUP_CSV_FORMAT = CSV_FORMAT + " FIELD_DELIMITER = ',' NULL_IF = ('NULL', 'null', '')"
+
+# テーブルごとのファイル形式（ここにないテーブルはCSV_FORMAT）
+TABLE_FILE_FORMATS = {
+    "PRODUCT_MASTER_PREBUILT": BACKUP_CSV_FORMAT,
+    "EC_DATA_WITH_PRODUCT_MASTER_PREBUILT": BACKUP_CSV_FORMAT,
+    "RETAIL_DATA_WITH_PRODUCT_MASTER_PREBUILT": BACKUP_CSV_FORMAT,
+}
+
+
+def get_file_format(table_name: str) -> str:
+    """テーブルのCOPY INTOに使うファイル形式（分割ファイルはgzip圧縮）"""
+    return f"{TABLE_FILE_FORMATS.get(table_name.upper(), CSV_FORMAT)} COMPRESSION = GZIP"
+
+
+def split_csv(csv_path: str, out_dir: str, prefix: str, chunk_size_mb: int) -> tuple:
+    """
+    CSVをレコード境界で分割し、ヘッダー付きのgzipファイルとして書き出す
+
+    CONTENT列のように改行を含む値があるため、バイト位置ではなく
+    csvモジュールでレコード単位に読み書きする。メモリ使用量は一定。
+
+    Args:
+        csv_path: 入力CSVのパス
+        out_dir: 出力先ディレクトリ
+        prefix: 出力ファイル名の接頭辞
+        chunk_size_mb: 1ファイルあたりの非圧縮サイズの目安（MB）
+
+    Returns:
+        tuple: (ヘッダー列のリスト, データ行数, 出力ファイルパスのリスト)
+    """
+    limit = chunk_size_mb * 1024 * 1024
+    files = []
+    rows = 0
+
+    with open(csv_path, newline="", encoding="utf-8-sig") as src:
+        reader = csv.reader(src)
+        header = next(reader)
+
+        out = None
+        writer = None
+        written = 0
+        buffer = io.StringIO()
+        line_writer = csv.writer(buffer, lineterminator="\n")
+
+        for record in reader:
+            if out is None or written >= limit:
+                if out is not None:
+                    out.close()
+                path = os.path.join(out_dir, f"{prefix}_{len(files):05d}.csv.gz")
+                out = gzip.open(path, "wt", encoding="utf-8", newline="")
+                writer = csv.writer(out, lineterminator="\n")
+                writer.writerow(header)
+                files.append(path)
+                written = 0
+
+            # 書き込みサイズを見積もるため一度バッファに書き出す
+            buffer.seek(0)
+            buffer.truncate()
+            line_writer.writerow(record)
+            line = buffer.getvalue()
+            out.write(line)
+            written += len(line.encode("utf-8"))
+            rows += 1
+
+        if out is not None:
+            out.close()
+
+    return header, rows, files
+
+
+def get_table_columns(session: Session, table_name: str) -> list:
+    """テーブル定義の列名を定義順に取得する"""
+    rows = session.sql(f"DESCRIBE TABLE {table_name}").collect()
+    return [row["name"].upper() for row in rows if row["kind"] == "COLUMN"]
+
+
+def validate_schema(header: list, columns: list) -> list:
+    """
+    CSVヘッダーとテーブル定義を照合する
+
+    COPY INTOは列位置でロードするため、列数の不一致はエラー、
+    列名の不一致（大文字小文字は無視）は警告とする。
+
+    Returns:
+        list: 問題点のメッセージ（"ERROR: " / "WARN: " で始まる）
+    """
+    issues = []
+    if len(header) != len(columns):
+        issues.append(f"ERROR: 列数が一致しません（CSV {len(header)}列 / テーブル {len(columns)}列）")
+    for position, (csv_col, table_col) in enumerate(zip(header, columns), start=1):
+        if csv_col.strip().upper() != table_col:
+            issues.append(f"WARN: {position}列目の列名が異なります（CSV {csv_col} / テーブル {table_col}）")
+    return issues
+
+
+def load_table(session: Session, table_name: str, csv_path: str, work_dir: str, args) -> dict:
+    """
+    1テーブル分の分割・アップロード・COPY INTO・検証を行う
+
+    Returns:
+        dict: テーブルごとのロード結果と所要時間
+    """
+    report = {
+        "table": table_name, "files": 0, "csv_rows": 0, "loaded_rows": 0, "error_rows": 0,
+        "split_sec": 0.0, "upload_sec": 0.0, "copy_sec": 0.0, "issues": [], "errors": [],
+    }
+
+    # スキーマ照合（ロード前に列数の不一致を検出する）
+    columns = get_table_columns(session, table_name)
+    with open(csv_path, newline="", encoding="utf-8-sig") as src:
+        header = next(csv.reader(src))
+    report["issues"] = validate_schema(header, columns)
+    if any(issue.startswith("ERROR") for issue in report["issues"]):
+        return report
+
+    # 分割
+    start = time.perf_counter()
+    table_dir = os.path.join(work_dir, table_name.lower())
+    os.makedirs(table_dir, exist_ok=True)
+    _, csv_rows, files = split_csv(csv_path, table_dir, table_name.lower(), args.chunk_size_mb)
+    report["split_sec"] = time.perf_counter() - start
+    report["files"] = len(files)
+    report["csv_rows"] = csv_rows
+
+    # アップロード（PUTのparallelでファイルを並列転送）
+    start = time.perf_counter()
+    stage_path = f"@{args.stage}/{table_name.lower()}/"
+    session.sql(f"REMOVE {stage_path}").collect()
+    session.file.put(
+        os.path.join(table_dir, "*.csv.gz"),
+        stage_path,
+        auto_compress=False,
+        parallel=args.upload_parallel,
+        overwrite=True,
+    )
+    report["upload_sec"] = time.perf_counter() - start
+
+    # COPY INTO
+    start = time.perf_counter()
+    if args.truncate:
+        session.sql(f"TRUNCATE TABLE {table_name}").collect()
+    before = session.sql(f"SELECT COUNT(*) AS cnt FROM {table_name}").collect()[0]["CNT"]
+    results = session.sql(f"""
+        COPY INTO {table_name}
+        FROM {stage_path}
+        FILE_FORMAT = ({get_file_format(table_name)})
+        ON_ERROR = {args.on_error}
+        FORCE = TRUE
+    """).collect()
+    report["copy_sec"] = time.perf_counter() - start
+
+    for row in results:
+        data = row.as_dict()
+        if "rows_loaded" not in data:
+            continue
+        report["error_rows"] += data.get("errors_seen") or 0
+        if data.get("first_error"):
+            report["errors"].append(
+                f"{data['file']}: {data['first_error']} (line {data.get('first_error_line')})"
+            )
+
+    # 件数照合（テーブルの増分とCSVの行数を比較）
+    after = session.sql(f"SELECT COUNT(*) AS cnt FROM {table_name}").collect()[0]["CNT"]
+    report["loaded_rows"] = after - before
+    if report["loaded_rows"] != csv_rows:
+        report["issues"].append(
+            f"ERROR: 件数が一致しません（CSV {csv_rows:,}件 / ロード {report['loaded_rows']:,}件）"
+        )
+    return report
+
+
+def print_report(reports: list, total_sec: float):
+    """テーブルごとのタイミングレポートを出力する"""
+    print()
+    print(f"{'TABLE':<45}{'FILES':>6}{'CSV ROWS':>12}{'LOADED':>12}{'ERRORS':>8}"
+          f"{'SPLIT(s)':>10}{'PUT(s)':>9}{'COPY(s)':>9}")
+    for report in reports:
+        print(f"{report['table']:<45}{report['files']:>6}{report['csv_rows']:>12,}{report['loaded_rows']:>12,}"
+              f"{report['error_rows']:>8,}{report['split_sec']:>10.1f}{report['upload_sec']:>9.1f}"
+              f"{report['copy_sec']:>9.1f}")
+        for issue in report["issues"]:
+            print(f"    {issue}")
+        for error in report["errors"]:
+            print(f"    COPY: {error}")
+    print(f"\n合計所要時間: {total_sec:.1f}秒")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="data/ 配下のCSVを並列にバルクロードします")
+    parser.add_argument("--connection", default="default",
+                        help="~/.snowflake/connections.toml の接続名")
+    parser.add_argument("--table", action="append", default=[], metavar="TABLE=PATH",
+                        help="ロード対象（複数指定可）。省略時は data/ の既定のCSVをロード")
+    parser.add_argument("--stage", default=DEFAULT_STAGE, help="アップロード先の内部ステージ")
+    parser.add_argument("--chunk-size-mb", type=int, default=DEFAULT_CHUNK_SIZE_MB,
+                        help="分割後ファイルの非圧縮サイズの目安（MB）")
+    parser.add_argument("--max-workers", type=int, default=4, help="同時にロードするテーブル数")
+    parser.add_argument("--upload-parallel", type=int, default=8, help="PUTの並列スレッド数")
+    parser.add_argument("--on-error", default="CONTINUE",
+                        choices=["CONTINUE", "SKIP_FILE", "ABORT_STATEMENT"],
+                        help="COPY INTOのON_ERROR")
+    parser.add_argument("--truncate", action="store_true", help="ロード前にテーブルを空にする")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+
+    if args.table:
+        tables = dict(spec.split("=", 1) for spec in args.table)
+    else:
+        tables = {name: os.path.join(REPO_ROOT, path) for name, path in DEFAULT_TABLES.items()}
+
+    session = Session.builder.config("connection_name", args.connection).create()
+    session.sql(f"CREATE STAGE IF NOT EXISTS {args.stage} ENCRYPTION = (TYPE = 'SNOWFLAKE_SSE')").collect()
+
+    work_dir = tempfile.mkdtemp(prefix="bulk_load_")
+    reports = []
+    start = time.perf_counter()
+    try:
+        with ThreadPoolExecutor(max_workers=args.max_workers) as executor:
+            futures = {
+                executor.submit(load_table, session, table_name.upper(), csv_path, work_dir, args): table_name
+                for table_name, csv_path in tables.items()
+            }
+            for future in as_completed(futures):
+                try:
+                    reports.append(future.result())
+                except Exception as e:
+                    reports.append({
+                        "table": futures[future].upper(), "files": 0, "csv_rows": 0, "loaded_rows": 0,
+                        "error_rows": 0, "split_sec": 0.0, "upload_sec": 0.0, "copy_sec": 0.0,
+                        "issues": [f"ERROR: {e}"], "errors": [],
+                    })
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+        session.close()
+
+    reports.sort(key=lambda report: report["table"])
+    print_report(reports, time.perf_counter() - start)
+
+    failed = any(issue.startswith("ERROR") for report in reports for issue in report["issues"])
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,363 @@
+# =========================================================
+# Snowflake Cortex Handson
+# 埋め込みベクトルの圧縮ツール（次元削減・int8量子化）
+# =========================================================
+# 概要: REVIEW_CHUNK_EMBEDDINGS（レビューチャンクのモデル別埋め込み）と PRODUCT_MASTER_EMBED（商品マスタ）の
+#       1024次元のfloatベクトルを、PCAまたは先頭次元の切り出しで次元削減し、
+#       int8に量子化した圧縮テーブルを作成する。
+#       レビューチャンクは --model で指定したモデルの埋め込みのみを対象にする
+#       （CUSTOMER_ANALYSIS.embedding は生成モデルが混在するため使用しない）。
+#       フル精度を正解とした recall@k と、取得・検索の所要時間を比較してレポートする。
+#       int8の検索時間は、int8の値のまま内積を計算（int32で累積）した場合の時間を計測する。
+#
+#       圧縮テーブル:
+#         <元テーブル>[_<モデル>]_EMB<次元数>      : id, embedding VECTOR(FLOAT, 次元数)（SQLの類似度計算に使用可）
+#         <元テーブル>[_<モデル>]_EMB<次元数>_INT8 : id, embedding_int8 BINARY, scale FLOAT（取得・転送用）
+#
+# 使い方:
+#   python tools/compact_embeddings.py --connection default --dims 256
+#   python tools/compact_embeddings.py --dataset reviews --model voyage-multilingual-2 --dims 256
+#   python tools/compact_embeddings.py --dataset products --reduction truncate --dims 512 --write
+# =========================================================
+
+import argparse
+import json
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+from snowflake.snowpark import Session
+
+# 対象データ（名称: (元テーブル, ID列, ベクトル列, モデル列)）
+# モデル列があるテーブルは --model で指定したモデルの行のみを対象にする
+DATASETS = {
+    "reviews": ("REVIEW_CHUNK_EMBEDDINGS", "chunk_id", "embedding", "model"),
+    "products": ("PRODUCT_MASTER_EMBED", "product_id", "product_name_embed", None),
+}
+
+# レビューチャンクの既定の埋め込みモデル（Step1の前処理の既定値）
+DEFAULT_MODEL = "multilingual-e5-large"
+
+# 商品マッチングのクエリ（取引データの商品名）と埋め込みモデル
+PRODUCT_QUERY_TABLE = "EC_DATA_WITH_PRODUCT_MASTER"
+PRODUCT_QUERY_MODEL = "multilingual-e5-large"
+
+DEFAULT_DIMS = 256
+DEFAULT_K = 10
+DEFAULT_QUERIES = 200
+DEFAULT_FIT_SAMPLE = 20000
+
+
+# =========================================================
+# ベクトルの取得
+# =========================================================
+def _to_matrix(values) -> np.ndarray:
+    """VECTOR列の値（リストまたはJSON文字列）を行列にする"""
+    return np.array(
+        [json.loads(value) if isinstance(value, str) else value for value in values],
+        dtype=np.float32,
+    )
+
+
+def fetch_vectors(session: Session, table: str, id_col: str, vector_col: str,
+                  model_col: str = None, model: str = None) -> tuple:
+    """
+    テーブルのIDとベクトルを取得する（model_colを指定した場合はそのモデルの行のみ）
+
+    Returns:
+        tuple: (IDのリスト, ベクトル行列, 取得秒数)
+    """
+    model_clause = f"AND {model_col} = ?" if model_col else ""
+    start = time.perf_counter()
+    rows = session.sql(f"""
+        SELECT {id_col} AS id, {vector_col} AS embedding
+        FROM {table}
+        WHERE {vector_col} IS NOT NULL
+          {model_clause}
+        ORDER BY {id_col}
+    """, params=[model] if model_col else None).collect()
+    elapsed = time.perf_counter() - start
+    return [row["ID"] for row in rows], _to_matrix(row["EMBEDDING"] for row in rows), elapsed
+
+
+def fetch_int8_vectors(session: Session, table: str) -> tuple:
+    """
+    int8圧縮テーブルのIDとベクトルを取得する
+
+    Returns:
+        tuple: (IDのリスト, int8行列, スケール配列, 取得秒数)
+    """
+    start = time.perf_counter()
+    rows = session.sql(f"SELECT id, embedding_int8, scale FROM {table} ORDER BY id").collect()
+    elapsed = time.perf_counter() - start
+    codes = np.stack([np.frombuffer(bytes(row["EMBEDDING_INT8"]), dtype=np.int8) for row in rows])
+    scales = np.array([row["SCALE"] for row in rows], dtype=np.float32)
+    return [row["ID"] for row in rows], codes, scales, elapsed
+
+
+def fetch_product_queries(session: Session, count: int) -> tuple:
+    """
+    商品マッチングの評価用に、取引データの商品名をマスタと同じモデルで埋め込む
+
+    Returns:
+        tuple: (商品名のリスト, ベクトル行列)
+    """
+    rows = session.sql(f"""
+        SELECT product_name, SNOWFLAKE.CORTEX.EMBED_TEXT_1024('{PRODUCT_QUERY_MODEL}', product_name) AS embedding
+        FROM (SELECT DISTINCT product_name FROM {PRODUCT_QUERY_TABLE})
+        ORDER BY HASH(product_name)
+        LIMIT {int(count)}
+    """).collect()
+    return [row["PRODUCT_NAME"] for row in rows], _to_matrix(row["EMBEDDING"] for row in rows)
+
+
+# =========================================================
+# 次元削減・量子化
+# =========================================================
+def normalize(vectors: np.ndarray) -> np.ndarray:
+    """L2正規化する（コサイン類似度を内積で計算するため）"""
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+
+def fit_pca(vectors: np.ndarray, dims: int, sample: int, seed: int = 42) -> tuple:
+    """
+    PCAの射影を学習する（件数が多い場合は無作為抽出した行で学習）
+
+    Returns:
+        tuple: (平均ベクトル, 射影行列[元の次元 x dims])
+    """
+    rng = np.random.default_rng(seed)
+    if len(vectors) > sample:
+        vectors = vectors[rng.choice(len(vectors), sample, replace=False)]
+    mean = vectors.mean(axis=0)
+    _, _, components = np.linalg.svd(vectors - mean, full_matrices=False)
+    return mean, components[:dims].T
+
+
+def reduce(vectors: np.ndarray, dims: int, method: str, projection: tuple = None) -> np.ndarray:
+    """
+    次元削減して正規化する
+
+    Args:
+        vectors: 元のベクトル
+        dims: 削減後の次元数
+        method: "pca"（projectionが必要）または "truncate"（先頭dims次元を使用）
+        projection: fit_pca()の戻り値
+    """
+    if method == "pca":
+        mean, matrix = projection
+        return normalize((vectors - mean) @ matrix)
+    return normalize(vectors[:, :dims])
+
+
+def quantize_int8(vectors: np.ndarray) -> tuple:
+    """
+    ベクトルごとの対称スケールでint8に量子化する
+
+    Returns:
+        tuple: (int8行列, スケール配列)  元の値 ≒ int8値 × スケール
+    """
+    scales = np.abs(vectors).max(axis=1) / 127.0
+    scales = np.where(scales == 0, 1.0, scales).astype(np.float32)
+    codes = np.clip(np.round(vectors / scales[:, None]), -127, 127).astype(np.int8)
+    return codes, scales
+
+
+# =========================================================
+# 評価
+# =========================================================
+def top_k(queries: np.ndarray, items: np.ndarray, k: int, exclude_self: bool = False) -> np.ndarray:
+    """内積（正規化済みならコサイン類似度）の上位k件のインデックス"""
+    return _top_k_scores(queries @ items.T, len(queries), k, exclude_self)
+
+
+def top_k_int8(query_codes: np.ndarray, codes: np.ndarray, scales: np.ndarray, k: int,
+               exclude_self: bool = False) -> np.ndarray:
+    """
+    int8のまま内積を計算した上位k件のインデックス
+
+    int8同士の内積はint32で累積し、アイテムごとのスケールを掛けて順位を決める
+    （クエリのスケールは順位に影響しないため掛けない）。
+    """
+    scores = (query_codes.astype(np.int32) @ codes.astype(np.int32).T) * scales[None, :]
+    return _top_k_scores(scores, len(query_codes), k, exclude_self)
+
+
+def _top_k_scores(scores: np.ndarray, n_queries: int, k: int, exclude_self: bool) -> np.ndarray:
+    """スコア行列の上位k件のインデックス"""
+    items = scores.shape[1]
+    if exclude_self:
+        np.fill_diagonal(scores[:, :n_queries], -np.inf)
+    k = min(k, items)
+    idx = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    order = np.argsort(-np.take_along_axis(scores, idx, axis=1), axis=1)
+    return np.take_along_axis(idx, order, axis=1)
+
+
+def recall_at_k(truth: np.ndarray, found: np.ndarray) -> float:
+    """正解（フル精度の上位k件）のうち見つかった割合の平均"""
+    hits = [len(set(t) & set(f)) / len(t) for t, f in zip(truth, found)]
+    return float(np.mean(hits)) if hits else 0.0
+
+
+def time_search(queries: np.ndarray, items: np.ndarray, k: int, exclude_self: bool) -> tuple:
+    """検索結果とクエリ1件あたりの検索時間（ミリ秒）"""
+    start = time.perf_counter()
+    result = top_k(queries, items, k, exclude_self)
+    return result, (time.perf_counter() - start) * 1000 / max(len(queries), 1)
+
+
+def time_search_int8(query_codes: np.ndarray, codes: np.ndarray, scales: np.ndarray, k: int,
+                     exclude_self: bool) -> tuple:
+    """int8表現での検索結果とクエリ1件あたりの検索時間（ミリ秒）"""
+    start = time.perf_counter()
+    result = top_k_int8(query_codes, codes, scales, k, exclude_self)
+    return result, (time.perf_counter() - start) * 1000 / max(len(query_codes), 1)
+
+
+# =========================================================
+# 圧縮テーブルの作成
+# =========================================================
+def write_reduced_table(session: Session, table: str, ids: list, vectors: np.ndarray):
+    """次元削減したベクトルを VECTOR(FLOAT, n) 列のテーブルとして作成する"""
+    staging = f"{table}_STAGING"
+    df = pd.DataFrame({"ID": ids, "EMBEDDING": [json.dumps(v.tolist()) for v in vectors]})
+    session.write_pandas(df, staging, auto_create_table=True, overwrite=True, table_type="temporary")
+    session.sql(f"""
+        CREATE OR REPLACE TABLE {table} AS
+        SELECT id, PARSE_JSON(embedding)::ARRAY::VECTOR(FLOAT, {vectors.shape[1]}) AS embedding
+        FROM {staging}
+    """).collect()
+
+
+def write_int8_table(session: Session, table: str, ids: list, codes: np.ndarray, scales: np.ndarray):
+    """int8量子化したベクトルを BINARY 列（1次元1バイト）のテーブルとして作成する"""
+    staging = f"{table}_STAGING"
+    df = pd.DataFrame({
+        "ID": ids,
+        "EMBEDDING_HEX": [row.tobytes().hex() for row in codes],
+        "SCALE": scales.astype(float),
+    })
+    session.write_pandas(df, staging, auto_create_table=True, overwrite=True, table_type="temporary")
+    session.sql(f"""
+        CREATE OR REPLACE TABLE {table} AS
+        SELECT id, TO_BINARY(embedding_hex, 'HEX') AS embedding_int8, scale
+        FROM {staging}
+    """).collect()
+
+
+# =========================================================
+# 実行
+# =========================================================
+def run_dataset(session: Session, name: str, args) -> list:
+    """
+    1データセット分の圧縮と評価を行う
+
+    Returns:
+        list: 表現ごとの評価結果
+    """
+    table, id_col, vector_col, model_col = DATASETS[name]
+    ids, full, full_fetch_sec = fetch_vectors(session, table, id_col, vector_col, model_col, args.model)
+    if len(ids) == 0:
+        target = f"{table}（モデル: {args.model}）" if model_col else table
+        print(f"{target}: ベクトルがありません。スキップします。")
+        return []
+    full = normalize(full)
+
+    # 評価用クエリ（レビューは自身を除く類似チャンク、商品は取引データの商品名）
+    if name == "products":
+        _, queries = fetch_product_queries(session, args.queries)
+        queries = normalize(queries)
+        exclude_self = False
+    else:
+        queries = full[: args.queries]
+        exclude_self = True
+
+    projection = fit_pca(full, args.dims, args.fit_sample) if args.reduction == "pca" else None
+    reduced = reduce(full, args.dims, args.reduction, projection)
+    reduced_queries = reduce(queries, args.dims, args.reduction, projection)
+    codes, scales = quantize_int8(reduced)
+    query_codes, _ = quantize_int8(reduced_queries)
+    # PCAは件数より多い次元を作れないため、実際の次元数を使う
+    dims = reduced.shape[1]
+
+    truth, full_ms = time_search(queries, full, args.k, exclude_self)
+    found_reduced, reduced_ms = time_search(reduced_queries, reduced, args.k, exclude_self)
+    found_int8, int8_ms = time_search_int8(query_codes, codes, scales, args.k, exclude_self)
+
+    results = [
+        {"dataset": name, "representation": f"float32 x {full.shape[1]}", "bytes": full.shape[1] * 4,
+         "recall": 1.0, "search_ms": full_ms, "fetch_sec": full_fetch_sec},
+        {"dataset": name, "representation": f"float32 x {dims} ({args.reduction})", "bytes": dims * 4,
+         "recall": recall_at_k(truth, found_reduced), "search_ms": reduced_ms, "fetch_sec": None},
+        {"dataset": name, "representation": f"int8 x {dims} ({args.reduction})", "bytes": dims + 4,
+         "recall": recall_at_k(truth, found_int8), "search_ms": int8_ms, "fetch_sec": None},
+    ]
+
+    if args.write:
+        # モデル別のテーブルはモデル名を付けて区別する
+        base = f"{table}_{''.join(ch if ch.isalnum() else '_' for ch in args.model).upper()}" if model_col else table
+        reduced_table = f"{base}_EMB{dims}"
+        int8_table = f"{reduced_table}_INT8"
+        write_reduced_table(session, reduced_table, ids, reduced)
+        write_int8_table(session, int8_table, ids, codes, scales)
+        results[1]["fetch_sec"] = fetch_vectors(session, reduced_table, "id", "embedding")[2]
+        results[2]["fetch_sec"] = fetch_int8_vectors(session, int8_table)[3]
+        print(f"{table}: {reduced_table} / {int8_table} を作成しました（{len(ids):,}件）")
+        if projection is not None and args.save_projection:
+            np.savez(f"{args.save_projection}_{name}.npz", mean=projection[0], matrix=projection[1])
+
+    return results
+
+
+def print_report(results: list, k: int):
+    """表現ごとのサイズ・recall@k・所要時間を出力する"""
+    print()
+    print(f"{'DATASET':<10}{'REPRESENTATION':<32}{'BYTES/VEC':>10}{f'RECALL@{k}':>11}"
+          f"{'SEARCH(ms/q)':>14}{'FETCH(s)':>10}")
+    for r in results:
+        fetch = f"{r['fetch_sec']:.2f}" if r["fetch_sec"] is not None else "-"
+        print(f"{r['dataset']:<10}{r['representation']:<32}{r['bytes']:>10,}{r['recall']:>11.3f}"
+              f"{r['search_ms']:>14.3f}{fetch:>10}")
+    print()
+    print("※int8の検索時間はint8の値のままint32で累積した内積の計算時間（numpyの整数演算はBLASを使わないため、"
+          "float32より遅くなることがあります）")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="埋め込みベクトルを次元削減・int8量子化し、精度と速度を比較します")
+    parser.add_argument("--connection", default="default",
+                        help="~/.snowflake/connections.toml の接続名")
+    parser.add_argument("--dataset", action="append", choices=list(DATASETS),
+                        help="対象データ（複数指定可）。省略時はすべて")
+    parser.add_argument("--model", default=DEFAULT_MODEL,
+                        help="レビューチャンクの埋め込みモデル（REVIEW_CHUNK_EMBEDDINGS.model）")
+    parser.add_argument("--dims", type=int, default=DEFAULT_DIMS, help="削減後の次元数")
+    parser.add_argument("--reduction", choices=["pca", "truncate"], default="pca",
+                        help="次元削減の方法（truncateはMatryoshka対応モデル向け）")
+    parser.add_argument("--k", type=int, default=DEFAULT_K, help="recall@kのk")
+    parser.add_argument("--queries", type=int, default=DEFAULT_QUERIES, help="評価に使うクエリ数")
+    parser.add_argument("--fit-sample", type=int, default=DEFAULT_FIT_SAMPLE, help="PCAの学習に使う最大件数")
+    parser.add_argument("--write", action="store_true", help="圧縮テーブルを作成し、取得時間も計測する")
+    parser.add_argument("--save-projection", metavar="PREFIX",
+                        help="PCAの射影（クエリの変換に使用）を <PREFIX>_<dataset>.npz に保存する")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    session = Session.builder.config("connection_name", args.connection).create()
+    results = []
+    try:
+        for name in args.dataset or list(DATASETS):
+            results.extend(run_dataset(session, name, args))
+    finally:
+        session.close()
+    print_report(results, args.k)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
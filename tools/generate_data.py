@@ -0,0 +1,344 @@
+# =========================================================
+# Snowflake Cortex Handson
+# 大規模サンプルデータ生成ツール
+# =========================================================
+# 概要: CUSTOMER_REVIEWS / EC_DATA / RETAIL_DATA / PRODUCT_MASTER と同じ形の
+#       データを任意の件数（1千〜1億件）で生成する。
+#       data/ 配下の既存ファイルを種データとして、購入チャネル・評価の分布、
+#       レビュー本文の重複、【店頭】［期間限定］や空白・半角カナなどの
+#       商品名の表記ゆれを再現する。シードが同じなら出力は常に同一。
+#       行は逐次生成してファイル分割しながら書き出すため、メモリ使用量は一定。
+#
+# 使い方:
+#   python tools/generate_data.py --scale 1000000 --out-dir /tmp/snowretail
+#   python tools/generate_data.py --tables CUSTOMER_REVIEWS --reviews 100000000 --format parquet
+# =========================================================
+
+import argparse
+import csv
+import os
+import random
+import sys
+import unicodedata
+from datetime import date, datetime, timedelta
+
+# リポジトリのルート
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATA_DIR = os.path.join(REPO_ROOT, "data")
+
+TABLES = ["PRODUCT_MASTER", "CUSTOMER_REVIEWS", "EC_DATA", "RETAIL_DATA"]
+
+# 既存データの分布（customer_reviews.csv: 店舗16件 / EC14件、評価5>1>4>3>2）
+CHANNEL_WEIGHTS = {"店舗": 16, "EC": 14}
+RATING_WEIGHTS = {5.0: 8, 1.0: 7, 4.0: 6, 3.0: 5, 2.0: 4}
+
+# 既存のレビュー本文をそのまま使う割合（残りは同じ評価の文を組み合わせる）
+DUPLICATE_TEXT_RATIO = 0.7
+
+REVIEW_DATE_START = datetime(2024, 9, 22, 21, 35, 41, 227000)
+REVIEW_DATE_END = datetime(2025, 3, 7, 21, 35, 41, 227000)
+TRANSACTION_DATE_START = date(2023, 1, 1)
+TRANSACTION_DATE_END = date(2023, 12, 28)
+
+# 商品名の表記ゆれ（ec_data.csv / retail_data.csv に現れるもの）
+PROMO_TAGS = [
+    "[期間限定]", "【期間限定】", "（期間限定）", "［期間限定］", "＜期間限定＞",
+    "[半額セール]", "【半額セール】", "（半額セール）", "［半額セール］", "＜半額セール＞",
+]
+RETAIL_ONLY_PROMO_TAGS = ["[閉店セール]", "【閉店セール】"]
+CHANNEL_TAGS = {"EC": "（ネット）", "RETAIL": "【店頭】"}
+
+# 全角カタカナ → 半角カタカナ（濁点・半濁点はNFDで分解して付与）
+_HALF_KANA = dict(zip(
+    "アイウエオカキクケコサシスセソタチツテトナニヌネノハヒフヘホマミムメモヤユヨラリルレロワヲンァィゥェォッャュョー",
+    "ｱｲｳｴｵｶｷｸｹｺｻｼｽｾｿﾀﾁﾂﾃﾄﾅﾆﾇﾈﾉﾊﾋﾌﾍﾎﾏﾐﾑﾒﾓﾔﾕﾖﾗﾘﾙﾚﾛﾜｦﾝｧｨｩｪｫｯｬｭｮｰ",
+))
+_HALF_MARKS = {"゙": "ﾞ", "゚": "ﾟ"}
+
+DEFAULT_ROWS_PER_FILE = 1_000_000
+PARQUET_BATCH_ROWS = 100_000
+
+
+# =========================================================
+# 種データの読み込み
+# =========================================================
+def load_seed_products() -> list:
+    """product_master.csv を (商品名, 単価) のリストとして読み込む"""
+    with open(os.path.join(DATA_DIR, "product_master.csv"), newline="", encoding="utf-8") as f:
+        return [(row["product_name"], int(row["unit_price"])) for row in csv.DictReader(f)]
+
+
+def load_seed_reviews() -> dict:
+    """customer_reviews.csv の本文を評価ごとにまとめて読み込む"""
+    texts = {}
+    with open(os.path.join(DATA_DIR, "customer_reviews.csv"), newline="", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            texts.setdefault(float(row["RATING"]), []).append(row["REVIEW_TEXT"])
+    return texts
+
+
+# =========================================================
+# 表記ゆれ
+# =========================================================
+def to_half_kana(text: str, rng: random.Random, ratio: float) -> str:
+    """カタカナを一定割合で半角カナに変換する（ﾕﾆｸﾛ ﾋｰﾄﾃッｸ のような混在を再現）"""
+    out = []
+    for char in text:
+        if rng.random() >= ratio:
+            out.append(char)
+            continue
+        decomposed = unicodedata.normalize("NFD", char)
+        base = _HALF_KANA.get(decomposed[0])
+        if base is None:
+            out.append(char)
+        else:
+            out.append(base + "".join(_HALF_MARKS.get(mark, "") for mark in decomposed[1:]))
+    return "".join(out)
+
+
+def to_full_width(text: str) -> str:
+    """英数字・記号・空白を全角にする（ＲＥＧＺＡ ４３Ｓ３２ のような表記）"""
+    return "".join(
+        chr(ord(char) + 0xFEE0) if "!" <= char <= "~" else ("　" if char == " " else char)
+        for char in text
+    )
+
+
+def noisy_product_name(name: str, channel: str, rng: random.Random) -> str:
+    """
+    マスタの商品名から取引データの表記ゆれを生成する
+
+    Args:
+        name: 商品マスタの商品名
+        channel: "EC" または "RETAIL"
+        rng: 乱数生成器
+
+    Returns:
+        str: 表記ゆれを加えた商品名
+    """
+    words = name.split(" ")
+
+    # メーカー名の省略（アタック洗剤、ミルクチョコレート）
+    if len(words) > 1 and rng.random() < 0.15:
+        words = words[1:]
+
+    roll = rng.random()
+    if roll < 0.2:
+        noisy = "".join(words)                   # 空白の削除
+    elif roll < 0.4:
+        noisy = "  ".join(words)                 # 空白の重複
+    else:
+        noisy = " ".join(words)
+
+    if rng.random() < 0.2:
+        noisy = noisy.replace("-", "")           # 型番のハイフン削除
+    if rng.random() < 0.1:
+        noisy = noisy.lower()                    # 型番の小文字化
+    if rng.random() < 0.1:
+        noisy = to_half_kana(noisy, rng, 0.7)
+    elif rng.random() < 0.05:
+        noisy = to_full_width(noisy)
+
+    if rng.random() < 0.5:
+        noisy += CHANNEL_TAGS[channel]
+    tags = PROMO_TAGS + (RETAIL_ONLY_PROMO_TAGS if channel == "RETAIL" else [])
+    noisy += rng.choice(tags)
+    return noisy
+
+
+# =========================================================
+# 行の生成
+# =========================================================
+def _id(prefix: str, number: int, width: int) -> str:
+    return f"{prefix}{number:0{width}d}"
+
+
+def product_at(index: int, seed_products: list, seed: int) -> tuple:
+    """
+    index番目の商品（商品ID, 商品名, 単価）を決定的に生成する
+
+    取引データから商品を参照するたびに同じ値を返すため、
+    商品数が多くてもマスタをメモリに保持する必要がない。
+    """
+    base_name, base_price = seed_products[index % len(seed_products)]
+    generation = index // len(seed_products)
+    if generation == 0:
+        return _id("P", index + 1, 3), base_name, base_price
+    rng = random.Random(seed * 1_000_003 + index)
+    name = f"{base_name} {rng.choice('ABCDEFGHJKLMNPRSTVWXZ')}{generation}"
+    price = max(10, round(base_price * rng.uniform(0.8, 1.2), -1))
+    return _id("P", index + 1, 3), name, int(price)
+
+
+def generate_products(count: int, seed_products: list, seed: int):
+    """PRODUCT_MASTER の行を生成する"""
+    for index in range(count):
+        yield product_at(index, seed_products, seed)
+
+
+def generate_transactions(count: int, channel: str, product_count: int, seed_products: list, seed: int):
+    """EC_DATA / RETAIL_DATA の行を生成する"""
+    rng = random.Random(f"{seed}-{channel}")
+    prefix = "E" if channel == "EC" else "R"
+    width = max(6, len(str(count)))
+    days = (TRANSACTION_DATE_END - TRANSACTION_DATE_START).days
+    for number in range(1, count + 1):
+        product_id, name, price = product_at(rng.randrange(product_count), seed_products, seed)
+        quantity = rng.randint(1, 5)
+        transaction_date = TRANSACTION_DATE_START + timedelta(days=rng.randint(0, days))
+        yield (
+            _id(prefix, number, width), transaction_date.isoformat(), product_id,
+            noisy_product_name(name, channel, rng), quantity, price, quantity * price,
+        )
+
+
+def generate_reviews(count: int, product_count: int, seed_texts: dict, seed: int):
+    """CUSTOMER_REVIEWS の行を生成する"""
+    rng = random.Random(f"{seed}-reviews")
+    channels, channel_weights = zip(*CHANNEL_WEIGHTS.items())
+    ratings, rating_weights = zip(*RATING_WEIGHTS.items())
+    sentences = {
+        rating: [s + "。" for text in texts for s in text.split("。") if s.strip()]
+        for rating, texts in seed_texts.items()
+    }
+    width = max(3, len(str(count)))
+    customer_count = max(400, count // 5)
+    span = int((REVIEW_DATE_END - REVIEW_DATE_START).total_seconds())
+
+    for number in range(1, count + 1):
+        rating = rng.choices(ratings, rating_weights)[0]
+        if rng.random() < DUPLICATE_TEXT_RATIO:
+            text = rng.choice(seed_texts[rating])
+        else:
+            text = "".join(rng.sample(sentences[rating], min(2, len(sentences[rating]))))
+        review_date = REVIEW_DATE_START + timedelta(seconds=rng.randint(0, span))
+        yield (
+            _id("R", number, width),
+            _id("P", rng.randrange(product_count) + 1, 3),
+            _id("C", rng.randrange(customer_count) + 1, 4),
+            rating,
+            text,
+            review_date.strftime("%Y-%m-%d %H:%M:%S.%f")[:-3],
+            rng.choices(channels, channel_weights)[0],
+            rng.randint(0, 20),
+        )
+
+
+# =========================================================
+# 出力
+# =========================================================
+HEADERS = {
+    "PRODUCT_MASTER": ["product_id", "product_name", "unit_price"],
+    "CUSTOMER_REVIEWS": ["REVIEW_ID", "PRODUCT_ID", "CUSTOMER_ID", "RATING", "REVIEW_TEXT",
+                         "REVIEW_DATE", "PURCHASE_CHANNEL", "HELPFUL_VOTES"],
+    "EC_DATA": ["transaction_id", "transaction_date", "product_id", "product_name",
+                "quantity", "unit_price", "total_price"],
+    "RETAIL_DATA": ["transaction_id", "transaction_date", "product_id", "product_name",
+                    "quantity", "unit_price", "total_price"],
+}
+
+
+def write_csv(rows, header: list, out_dir: str, prefix: str, rows_per_file: int) -> list:
+    """行をrows_per_file件ごとにCSVファイルへ書き出す"""
+    files = []
+    out = None
+    writer = None
+    for number, row in enumerate(rows):
+        if number % rows_per_file == 0:
+            if out is not None:
+                out.close()
+            path = os.path.join(out_dir, f"{prefix}_{len(files):05d}.csv")
+            out = open(path, "w", newline="", encoding="utf-8")
+            writer = csv.writer(out)
+            writer.writerow(header)
+            files.append(path)
+        writer.writerow(row)
+    if out is not None:
+        out.close()
+    return files
+
+
+def write_parquet(rows, header: list, out_dir: str, prefix: str, rows_per_file: int) -> list:
+    """行をrows_per_file件ごとにParquetファイルへ書き出す（pyarrowが必要）"""
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise SystemExit("Parquet出力には pyarrow が必要です: pip install pyarrow")
+
+    files = []
+    writer = None
+    batch = []
+    written = 0
+
+    def flush():
+        nonlocal batch
+        if batch:
+            writer.write_table(pa.Table.from_pylist([dict(zip(header, row)) for row in batch]))
+            batch = []
+
+    for row in rows:
+        if written % rows_per_file == 0:
+            if writer is not None:
+                flush()
+                writer.close()
+            path = os.path.join(out_dir, f"{prefix}_{len(files):05d}.parquet")
+            writer = None
+            files.append(path)
+        batch.append(row)
+        written += 1
+        if writer is None:
+            writer = pq.ParquetWriter(
+                files[-1], pa.Table.from_pylist([dict(zip(header, row))]).schema, compression="zstd"
+            )
+        if len(batch) >= PARQUET_BATCH_ROWS:
+            flush()
+    if writer is not None:
+        flush()
+        writer.close()
+    return files
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="大規模なサンプルデータを生成します")
+    parser.add_argument("--out-dir", required=True, help="出力先ディレクトリ")
+    parser.add_argument("--tables", nargs="+", default=TABLES, choices=TABLES, help="生成するテーブル")
+    parser.add_argument("--scale", type=int, default=1000,
+                        help="レビュー・EC・店舗データの件数（個別指定がない場合）")
+    parser.add_argument("--reviews", type=int, help="CUSTOMER_REVIEWS の件数")
+    parser.add_argument("--ec", type=int, help="EC_DATA の件数")
+    parser.add_argument("--retail", type=int, help="RETAIL_DATA の件数")
+    parser.add_argument("--products", type=int, default=100, help="PRODUCT_MASTER の件数")
+    parser.add_argument("--seed", type=int, default=42, help="乱数シード")
+    parser.add_argument("--format", choices=["csv", "parquet"], default="csv", help="出力形式")
+    parser.add_argument("--rows-per-file", type=int, default=DEFAULT_ROWS_PER_FILE,
+                        help="1ファイルあたりの行数")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    seed_products = load_seed_products()
+    seed_texts = load_seed_reviews()
+    writer = write_parquet if args.format == "parquet" else write_csv
+
+    generators = {
+        "PRODUCT_MASTER": lambda: generate_products(args.products, seed_products, args.seed),
+        "CUSTOMER_REVIEWS": lambda: generate_reviews(
+            args.reviews or args.scale, args.products, seed_texts, args.seed),
+        "EC_DATA": lambda: generate_transactions(
+            args.ec or args.scale, "EC", args.products, seed_products, args.seed),
+        "RETAIL_DATA": lambda: generate_transactions(
+            args.retail or args.scale, "RETAIL", args.products, seed_products, args.seed),
+    }
+
+    for table in args.tables:
+        table_dir = os.path.join(args.out_dir, table.lower())
+        os.makedirs(table_dir, exist_ok=True)
+        files = writer(generators[table](), HEADERS[table], table_dir, table.lower(), args.rows_per_file)
+        print(f"{table}: {len(files)}ファイル -> {table_dir}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
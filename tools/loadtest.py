@@ -0,0 +1,584 @@
+# =========================================================
+# Snowflake Cortex Handson
+# Streamlitアプリの同時利用負荷テストツール
+# =========================================================
+# 概要: mainpage.py と Step1・Step2 ページを、1つのアプリプロセス内で
+#       N人分のセッションとして同時に実行する（streamlit.testing の AppTest を使用）。
+#       Snowflakeには接続せず、ローカルのSnowpark代替セッションがクエリの種類ごとに
+#       一定の待ち時間を置いて合成した結果を返す。
+#       セッション数ごとに、セッションあたりのクエリ数（種類別）、再実行時間の p50/p95、
+#       プロセスのRSSの増加量、ユーティリティのロック競合をレポートする。
+#
+# 使い方:
+#   python tools/loadtest.py
+#   python tools/loadtest.py --sessions 1,10,50,100,200 --journey browse --journey classify
+#   python tools/loadtest.py --latency-ms 20 --rows 5000 --output load_test.json
+# =========================================================
+
+import argparse
+import csv
+import datetime
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import snowflake.snowpark.context
+from snowflake.snowpark import Row
+from streamlit.testing.v1 import AppTest
+
+# リポジトリのルートとアプリのディレクトリ
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP_DIR = os.path.join(REPO_ROOT, "handson2", "minimal")
+
+MAIN_PAGE = os.path.join(APP_DIR, "mainpage.py")
+PREPARE_PAGE = "pages/_1_データ準備.py"
+VOICE_PAGE = "pages/_2_顧客の声分析.py"
+
+# レビューの合成に使うCSV
+REVIEWS_CSV = os.path.join(REPO_ROOT, "data", "customer_reviews.csv")
+
+# 代替セッション上に存在するものとして扱うテーブル
+DEFAULT_TABLES = [
+    "CUSTOMER_REVIEWS",
+    "CUSTOMER_ANALYSIS",
+    "SNOW_RETAIL_DOCUMENTS",
+    "PRODUCT_MASTER",
+    "PRODUCT_MASTER_EMBED",
+    "EC_DATA_WITH_PRODUCT_MASTER",
+    "RETAIL_DATA_WITH_PRODUCT_MASTER",
+]
+
+# ロック競合を計測するユーティリティ（モジュール変数 _lock を持つもの）
+LOCKED_MODULES = [
+    "table_utils",
+    "workload_utils",
+    "result_cache_utils",
+    "agg_utils",
+    "cube_utils",
+    "search_utils",
+    "analyst_utils",
+]
+
+# クエリの種類ごとの待ち時間（--latency-ms に対する倍率）
+LATENCY_FACTORS = {
+    "metadata": 1,
+    "dashboard": 2,
+    "ai_batch": 20,
+    "preprocessing": 20,
+}
+
+CATEGORIES = ["商品品質", "配送サービス", "価格", "カスタマーサービス", "店舗環境", "その他"]
+CHANNELS = ["店舗", "EC"]
+
+DEFAULT_SESSIONS = "1,10,50,100,200"
+DEFAULT_LATENCY_MS = 10
+DEFAULT_ROWS = 1000
+DEFAULT_TIMEOUT_SEC = 120
+
+# セッションを識別するsession_stateのキー
+SESSION_KEY = "_load_test_session"
+
+
+class LocalQueryError(Exception):
+    """代替セッションで存在しないテーブルを参照した場合のエラー"""
+
+
+class InstrumentedLock:
+    """取得待ちの回数と時間を記録するロック（threading.Lockの代わりに差し替える）"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self._lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._stats_lock:
+            self.acquires = 0
+            self.contended = 0
+            self.wait_sec = 0.0
+
+    def acquire(self, blocking: bool = True, timeout: float = -1) -> bool:
+        if self._lock.acquire(blocking=False):
+            with self._stats_lock:
+                self.acquires += 1
+            return True
+        if not blocking:
+            with self._stats_lock:
+                self.contended += 1
+            return False
+        start = time.perf_counter()
+        acquired = self._lock.acquire(True, timeout)
+        with self._stats_lock:
+            self.acquires += 1
+            self.contended += 1
+            self.wait_sec += time.perf_counter() - start
+        return acquired
+
+    def release(self):
+        self._lock.release()
+
+    def locked(self) -> bool:
+        return self._lock.locked()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+def load_reviews(limit: int) -> list:
+    """合成結果に使うレビューを読み込む（CSVがない場合は機械的に作成）"""
+    reviews = []
+    if os.path.exists(REVIEWS_CSV):
+        with open(REVIEWS_CSV, newline="", encoding="utf-8") as f:
+            for row in csv.DictReader(f):
+                reviews.append({key.upper(): value for key, value in row.items()})
+                if len(reviews) >= limit:
+                    break
+    while len(reviews) < limit:
+        i = len(reviews)
+        reviews.append({
+            "REVIEW_ID": f"R{i:06d}",
+            "PRODUCT_ID": f"P{i % 100:03d}",
+            "REVIEW_TEXT": f"レビュー{i}",
+            "RATING": str(i % 5 + 1),
+            "PURCHASE_CHANNEL": CHANNELS[i % 2],
+        })
+    return reviews
+
+
+def _split_top_level(text: str) -> list:
+    """括弧の外側のカンマで分割する"""
+    items, depth, current = [], 0, []
+    for ch in text:
+        if ch == "(":
+            depth += 1
+        elif ch == ")":
+            depth -= 1
+        if ch == "," and depth == 0:
+            items.append("".join(current))
+            current = []
+        else:
+            current.append(ch)
+    items.append("".join(current))
+    return [item.strip() for item in items if item.strip()]
+
+
+def select_columns(query: str) -> list:
+    """最も外側のSELECT句の列名（別名または列名を大文字で）を取得する"""
+    upper = query.upper()
+    depth, start = 0, None
+    for match in re.finditer(r"\(|\)|\bSELECT\b|\bFROM\b", upper):
+        token = match.group(0)
+        if token == "(":
+            depth += 1
+        elif token == ")":
+            depth -= 1
+        elif depth == 0 and token == "SELECT" and start is None:
+            start = match.end()
+        elif depth == 0 and token == "FROM" and start is not None:
+            return _column_names(query[start:match.start()])
+    return _column_names(query[start:]) if start is not None else []
+
+
+def _column_names(select_list: str) -> list:
+    """SELECT句の各項目を列名に変換する"""
+    names = []
+    for item in _split_top_level(select_list):
+        item = re.sub(r"^DISTINCT\s+", "", item, flags=re.IGNORECASE)
+        alias = re.search(r"\bAS\s+\"?(\w+)\"?\s*$", item, flags=re.IGNORECASE)
+        if alias:
+            names.append(alias.group(1).upper())
+        elif item == "*" or item.endswith(".*"):
+            names.extend(["REVIEW_ID", "PRODUCT_ID", "REVIEW_TEXT", "RATING", "PURCHASE_CHANNEL"])
+        else:
+            bare = re.search(r"(\w+)\s*$", item)
+            names.append(bare.group(1).upper() if bare else f"C{len(names)}")
+    return names
+
+
+def synthesize_value(column: str, review: dict, i: int):
+    """列名から値を合成する"""
+    if column in review:
+        value = review[column]
+        if column in ("RATING", "HELPFUL_VOTES"):
+            try:
+                return float(value)
+            except (TypeError, ValueError):
+                return None
+        return value
+    if "COUNT" in column or column in ("CNT", "TOTAL_CHUNKS", "UNIQUE_REVIEWS"):
+        return 100 + i
+    if "SENTIMENT" in column or "SCORE" in column or "SIMILARITY" in column:
+        return round(random.uniform(-1, 1), 3)
+    if "RATING" in column:
+        return float(i % 5 + 1)
+    if "CATEGORY" == column or column.endswith("_LABEL"):
+        return CATEGORIES[i % len(CATEGORIES)]
+    if "CHANNEL" in column:
+        return CHANNELS[i % 2]
+    if "DATE" in column or "TIME" in column or column.endswith("_AT"):
+        return datetime.date(2024, 1, 1) + datetime.timedelta(days=i % 365)
+    if column.endswith("_ID"):
+        return f"{column[0]}{i:06d}"
+    return f"{column.lower()} {i}"
+
+
+class LocalDataFrame:
+    """session.sql()の戻り値の代替（collect / collect_nowait / to_pandas）"""
+
+    def __init__(self, session, query: str, params):
+        self.session = session
+        self.query = query
+        self.params = params
+
+    def collect(self, statement_params: dict = None) -> list:
+        return self.session.execute(self.query)
+
+    def collect_nowait(self, statement_params: dict = None):
+        return LocalAsyncJob(self.collect())
+
+    def to_pandas(self):
+        import pandas as pd
+        return pd.DataFrame([row.as_dict() for row in self.collect()])
+
+
+class LocalAsyncJob:
+    """collect_nowait()の戻り値の代替（発行時に実行済み）"""
+
+    def __init__(self, rows: list):
+        self._rows = rows
+
+    def is_done(self) -> bool:
+        return True
+
+    def result(self) -> list:
+        return self._rows
+
+
+class LocalSession:
+    """
+    Snowparkセッションのローカル代替
+
+    クエリを種類ごとに分類して一定時間待ち、SELECT句の列名から合成した行を返す。
+    実行したクエリは実行中のStreamlitセッション（session_stateのSESSION_KEY）ごとに集計する。
+    """
+
+    def __init__(self, latency_ms: float, rows: int, tables: list = None):
+        from workload_utils import classify_query
+        self._classify = classify_query
+        self.latency_sec = latency_ms / 1000
+        self.rows = rows
+        self.tables = {table.upper() for table in (tables or DEFAULT_TABLES)}
+        self.reviews = load_reviews(rows)
+        self.query_tag = None
+        self._warehouse = "LOAD_TEST_WH"
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.queries = {}            # セッション番号 -> {ワークロードの種類: クエリ数}
+
+    def sql(self, query: str, params=None) -> LocalDataFrame:
+        return LocalDataFrame(self, query, params)
+
+    def get_current_warehouse(self) -> str:
+        return self._warehouse
+
+    def use_warehouse(self, warehouse: str):
+        self._warehouse = warehouse
+
+    def write_pandas(self, df, table_name: str, **kwargs):
+        self._record("preprocessing")
+        with self._lock:
+            self.tables.add(table_name.upper())
+
+    def _record(self, workload: str):
+        try:
+            import streamlit as st
+            session_no = st.session_state.get(SESSION_KEY)
+        except Exception:
+            session_no = None
+        with self._lock:
+            counts = self.queries.setdefault(session_no, {})
+            counts[workload] = counts.get(workload, 0) + 1
+
+    def _missing_table(self, text: str):
+        """存在確認クエリが存在しないテーブルを参照していればその名前を返す"""
+        match = (re.match(r"^SELECT 1 FROM (\w+) LIMIT 1$", text)
+                 or re.match(r"^(?:DESCRIBE|DESC) TABLE (\w+)$", text))
+        if match and match.group(1) not in self.tables:
+            return match.group(1)
+        return None
+
+    def execute(self, query: str) -> list:
+        text = re.sub(r"\s+", " ", query).strip().upper()
+        workload = self._classify(query)
+        self._record(workload)
+        time.sleep(self.latency_sec * LATENCY_FACTORS.get(workload, 1))
+
+        missing = self._missing_table(text)
+        if missing:
+            raise LocalQueryError(f"Object '{missing}' does not exist or not authorized.")
+        if text.startswith("SHOW TABLES LIKE"):
+            name = re.search(r"LIKE '([^']+)'", text).group(1)
+            return [Row(name=name)] if name in self.tables else []
+        if text.startswith(("SHOW ", "DESC", "LIST ", "CALL ", "ALTER ", "CREATE ", "DROP ", "USE ")):
+            return []
+        if "INFORMATION_SCHEMA.TABLES" in text:
+            return [Row(TABLE_NAME=table) for table in sorted(self.tables)]
+        if re.match(r"^(INSERT|MERGE|UPDATE|DELETE|COPY) ", text):
+            return [Row(**{"number of rows inserted": 0})]
+
+        columns = select_columns(query)
+        if not columns:
+            return []
+        if "GROUP BY" in text:
+            n = min(len(CATEGORIES), self.rows)
+        elif re.search(r"\b(COUNT|AVG|SUM|MIN|MAX)\s*\(", text) or " FROM " not in text:
+            n = 1
+        else:
+            n = self.rows
+        limit = re.search(r"\bLIMIT (\d+)\s*$", text)
+        if limit:
+            n = min(n, int(limit.group(1)))
+        return [
+            Row(**{column: synthesize_value(column, self.reviews[i % len(self.reviews)], i) for column in columns})
+            for i in range(n)
+        ]
+
+
+# =========================================================
+# ユーザーの操作シナリオ
+# =========================================================
+
+def _click(at: AppTest, label_prefix: str):
+    """ラベルが指定の文字列で始まるボタンを押す"""
+    for button in at.button:
+        if button.label.startswith(label_prefix):
+            return button.click().run()
+    return at.run()
+
+
+def _select_second(at: AppTest, key: str):
+    """セレクトボックスの2番目の選択肢を選ぶ"""
+    try:
+        selectbox = at.selectbox(key=key)
+    except KeyError:
+        return at.run()
+    if len(selectbox.options) > 1:
+        return selectbox.select(selectbox.options[1]).run()
+    return at.run()
+
+
+# シナリオ名 -> [(ステップ名, 操作)]
+JOURNEYS = {
+    # 各ページを順に開いて再描画する
+    "browse": [
+        ("main", lambda at: at.run()),
+        ("prepare", lambda at: at.switch_page(PREPARE_PAGE).run()),
+        ("prepare_rerun", lambda at: at.run()),
+        ("voice", lambda at: at.switch_page(VOICE_PAGE).run()),
+        ("voice_rerun", lambda at: at.run()),
+    ],
+    # 分類を実行してカテゴリ別に閲覧する
+    "classify": [
+        ("main", lambda at: at.run()),
+        ("voice", lambda at: at.switch_page(VOICE_PAGE).run()),
+        ("classify", lambda at: _click(at, "🏷️ AI_CLASSIFY実行")),
+        ("category", lambda at: _select_second(at, "category_select")),
+        ("voice_rerun", lambda at: at.run()),
+    ],
+    # 統合分析を実行して結果を閲覧する
+    "integrated": [
+        ("main", lambda at: at.run()),
+        ("voice", lambda at: at.switch_page(VOICE_PAGE).run()),
+        ("integrated", lambda at: _click(at, "🚀 統合分析実行")),
+        ("analysis_category", lambda at: _select_second(at, "analysis_category")),
+        ("voice_rerun", lambda at: at.run()),
+    ],
+}
+
+
+def run_journey(session_no: int, journey: str, timeout: float) -> dict:
+    """1セッション分のシナリオを実行し、ステップごとの再実行時間を返す"""
+    at = AppTest.from_file(MAIN_PAGE, default_timeout=timeout)
+    at.session_state[SESSION_KEY] = session_no
+    steps, errors = [], []
+    for step, action in JOURNEYS[journey]:
+        start = time.perf_counter()
+        try:
+            at = action(at)
+            if at.exception:
+                errors.append(f"{step}: {at.exception[0].message}")
+        except Exception as e:
+            errors.append(f"{step}: {e}")
+        steps.append({"step": step, "sec": time.perf_counter() - start})
+    return {"session": session_no, "journey": journey, "steps": steps, "errors": errors}
+
+
+# =========================================================
+# 計測
+# =========================================================
+
+def get_rss_bytes() -> int:
+    """プロセスの現在のRSS（取得できない環境では最大RSS）"""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    import resource
+    usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return usage if sys.platform == "darwin" else usage * 1024
+
+
+def percentile(values: list, q: float) -> float:
+    """パーセンタイル（最近傍法）"""
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(q * (len(values) - 1))))]
+
+
+def instrument_locks() -> list:
+    """ユーティリティのモジュール変数 _lock を計測用のロックに差し替える"""
+    locks = []
+    for name in LOCKED_MODULES:
+        try:
+            module = __import__(name)
+        except Exception:
+            continue
+        if hasattr(module, "_lock"):
+            module._lock = InstrumentedLock(name)
+            locks.append(module._lock)
+    return locks
+
+
+def run_level(n: int, journeys: list, local_session: LocalSession, locks: list, timeout: float) -> dict:
+    """N人分のセッションを同時に実行し、集計結果を返す"""
+    local_session.reset()
+    for lock in locks:
+        lock.reset()
+    rss_before = get_rss_bytes()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=n) as executor:
+        futures = [
+            executor.submit(run_journey, session_no, journeys[session_no % len(journeys)], timeout)
+            for session_no in range(n)
+        ]
+        results = [future.result() for future in futures]
+    elapsed = time.perf_counter() - start
+    rss_after = get_rss_bytes()
+
+    step_secs = [step["sec"] for result in results for step in result["steps"]]
+    per_session = [local_session.queries.get(result["session"], {}) for result in results]
+    totals = [sum(counts.values()) for counts in per_session]
+    by_workload = {}
+    for counts in per_session:
+        for workload, count in counts.items():
+            by_workload[workload] = by_workload.get(workload, 0) + count
+    return {
+        "sessions": n,
+        "elapsed_sec": elapsed,
+        "reruns": len(step_secs),
+        "rerun_p50_ms": percentile(step_secs, 0.5) * 1000,
+        "rerun_p95_ms": percentile(step_secs, 0.95) * 1000,
+        "queries_per_session_mean": sum(totals) / len(totals) if totals else 0.0,
+        "queries_per_session_max": max(totals) if totals else 0,
+        "queries_per_session_by_workload": {
+            workload: count / n for workload, count in sorted(by_workload.items())
+        },
+        "rss_before_mb": rss_before / 1024 / 1024,
+        "rss_after_mb": rss_after / 1024 / 1024,
+        "rss_growth_mb": (rss_after - rss_before) / 1024 / 1024,
+        "locks": {
+            lock.name: {"acquires": lock.acquires, "contended": lock.contended, "wait_ms": lock.wait_sec * 1000}
+            for lock in locks if lock.acquires
+        },
+        "errors": [f"#{result['session']} {error}" for result in results for error in result["errors"]],
+    }
+
+
+def print_report(levels: list):
+    """セッション数ごとの集計結果を出力する"""
+    print()
+    print(f"{'SESSIONS':>9}{'RERUNS':>8}{'P50(ms)':>10}{'P95(ms)':>10}{'Q/SESSION':>11}{'Q MAX':>7}"
+          f"{'RSS(MB)':>10}{'+RSS(MB)':>10}{'ERRORS':>8}")
+    for level in levels:
+        print(f"{level['sessions']:>9}{level['reruns']:>8}{level['rerun_p50_ms']:>10.0f}{level['rerun_p95_ms']:>10.0f}"
+              f"{level['queries_per_session_mean']:>11.1f}{level['queries_per_session_max']:>7}"
+              f"{level['rss_after_mb']:>10.0f}{level['rss_growth_mb']:>10.1f}{len(level['errors']):>8}")
+
+    print()
+    print("セッションあたりのクエリ数（種類別）")
+    for level in levels:
+        breakdown = ", ".join(
+            f"{workload}={count:.1f}" for workload, count in level["queries_per_session_by_workload"].items()
+        )
+        print(f"  N={level['sessions']:<5}{breakdown}")
+
+    print()
+    print("ロック競合（競合回数 / 取得回数、待ち時間合計）")
+    for level in levels:
+        locks = ", ".join(
+            f"{name}={info['contended']}/{info['acquires']} ({info['wait_ms']:.1f} ms)"
+            for name, info in sorted(level["locks"].items())
+        )
+        print(f"  N={level['sessions']:<5}{locks or '-'}")
+
+    for level in levels:
+        for error in level["errors"][:5]:
+            print(f"  ⚠️ N={level['sessions']} {error}")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Streamlitアプリを複数セッションで同時に実行し、負荷をレポートします")
+    parser.add_argument("--sessions", default=DEFAULT_SESSIONS,
+                        help="同時セッション数（カンマ区切りで複数指定）")
+    parser.add_argument("--journey", action="append", choices=list(JOURNEYS),
+                        help="操作シナリオ（複数指定時はセッションに順番に割り当て）。省略時はすべて")
+    parser.add_argument("--latency-ms", type=float, default=DEFAULT_LATENCY_MS,
+                        help="メタデータ参照クエリの待ち時間（他の種類は倍率を掛ける）")
+    parser.add_argument("--rows", type=int, default=DEFAULT_ROWS, help="明細を返すクエリの行数")
+    parser.add_argument("--timeout", type=float, default=DEFAULT_TIMEOUT_SEC, help="1回の再実行のタイムアウト（秒）")
+    parser.add_argument("--output", help="集計結果をJSONで保存するパス")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    sys.path.insert(0, APP_DIR)
+
+    # ページ・ユーティリティが取得するセッションをローカル代替に差し替える
+    # （ユーティリティのインポートより前に差し替える）
+    snowflake.snowpark.context.get_active_session = lambda: local_session
+    local_session = LocalSession(args.latency_ms, args.rows)
+    locks = instrument_locks()
+
+    journeys = args.journey or list(JOURNEYS)
+    levels = []
+    for n in [int(value) for value in args.sessions.split(",") if value.strip()]:
+        print(f"▶ {n}セッション（{', '.join(journeys)}）")
+        levels.append(run_level(n, journeys, local_session, locks, args.timeout))
+
+    print_report(levels)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(levels, f, ensure_ascii=False, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())